@@ -278,9 +278,11 @@ if __name__ == "__main__":
         "--algorithm",
         dest="algorithm",
         default="levenshtein",
-        choices=["levenshtein", "difflib"],
+        choices=["levenshtein", "difflib", "anchored"],
         help="""Diff algorithm to use. Levenshtein gives the minimum diff, while difflib
-        aims for long sections of equal opcodes. Defaults to %(default)s.""",
+        aims for long sections of equal opcodes. Anchored splits large functions at
+        unique runs of opcodes and uses Levenshtein between them, which is much
+        faster for them but may not give the minimum diff. Defaults to %(default)s.""",
     )
     parser.add_argument(
         "--max-size",
@@ -337,6 +339,7 @@ if __name__ == "__main__":
 
 import abc
 import ast
+import bisect
 from collections import Counter, defaultdict
 from dataclasses import asdict, dataclass, field, replace
 import difflib
@@ -610,22 +613,25 @@ class Text:
         return NotImplemented
 
     def __add__(self, other: Union["Text", str]) -> "Text":
+        other_segments: List[Tuple[str, Format]]
         if isinstance(other, str):
-            other = Text(other)
+            other_segments = [(other, BasicFormat.NONE)] if other else []
+        else:
+            other_segments = other.segments
         result = Text()
         # If two adjacent segments have the same format, merge their lines
         if (
             self.segments
-            and other.segments
-            and self.segments[-1][1] == other.segments[0][1]
+            and other_segments
+            and self.segments[-1][1] == other_segments[0][1]
         ):
-            result.segments = (
-                self.segments[:-1]
-                + [(self.segments[-1][0] + other.segments[0][0], self.segments[-1][1])]
-                + other.segments[1:]
+            result.segments = self.segments[:-1]
+            result.segments.append(
+                (self.segments[-1][0] + other_segments[0][0], self.segments[-1][1])
             )
+            result.segments.extend(other_segments[1:])
         else:
-            result.segments = self.segments + other.segments
+            result.segments = self.segments + other_segments
         return result
 
     def __radd__(self, other: Union["Text", str]) -> "Text":
@@ -827,15 +833,24 @@ class JsonFormatter(Formatter):
         return NotImplemented
 
     def table(self, meta: TableMetadata, rows: List[Tuple["OutputLine", ...]]) -> str:
+        return json.dumps(self.table_data(meta, rows))
+
+    def table_data(
+        self, meta: TableMetadata, rows: List[Tuple["OutputLine", ...]]
+    ) -> Dict[str, Any]:
+        """Like table(), but returns the JSON-compatible object instead of a string"""
+        rotation_attrs: Dict[RotationFormat, Dict[str, Any]] = {}
+
         def serialize_format(s: str, f: Format) -> Dict[str, Any]:
             if f == BasicFormat.NONE:
                 return {"text": s}
             elif isinstance(f, BasicFormat):
                 return {"text": s, "format": f.name.lower()}
             elif isinstance(f, RotationFormat):
-                attrs = asdict(f)
-                attrs.update({"text": s, "format": "rotation"})
-                return attrs
+                attrs = rotation_attrs.get(f)
+                if attrs is None:
+                    attrs = rotation_attrs[f] = asdict(f)
+                return {**attrs, "text": s, "format": "rotation"}
             else:
                 static_assert_unreachable(f)
 
@@ -879,7 +894,7 @@ class JsonFormatter(Formatter):
                     if line.branch_target is not None:
                         column["branch"] = line.branch_target
                     if line.source_lines:
-                        column["src"] = line.source_lines
+                        column["src"] = list(line.source_lines)
                     if line.comment is not None:
                         column["src_comment"] = line.comment
                     if line.source_line_num is not None:
@@ -888,7 +903,7 @@ class JsonFormatter(Formatter):
                     output_row[column_name] = column
             output_rows.append(output_row)
         output["rows"] = output_rows
-        return json.dumps(output)
+        return output
 
 
 def format_fields(
@@ -1167,10 +1182,16 @@ def parse_elf_rodata_references(
     str_end = "<" if is_little_endian else ">"
     str_off = "I" if is_32bit else "Q"
 
+    structs: Dict[str, struct.Struct] = {}
+
+    def get_struct(spec: str) -> struct.Struct:
+        st = structs.get(spec)
+        if st is None:
+            st = structs[spec] = struct.Struct(str_end + spec.replace("P", str_off))
+        return st
+
     def read(spec: str, offset: int) -> Tuple[int, ...]:
-        spec = spec.replace("P", str_off)
-        size = struct.calcsize(spec)
-        return struct.unpack(str_end + spec, data[offset : offset + size])
+        return get_struct(spec).unpack_from(data, offset)
 
     (
         e_type,
@@ -1227,6 +1248,30 @@ def parse_elf_rodata_references(
         return []
     text_section = text_sections[0]
 
+    if is_32bit:
+        sym_struct = get_struct("IIIBBH")
+        sym_info_shift, sym_type_mask = 8, 0xFF
+    else:
+        sym_struct = get_struct("IBBHQQ")
+        sym_info_shift, sym_type_mask = 32, 0xFFFFFFFF
+
+    # Many relocations refer to the same few (section) symbols, so read each once
+    # sym index -> (st_value, st_shndx)
+    symbols: Dict[int, Tuple[int, int]] = {}
+
+    def read_symbol(r_sym: int) -> Tuple[int, int]:
+        sym = symbols.get(r_sym)
+        if sym is None:
+            fields = sym_struct.unpack_from(
+                data, symtab.sh_offset + symtab.sh_entsize * r_sym
+            )
+            if is_32bit:
+                st_name, st_value, st_size, st_info, st_other, st_shndx = fields
+            else:
+                st_name, st_info, st_other, st_shndx, st_value, st_size = fields
+            sym = symbols[r_sym] = (st_value, st_shndx)
+        return sym
+
     ret: List[Tuple[int, int, str]] = []
     for s in sections:
         if s.sh_type == SHT_REL or s.sh_type == SHT_RELA:
@@ -1237,32 +1282,22 @@ def parse_elf_rodata_references(
             if sec_name != ".rodata":
                 continue
             sec_base = sections[s.sh_info].sh_offset
-            for i in range(0, s.sh_size, s.sh_entsize):
-                if s.sh_type == SHT_REL:
-                    r_offset, r_info = read("PP", s.sh_offset + i)
-                else:
-                    r_offset, r_info, r_addend = read("PPP", s.sh_offset + i)
-
-                if is_32bit:
-                    r_sym = r_info >> 8
-                    r_type = r_info & 0xFF
-                    sym_offset = symtab.sh_offset + symtab.sh_entsize * r_sym
-                    st_name, st_value, st_size, st_info, st_other, st_shndx = read(
-                        "IIIBBH", sym_offset
-                    )
-                else:
-                    r_sym = r_info >> 32
-                    r_type = r_info & 0xFFFFFFFF
-                    sym_offset = symtab.sh_offset + symtab.sh_entsize * r_sym
-                    st_name, st_info, st_other, st_shndx, st_value, st_size = read(
-                        "IBBHQQ", sym_offset
-                    )
+            rel_struct = get_struct("PP" if s.sh_type == SHT_REL else "PPP")
+            for i in range(s.sh_offset, s.sh_offset + s.sh_size, s.sh_entsize):
+                rel = rel_struct.unpack_from(data, i)
+                r_offset = rel[0]
+                r_info = rel[1]
+                r_sym = r_info >> sym_info_shift
+                r_type = r_info & sym_type_mask
+                st_value, st_shndx = read_symbol(r_sym)
                 if st_shndx == text_section:
                     if s.sh_type == SHT_REL:
                         if e_machine == 8 and r_type == 2:  # R_MIPS_32
                             (r_addend,) = read("I", sec_base + r_offset)
                         else:
                             continue
+                    else:
+                        r_addend = rel[2]
                     text_offset = (st_value + r_addend) & 0xFFFFFFFF
                     ret.append((text_offset, r_offset, sec_name))
     return ret
@@ -1384,6 +1419,7 @@ def dump_binary(
 
 # Example: "ldr r4, [pc, #56]    ; (4c <AddCoins+0x4c>)"
 ARM32_LOAD_POOL_PATTERN = r"(ldr\s+r([0-9]|1[0-3]),\s+\[pc,.*;\s*)(\([a-fA-F0-9]+.*\))"
+RE_ARM32_LOAD_POOL = re.compile(ARM32_LOAD_POOL_PATTERN)
 
 
 # The base class is a no-op.
@@ -1399,7 +1435,7 @@ class AsmProcessor:
         arch = self.config.arch
         row = self._normalize_arch_specific(mnemonic, row)
         if self.config.ignore_large_imms and mnemonic not in arch.branch_instructions:
-            row = re.sub(self.config.arch.re_large_imm, "<imm>", row)
+            row = self.config.arch.re_large_imm.sub("<imm>", row)
         return row
 
     def _normalize_arch_specific(self, mnemonic: str, row: str) -> str:
@@ -1509,7 +1545,7 @@ class AsmProcessorARM32(AsmProcessor):
         return row + "<ignore>"
 
     def _normalize_data_pool(self, row: str) -> str:
-        pool_match = re.search(ARM32_LOAD_POOL_PATTERN, row)
+        pool_match = RE_ARM32_LOAD_POOL.search(row)
         return pool_match.group(1) if pool_match else row
 
     def post_process(self, lines: List["Line"]) -> None:
@@ -1595,6 +1631,16 @@ class ArchSettings:
     proc: Type[AsmProcessor] = AsmProcessor
     big_endian: Optional[bool] = True
     delay_slot_instructions: Set[str] = field(default_factory=set)
+    _normalizer: Optional["LineNormalizer"] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    @property
+    def normalizer(self) -> "LineNormalizer":
+        # Built on first use, since it compiles regexes for the architecture
+        if self._normalizer is None:
+            self._normalizer = LineNormalizer(self)
+        return self._normalizer
 
 
 MIPS_BRANCH_LIKELY_INSTRUCTIONS = {
@@ -1836,107 +1882,117 @@ def pad_mnemonic(line: str) -> str:
 
 @dataclass
 class Line:
+    # A function can have thousands of lines, which are rebuilt for every diff, so
+    # they have slots instead of a __dict__, and share their strings where possible
+    __slots__ = (
+        "mnemonic",
+        "diff_row",
+        "original",
+        "normalized_original",
+        "scorable_line",
+        "line_num",
+        "branch_target",
+        "data_pool_addr",
+        "source_filename",
+        "source_line_num",
+        "source_lines",
+        "comment",
+    )
     mnemonic: str
     diff_row: str
     original: str
     normalized_original: str
     scorable_line: str
-    line_num: Optional[int] = None
-    branch_target: Optional[int] = None
-    data_pool_addr: Optional[int] = None
-    source_filename: Optional[str] = None
-    source_line_num: Optional[int] = None
-    source_lines: List[str] = field(default_factory=list)
-    comment: Optional[str] = None
-
-
-def process(dump: str, config: Config) -> List[Line]:
-    arch = config.arch
-    processor = arch.proc(config)
-    skip_next = False
-    source_lines = []
-    source_filename = None
-    source_line_num = None
+    line_num: Optional[int]
+    branch_target: Optional[int]
+    data_pool_addr: Optional[int]
+    source_filename: Optional[str]
+    source_line_num: Optional[int]
+    source_lines: Tuple[str, ...]
+    comment: Optional[str]
 
-    i = 0
-    num_instr = 0
-    data_refs: Dict[int, Dict[str, List[int]]] = defaultdict(lambda: defaultdict(list))
-    output: List[Line] = []
-    stop_after_delay_slot = False
-    lines = dump.split("\n")
-    while i < len(lines):
-        row = lines[i]
-        i += 1
+    @staticmethod
+    def marker(kind: str, original: str) -> "Line":
+        """A line that isn't an instruction, like a data reference"""
+        return Line(
+            mnemonic=kind,
+            diff_row=kind,
+            original=original,
+            normalized_original=original,
+            scorable_line=kind,
+            line_num=None,
+            branch_target=None,
+            data_pool_addr=None,
+            source_filename=None,
+            source_line_num=None,
+            source_lines=(),
+            comment=None,
+        )
 
-        if not row:
-            continue
 
-        if re.match(r"^[0-9a-f]+ <.*>:$", row):
-            continue
+RE_SYMBOL_HEADER = re.compile(r"^[0-9a-f]+ <.*>:$")
+RE_INSTRUCTION = re.compile(r"^\s+[0-9a-f]+:\s+")
+# This regex is conservative, and assumes the file path does not contain "weird"
+# characters like colons, tabs, or angle brackets.
+RE_SOURCE_LOCATION = re.compile(
+    r"^[^ \t<>:][^\t<>:]*:[0-9]+( \(discriminator [0-9]+\))?$"
+)
+# The address at the start of an instruction or relocation row
+RE_ADDRESS = re.compile(r"^(\s*)[0-9a-f]+:")
 
-        if row.startswith("DATAREF"):
-            parts = row.split(" ", 3)
-            text_offset = int(parts[1])
-            from_offset = int(parts[2])
-            from_section = parts[3]
-            data_refs[text_offset][from_section].append(from_offset)
-            continue
 
-        if config.diff_obj and num_instr >= config.max_function_size_lines:
-            output.append(
-                Line(
-                    mnemonic="...",
-                    diff_row="...",
-                    original="...",
-                    normalized_original="...",
-                    scorable_line="...",
-                )
-            )
-            break
-
-        if not re.match(r"^\s+[0-9a-f]+:\s+", row):
-            # This regex is conservative, and assumes the file path does not contain "weird"
-            # characters like colons, tabs, or angle brackets.
-            if re.match(
-                r"^[^ \t<>:][^\t<>:]*:[0-9]+( \(discriminator [0-9]+\))?$", row
-            ):
-                source_filename, _, tail = row.rpartition(":")
-                source_line_num = int(tail.partition(" ")[0])
-            source_lines.append(row)
-            continue
+@dataclass(frozen=True)
+class ProcessedInstruction:
+    original_mnemonic: str
+    mnemonic: str
+    args: str
+    diff_row: str
+    original: str
+    branch_target: Optional[int]
+    data_pool_addr: Optional[int]
+    comment: Optional[str]
+
+
+class LineNormalizer:
+    """The per-row work of process(), with every regex it needs compiled and bound
+    once per ArchSettings (see ArchSettings.normalizer) rather than looked up in the
+    re module's cache for every row."""
+
+    def __init__(self, arch: "ArchSettings") -> None:
+        self.arch = arch
+        self.search_comment = arch.re_comment.search
+        self.sub_comment = arch.re_comment.sub
+        self.sub_int = arch.re_int.sub
+        self.sub_reg = arch.re_reg.sub
+        self.sub_sprel = arch.re_sprel.sub
+        self.sub_imm = arch.re_imm.sub
+        self.search_reloc = arch.re_reloc.search
+        self.search_pool = RE_ARM32_LOAD_POOL.search
+
+    def instruction(
+        self,
+        row: str,
+        reloc_rows: List[str],
+        delay_slot: bool,
+        processor: AsmProcessor,
+    ) -> "ProcessedInstruction":
+        arch = self.arch
 
         # If the instructions loads a data pool symbol, extract the address of
         # the symbol.
         data_pool_addr = None
-        pool_match = re.search(ARM32_LOAD_POOL_PATTERN, row)
+        pool_match = self.search_pool(row) if "[pc," in row else None
         if pool_match:
             offset = pool_match.group(3).split(" ")[0][1:]
             data_pool_addr = int(offset, 16)
 
-        m_comment = re.search(arch.re_comment, row)
+        m_comment = self.search_comment(row)
         comment = m_comment[0] if m_comment else None
-        row = re.sub(arch.re_comment, "", row)
-        line_num_str = row.split(":")[0]
+        if m_comment:
+            row = self.sub_comment("", row)
         row = row.rstrip()
         tabs = row.split("\t")
         row = "\t".join(tabs[2:])
-        line_num = eval_line_num(line_num_str.strip())
-
-        if line_num in data_refs:
-            refs = data_refs[line_num]
-            ref_str = "; ".join(
-                section_name + "+" + ",".join(hex(off) for off in offs)
-                for section_name, offs in refs.items()
-            )
-            output.append(
-                Line(
-                    mnemonic="<data-ref>",
-                    diff_row="<data-ref>",
-                    original=ref_str,
-                    normalized_original=ref_str,
-                    scorable_line="<data-ref>",
-                )
-            )
 
         if "\t" in row:
             row_parts = row.split("\t", 1)
@@ -1944,6 +2000,7 @@ def process(dump: str, config: Config) -> List[Line]:
             # powerpc-eabi-objdump doesn't use tabs
             row_parts = [part.lstrip() for part in row.split(" ", 1)]
         mnemonic = row_parts[0].strip()
+        original_mnemonic = mnemonic
 
         addr = ""
         if mnemonic in arch.instructions_with_address_immediates:
@@ -1952,70 +2009,199 @@ def process(dump: str, config: Config) -> List[Line]:
             # symbol + offset. Strip that.
             addr = addr.replace("0x", "")
 
-        row = re.sub(arch.re_int, lambda m: hexify_int(row, m, arch), row)
+        row = self.sub_int(lambda m: hexify_int(row, m, arch), row)
         row += addr
 
         # Let 'original' be 'row' with relocations applied, while we continue
         # transforming 'row' into a coarser version that ignores registers and
         # immediates.
         original = row
+        for reloc_row in reloc_rows:
+            original = processor.process_reloc(reloc_row, original)
 
-        while i < len(lines):
-            reloc_row = lines[i]
-            if re.search(arch.re_reloc, reloc_row):
-                original = processor.process_reloc(reloc_row, original)
-            else:
-                break
-            i += 1
-
-        normalized_original = processor.normalize(mnemonic, original)
-
-        scorable_line = normalized_original
-        if not config.score_stack_differences:
-            scorable_line = re.sub(arch.re_sprel, "addr(sp)", scorable_line)
-
-        if skip_next:
-            skip_next = False
+        if delay_slot:
             row = "<delay-slot>"
             mnemonic = "<delay-slot>"
-            scorable_line = "<delay-slot>"
-        if mnemonic in arch.branch_likely_instructions:
-            skip_next = True
 
-        row = re.sub(arch.re_reg, "<reg>", row)
-        row = re.sub(arch.re_sprel, "addr(sp)", row)
-        row_with_imm = row
+        row = self.sub_reg("<reg>", row)
+        row = self.sub_sprel("addr(sp)", row)
         if mnemonic in arch.instructions_with_address_immediates:
             row = row.strip()
             row, _ = split_off_address(row)
             row += "<imm>"
         else:
-            row = normalize_imms(row, arch)
+            row = self.sub_imm("<imm>", row)
 
         branch_target = None
         if mnemonic in arch.branch_instructions:
             branch_target = int(row_parts[1].strip().split(",")[-1], 16)
 
+        return ProcessedInstruction(
+            original_mnemonic=sys.intern(original_mnemonic),
+            mnemonic=sys.intern(mnemonic),
+            args=row_parts[1] if len(row_parts) > 1 else "",
+            diff_row=sys.intern(row),
+            original=original,
+            branch_target=branch_target,
+            data_pool_addr=data_pool_addr,
+            comment=comment,
+        )
+
+    def normalize(
+        self,
+        instr: "ProcessedInstruction",
+        delay_slot: bool,
+        processor: AsmProcessor,
+        config: Config,
+    ) -> Tuple[str, str]:
+        """Return the normalized_original and scorable_line of an instruction."""
+        normalized_original = processor.normalize(
+            instr.original_mnemonic, instr.original
+        )
+        if delay_slot:
+            scorable_line = "<delay-slot>"
+        elif config.score_stack_differences:
+            scorable_line = normalized_original
+        else:
+            scorable_line = self.sub_sprel("addr(sp)", normalized_original)
+        return normalized_original, scorable_line
+
+
+class ProcessCache:
+    """Processed instructions of a previous dump, to avoid reprocessing the ones that
+    are unchanged when processing a new version of it. Entries that a dump doesn't
+    use are dropped when it's processed using a new ProcessCache(previous=...)."""
+
+    def __init__(self, previous: Optional["ProcessCache"] = None) -> None:
+        self._previous: Dict[Any, ProcessedInstruction] = (
+            previous._entries if previous is not None else {}
+        )
+        self._entries: Dict[Any, ProcessedInstruction] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Any) -> Optional[ProcessedInstruction]:
+        instr = self._entries.get(key)
+        if instr is None:
+            instr = self._previous.get(key)
+            if instr is not None:
+                self._entries[key] = instr
+        if instr is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return instr
+
+    def put(self, key: Any, instr: ProcessedInstruction) -> None:
+        self._entries[key] = instr
+
+
+def process(
+    dump: str, config: Config, cache: Optional["ProcessCache"] = None
+) -> List[Line]:
+    arch = config.arch
+    normalizer = arch.normalizer
+    processor = arch.proc(config)
+    skip_next = False
+    source_lines: List[str] = []
+    source_filename = None
+    source_line_num = None
+
+    i = 0
+    num_instr = 0
+    data_refs: Dict[int, Dict[str, List[int]]] = defaultdict(lambda: defaultdict(list))
+    output: List[Line] = []
+    stop_after_delay_slot = False
+    lines = dump.split("\n")
+    while i < len(lines):
+        row = lines[i]
+        i += 1
+
+        if not row:
+            continue
+
+        if RE_SYMBOL_HEADER.match(row):
+            continue
+
+        if row.startswith("DATAREF"):
+            parts = row.split(" ", 3)
+            text_offset = int(parts[1])
+            from_offset = int(parts[2])
+            from_section = parts[3]
+            data_refs[text_offset][from_section].append(from_offset)
+            continue
+
+        if config.diff_obj and num_instr >= config.max_function_size_lines:
+            output.append(Line.marker("...", "..."))
+            break
+
+        if not RE_INSTRUCTION.match(row):
+            if RE_SOURCE_LOCATION.match(row):
+                source_filename, _, tail = row.rpartition(":")
+                source_filename = sys.intern(source_filename)
+                source_line_num = int(tail.partition(" ")[0])
+            source_lines.append(row)
+            continue
+
+        line_num = eval_line_num(row.split(":")[0].strip())
+
+        reloc_rows = []
+        while i < len(lines) and normalizer.search_reloc(lines[i]):
+            reloc_rows.append(lines[i])
+            i += 1
+
+        instr: Optional[ProcessedInstruction] = None
+        if cache is not None:
+            # Relocations and instructions are processed the same way regardless
+            # of their address, so unchanged instructions that have merely moved
+            # are still found in the cache
+            key = (
+                skip_next,
+                RE_ADDRESS.sub(r"\1", row),
+                tuple(RE_ADDRESS.sub(r"\1", reloc) for reloc in reloc_rows),
+            )
+            instr = cache.get(key)
+        if instr is None:
+            instr = normalizer.instruction(row, reloc_rows, skip_next, processor)
+            if cache is not None:
+                cache.put(key, instr)
+
+        mnemonic = instr.mnemonic
+        row = instr.diff_row
+        normalized_original, scorable_line = normalizer.normalize(
+            instr, skip_next, processor, config
+        )
+
+        skip_next = mnemonic in arch.branch_likely_instructions
+
+        if line_num in data_refs:
+            refs = data_refs[line_num]
+            ref_str = "; ".join(
+                section_name + "+" + ",".join(hex(off) for off in offs)
+                for section_name, offs in refs.items()
+            )
+            output.append(Line.marker("<data-ref>", ref_str))
+
         output.append(
             Line(
                 mnemonic=mnemonic,
                 diff_row=row,
-                original=original,
+                original=instr.original,
                 normalized_original=normalized_original,
                 scorable_line=scorable_line,
                 line_num=line_num,
-                branch_target=branch_target,
-                data_pool_addr=data_pool_addr,
+                branch_target=instr.branch_target,
+                data_pool_addr=instr.data_pool_addr,
                 source_filename=source_filename,
                 source_line_num=source_line_num,
-                source_lines=source_lines,
-                comment=comment,
+                source_lines=tuple(source_lines),
+                comment=instr.comment,
             )
         )
         num_instr += 1
-        source_lines = []
+        source_lines.clear()
 
-        if config.stop_jrra and mnemonic == "jr" and row_parts[1].strip() == "ra":
+        if config.stop_jrra and mnemonic == "jr" and instr.args.strip() == "ra":
             stop_after_delay_slot = True
         elif stop_after_delay_slot:
             break
@@ -2055,18 +2241,10 @@ def diff_sequences_difflib(
     return differ.get_opcodes()
 
 
-def diff_sequences(
-    seq1: List[str], seq2: List[str], algorithm: str
-) -> List[Tuple[str, int, int, int, int]]:
-    if (
-        algorithm != "levenshtein"
-        or len(seq1) * len(seq2) > 4 * 10**8
-        or len(seq1) + len(seq2) >= 0x110000
-    ):
-        return diff_sequences_difflib(seq1, seq2)
-
-    # The Levenshtein library assumes that we compare strings, not lists. Convert.
-    # (Per the check above we know we have fewer than 0x110000 unique elements, so chr() works.)
+def remap_sequences(seq1: List[str], seq2: List[str]) -> Tuple[str, str]:
+    """The Levenshtein library assumes that we compare strings, not lists. Convert.
+    (Callers must check that there are fewer than 0x110000 unique elements, so that
+    chr() works.)"""
     remapping: Dict[str, str] = {}
 
     def remap(seq: List[str]) -> str:
@@ -2079,14 +2257,163 @@ def diff_sequences(
             seq[i] = val
         return "".join(seq)
 
-    rem1 = remap(seq1)
-    rem2 = remap(seq2)
+    return remap(seq1), remap(seq2)
+
+
+def diff_sequences(
+    seq1: List[str], seq2: List[str], algorithm: str
+) -> List[Tuple[str, int, int, int, int]]:
+    if algorithm == "anchored" and len(seq1) + len(seq2) < 0x110000:
+        return diff_sequences_anchored(seq1, seq2)
+
+    if (
+        algorithm != "levenshtein"
+        or len(seq1) * len(seq2) > 4 * 10**8
+        or len(seq1) + len(seq2) >= 0x110000
+    ):
+        return diff_sequences_difflib(seq1, seq2)
+
+    rem1, rem2 = remap_sequences(seq1, seq2)
     import Levenshtein
 
     ret: List[Tuple[str, int, int, int, int]] = Levenshtein.opcodes(rem1, rem2)
     return ret
 
 
+# Runs of this many mnemonics that occur exactly once in both sequences are used
+# as anchors by the "anchored" algorithm
+ANCHOR_LENGTH = 8
+# Windows between anchors with at most this many line pairs are aligned exactly
+ANCHORED_WINDOW_SIZE = 10**8
+# How many times a window may be split at anchors found within it
+ANCHORED_MAX_DEPTH = 32
+
+
+def diff_sequences_anchored(
+    seq1: List[str], seq2: List[str]
+) -> List[Tuple[str, int, int, int, int]]:
+    """Split the sequences at runs of mnemonics that are unique to both of them, like
+    patience diff does with lines, and align the windows in between with Levenshtein.
+    This takes about linear time for large functions, but unlike plain Levenshtein
+    may not find the minimal diff."""
+    rem1, rem2 = remap_sequences(seq1, seq2)
+    ret: List[Tuple[str, int, int, int, int]] = []
+    align_anchored(rem1, rem2, 0, len(rem1), 0, len(rem2), 0, ret)
+    return ret
+
+
+def align_anchored(
+    rem1: str,
+    rem2: str,
+    lo1: int,
+    hi1: int,
+    lo2: int,
+    hi2: int,
+    depth: int,
+    out: List[Tuple[str, int, int, int, int]],
+) -> None:
+    # Common prefix and suffix
+    start1, start2 = lo1, lo2
+    while lo1 < hi1 and lo2 < hi2 and rem1[lo1] == rem2[lo2]:
+        lo1 += 1
+        lo2 += 1
+    if lo1 > start1:
+        out.append(("equal", start1, lo1, start2, lo2))
+
+    end1, end2 = hi1, hi2
+    while hi1 > lo1 and hi2 > lo2 and rem1[hi1 - 1] == rem2[hi2 - 1]:
+        hi1 -= 1
+        hi2 -= 1
+
+    anchors: List[Tuple[int, int]] = []
+    if lo1 == hi1 or lo2 == hi2:
+        if lo1 < hi1:
+            out.append(("delete", lo1, hi1, lo2, lo2))
+        if lo2 < hi2:
+            out.append(("insert", lo1, lo1, lo2, hi2))
+    elif (
+        depth < ANCHORED_MAX_DEPTH and (hi1 - lo1) * (hi2 - lo2) > ANCHORED_WINDOW_SIZE
+    ):
+        anchors = find_anchors(rem1, rem2, lo1, hi1, lo2, hi2)
+
+    if anchors:
+        for i, j in anchors:
+            if i < lo1 or j < lo2:
+                # Overlaps the previous anchor's run
+                continue
+            align_anchored(rem1, rem2, lo1, i, lo2, j, depth + 1, out)
+            lo1, lo2 = i, j
+            while lo1 < hi1 and lo2 < hi2 and rem1[lo1] == rem2[lo2]:
+                lo1 += 1
+                lo2 += 1
+            out.append(("equal", i, lo1, j, lo2))
+        align_anchored(rem1, rem2, lo1, hi1, lo2, hi2, depth + 1, out)
+    elif lo1 < hi1 and lo2 < hi2:
+        window1, window2 = rem1[lo1:hi1], rem2[lo2:hi2]
+        if len(window1) * len(window2) > 4 * 10**8:
+            differ = difflib.SequenceMatcher(a=window1, b=window2, autojunk=False)
+            opcodes = differ.get_opcodes()
+        else:
+            import Levenshtein
+
+            opcodes = Levenshtein.opcodes(window1, window2)
+        for (tag, i1, i2, j1, j2) in opcodes:
+            out.append((tag, i1 + lo1, i2 + lo1, j1 + lo2, j2 + lo2))
+
+    if hi1 < end1:
+        out.append(("equal", hi1, end1, hi2, end2))
+
+
+def find_anchors(
+    rem1: str, rem2: str, lo1: int, hi1: int, lo2: int, hi2: int
+) -> List[Tuple[int, int]]:
+    """Find the positions of runs of ANCHOR_LENGTH elements that occur exactly once
+    in both windows, keeping the longest series of them that is in the same order in
+    both."""
+    # run -> [count in rem1, position in rem1, count in rem2, position in rem2]
+    runs: Dict[str, List[int]] = {}
+    for i in range(lo1, hi1 - ANCHOR_LENGTH + 1):
+        run = rem1[i : i + ANCHOR_LENGTH]
+        entry = runs.get(run)
+        if entry is None:
+            runs[run] = [1, i, 0, -1]
+        else:
+            entry[0] += 1
+    for j in range(lo2, hi2 - ANCHOR_LENGTH + 1):
+        entry = runs.get(rem2[j : j + ANCHOR_LENGTH])
+        if entry is not None:
+            entry[2] += 1
+            entry[3] = j
+
+    pairs = sorted(
+        (pos1, pos2)
+        for count1, pos1, count2, pos2 in runs.values()
+        if count1 == 1 and count2 == 1
+    )
+
+    # Longest increasing subsequence of the positions in rem2, by patience sorting
+    tails: List[int] = []
+    tail_indices: List[int] = []
+    predecessors: List[int] = []
+    for index, (_, pos2) in enumerate(pairs):
+        pile = bisect.bisect_left(tails, pos2)
+        predecessors.append(tail_indices[pile - 1] if pile else -1)
+        if pile == len(tails):
+            tails.append(pos2)
+            tail_indices.append(index)
+        else:
+            tails[pile] = pos2
+            tail_indices[pile] = index
+
+    anchors = []
+    index = tail_indices[-1] if tail_indices else -1
+    while index != -1:
+        anchors.append(pairs[index])
+        index = predecessors[index]
+    anchors.reverse()
+    return anchors
+
+
 def diff_lines(
     lines1: List[Line],
     lines2: List[Line],
@@ -2118,6 +2445,7 @@ def score_diff_lines(
 ) -> int:
     # This logic is copied from `scorer.py` from the decomp permuter project
     # https://github.com/simonlindholm/decomp-permuter/blob/main/src/scorer.py
+    # (but scores each distinct pair of differing lines only once)
     score = 0
     deletions = []
     insertions = []
@@ -2145,22 +2473,19 @@ def score_diff_lines(
         new_inner = new[new_idx + 4 : -1]
         return old_inner.startswith(".") or new_inner.startswith(".")
 
-    def diff_sameline(old: str, new: str) -> None:
-        nonlocal score
-        if old == new:
-            return
-
+    def diff_sameline(old: str, new: str) -> int:
         if lo_hi_match(old, new):
-            return
+            return 0
 
+        penalty = 0
         ignore_last_field = False
         if config.score_stack_differences:
-            oldsp = re.search(config.arch.re_sprel, old)
-            newsp = re.search(config.arch.re_sprel, new)
+            oldsp = config.arch.re_sprel.search(old)
+            newsp = config.arch.re_sprel.search(new)
             if oldsp and newsp:
                 oldrel = int(oldsp.group(1) or "0", 0)
                 newrel = int(newsp.group(1) or "0", 0)
-                score += abs(oldrel - newrel) * config.penalty_stackdiff
+                penalty += abs(oldrel - newrel) * config.penalty_stackdiff
                 ignore_last_field = True
 
         # Probably regalloc difference, or signed vs unsigned
@@ -2172,45 +2497,49 @@ def score_diff_lines(
             oldfields = oldfields[:-1]
         for nf, of in zip(newfields, oldfields):
             if nf != of:
-                score += config.penalty_regalloc
+                penalty += config.penalty_regalloc
         # Penalize any extra fields
-        score += abs(len(newfields) - len(oldfields)) * config.penalty_regalloc
-
-    def diff_insert(line: str) -> None:
-        # Reordering or totally different codegen.
-        # Defer this until later when we can tell.
-        insertions.append(line)
-
-    def diff_delete(line: str) -> None:
-        deletions.append(line)
+        penalty += abs(len(newfields) - len(oldfields)) * config.penalty_regalloc
+        return penalty
 
     # Find the end of the last long streak of matching mnemonics, if it looks
     # like the objdump output was truncated. This is used to skip scoring
     # misaligned lines at the end of the diff.
-    last_mismatch = -1
-    max_index = None
-    lines_were_truncated = False
-    for index, (line1, line2) in enumerate(lines):
-        if (line1 and line1.original == "...") or (line2 and line2.original == "..."):
-            lines_were_truncated = True
-        if line1 and line2 and line1.mnemonic == line2.mnemonic:
-            if index - last_mismatch >= 50:
-                max_index = index
-        else:
-            last_mismatch = index
-    if not lines_were_truncated:
+    lines_were_truncated = any(
+        (line1 and line1.original == "...") or (line2 and line2.original == "...")
+        for (line1, line2) in lines
+    )
+    if lines_were_truncated:
+        last_mismatch = -1
         max_index = None
-
-    for index, (line1, line2) in enumerate(lines):
-        if max_index is not None and index > max_index:
-            break
+        for index, (line1, line2) in enumerate(lines):
+            if line1 and line2 and line1.mnemonic == line2.mnemonic:
+                if index - last_mismatch >= 50:
+                    max_index = index
+            else:
+                last_mismatch = index
+        if max_index is not None:
+            lines = lines[: max_index + 1]
+
+    # Differing lines tend to repeat, e.g. when the same registers are swapped
+    # throughout a function
+    sameline_scores: Dict[Tuple[str, str], int] = {}
+    for (line1, line2) in lines:
         if line1 and line2 and line1.mnemonic == line2.mnemonic:
-            diff_sameline(line1.scorable_line, line2.scorable_line)
+            old, new = line1.scorable_line, line2.scorable_line
+            if old != new:
+                line_score = sameline_scores.get((old, new))
+                if line_score is None:
+                    line_score = diff_sameline(old, new)
+                    sameline_scores[(old, new)] = line_score
+                score += line_score
         else:
+            # Reordering or totally different codegen.
+            # Defer this until later when we can tell.
             if line1:
-                diff_delete(line1.scorable_line)
+                deletions.append(line1.scorable_line)
             if line2:
-                diff_insert(line2.scorable_line)
+                insertions.append(line2.scorable_line)
 
     insertions_co = Counter(insertions)
     deletions_co = Counter(deletions)
@@ -2870,7 +3199,7 @@ def main() -> None:
     except ValueError as e:
         fail(str(e))
 
-    if config.algorithm == "levenshtein":
+    if config.algorithm in ("levenshtein", "anchored"):
         try:
             import Levenshtein
         except ModuleNotFoundError as e:
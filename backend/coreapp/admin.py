@@ -6,7 +6,14 @@ from .models.github import GitHubRepo, GitHubRepoBusyException, GitHubUser
 
 from .models.profile import Profile
 from .models.project import Project, ProjectFunction, ProjectImportConfig, ProjectMember
-from .models.scratch import Asm, Assembly, CompilerConfig, Scratch
+from .models.scratch import (
+    Asm,
+    Assembly,
+    AssemblyDump,
+    CachedCompilation,
+    CompilerConfig,
+    Scratch,
+)
 
 
 class GitHubRepoAdmin(admin.ModelAdmin[GitHubRepo]):
@@ -30,6 +37,8 @@ admin.site.register(Profile)
 admin.site.register(GitHubUser)
 admin.site.register(Asm)
 admin.site.register(Assembly)
+admin.site.register(AssemblyDump)
+admin.site.register(CachedCompilation)
 admin.site.register(Scratch)
 admin.site.register(CompilerConfig)
 admin.site.register(Project)
@@ -1,27 +1,160 @@
-import json
+import hashlib
 import logging
+import re
 import subprocess
-from typing import List, Optional
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 import asm_differ.diff as asm_differ
+from django.conf import settings
 
 from coreapp import platforms
 from coreapp.platforms import DUMMY, Platform
 
+from . import disasm, elf, metrics, process_pool, util
 from .compiler_wrapper import DiffResult, PATH
 
 from .error import AssemblyError, DiffError, NmError, ObjdumpError
-from .models.scratch import Assembly
+from .models.scratch import Assembly, AssemblyDump
 from .sandbox import Sandbox
 
 logger = logging.getLogger(__name__)
 
 MAX_FUNC_SIZE_LINES = 5000
 
+# Bump this when changes to create_config or asm-differ affect how target assemblies
+# are dumped or processed, to invalidate cached target dumps
+TARGET_DUMP_CACHE_VERSION = 1
+
+# Dumps of target assemblies, which never change, so that diffing only has to dump
+# the newly compiled object
+_target_dumps: util.LRUCache[str, str] = util.LRUCache(settings.TARGET_DUMP_CACHE_SIZE)
+
+# Processed lines of the target dumps, kept by whichever process diffs them
+_target_lines: util.LRUCache[str, List[asm_differ.Line]] = util.LRUCache(
+    settings.TARGET_DUMP_CACHE_SIZE
+)
+
+
+@dataclass(frozen=True)
+class PreviousDiff:
+    target_key: Tuple[str, str, str]
+    arch: str
+    mydump: str
+    process_cache: asm_differ.ProcessCache
+    result: DiffResult
+    threeway: Optional[str]
+    # What three-way diffs show in their "previous" column
+    last_diff: Optional[asm_differ.Diff]
+
+
+# .rodata references of compiled objects, which are otherwise parsed again whenever an
+# object from the compilation cache is dumped again
+_rodata_references: util.LRUCache[str, str] = util.LRUCache(
+    settings.COMPILATION_CACHE_SIZE
+)
+
+
+# The latest diff of each scratch, so that rediffing it after an edit only has to
+# process the instructions that changed, or nothing if the compiled code is unchanged
+_previous_diffs: util.LRUCache[str, PreviousDiff] = util.LRUCache(
+    settings.INCREMENTAL_DIFF_CACHE_SIZE
+)
+
+# e.g. 00000000 <func_80929D04>:
+RE_SYMBOL_HEADER = re.compile(r"^[0-9a-f]+ <(.+)>:$", re.MULTILINE)
+
+# Lines of a whole object's objdump output that don't belong to the function they
+# follow: section headers, and the "..." that objdump prints for skipped zeroes
+RE_OBJDUMP_FILLER = re.compile(r"^(Disassembly of section .*:|\s*\.\.\.)$")
+
+
+def split_functions(dump: str, names: Optional[Set[str]]) -> Dict[str, str]:
+    """
+    Split objdump output of a whole section by function. Symbols that aren't in
+    `names`, like local labels, are part of the function they're in.
+    """
+    functions: Dict[str, str] = {}
+    name: Optional[str] = None
+    start = 0
+    for match in RE_SYMBOL_HEADER.finditer(dump):
+        if names is not None and match[1] not in names:
+            continue
+        if name is not None:
+            functions[name] = dump[start : match.start()]
+        name = match[1]
+        start = match.end() + 1
+    if name is not None:
+        functions[name] = dump[start:]
+    return functions
+
+
+def preprocess_function_dump(dump: str) -> str:
+    """
+    Clean up a function split out of a whole object's objdump output, so that it
+    looks like what preprocess_objdump_out makes of a single function's dump
+    """
+    return "\n".join(
+        line for line in dump.split("\n") if line and not RE_OBJDUMP_FILLER.match(line)
+    )
+
+
+def diff_dumps(
+    arch_name: str,
+    target_hash: str,
+    target_dump: str,
+    mydump: str,
+    process_cache: asm_differ.ProcessCache,
+    threeway: Optional[str] = None,
+    last_diff: Optional[asm_differ.Diff] = None,
+) -> Tuple[DiffResult, asm_differ.ProcessCache, Optional[asm_differ.Diff]]:
+    """
+    Process and diff the dump of a compiled object against the target's, run in the
+    process pool. The process cache is returned too, since the pool fills in a copy
+    of it, and for three-way diffs so is the diff to compare the next one against.
+    """
+    config = AsmDifferWrapper.create_config(asm_differ.get_arch(arch_name), threeway)
+
+    base_lines = _target_lines.get(target_hash)
+    if base_lines is None:
+        base_lines = asm_differ.process(target_dump, config)
+        _target_lines.put(target_hash, base_lines)
+
+    # Equivalent to asm_differ.Display.run_diff(), but with the target's lines
+    # already processed
+    my_lines = asm_differ.process(mydump, config, process_cache)
+    diff_output = asm_differ.do_diff(base_lines, my_lines, config)
+    meta, diff_lines = asm_differ.align_diffs(
+        last_diff or diff_output, diff_output, config
+    )
+
+    assert isinstance(config.formatter, asm_differ.JsonFormatter)
+    result = config.formatter.table_data(meta, diff_lines)
+    result["error"] = None
+
+    # As in asm_differ.Display.run_diff()
+    if threeway != "base" or last_diff is None:
+        last_diff = diff_output if threeway else None
+    return result, process_cache, last_diff
+
+
+def score_function(arch_name: str, base_dump: str, my_dump: str) -> Tuple[int, int]:
+    """
+    The score and max score of one function of an object diff, run in the process
+    pool
+    """
+    config = AsmDifferWrapper.create_config(asm_differ.get_arch(arch_name))
+    base_lines = asm_differ.process(base_dump, config)
+    my_lines = asm_differ.process(my_dump, config)
+    diff_output = asm_differ.do_diff(base_lines, my_lines, config)
+    return diff_output.score, diff_output.max_score
+
 
 class AsmDifferWrapper:
     @staticmethod
-    def create_config(arch: asm_differ.ArchSettings) -> asm_differ.Config:
+    def create_config(
+        arch: asm_differ.ArchSettings, threeway: Optional[str] = None
+    ) -> asm_differ.Config:
         return asm_differ.Config(
             arch=arch,
             # Build/objdump options
@@ -35,7 +168,7 @@ class AsmDifferWrapper:
             max_function_size_bytes=MAX_FUNC_SIZE_LINES * 4,
             # Display options
             formatter=asm_differ.JsonFormatter(arch_str=arch.name),
-            threeway=None,
+            threeway=threeway,
             base_shift=0,
             skip_lines=0,
             compress=None,
@@ -50,7 +183,11 @@ class AsmDifferWrapper:
 
     @staticmethod
     def get_objdump_target_function_flags(
-        sandbox: Sandbox, target_path, platform: Platform, label: Optional[str]
+        sandbox: Sandbox,
+        target_path,
+        target_data: bytes,
+        platform: Platform,
+        label: Optional[str],
     ) -> List[str]:
         if not label:
             return ["--start-address=0"]
@@ -58,6 +195,14 @@ class AsmDifferWrapper:
         if platform.supports_objdump_disassemble:
             return [f"--disassemble={label}"]
 
+        # Reading the symbol table ourselves saves running nm in the sandbox
+        try:
+            symbol = elf.find_symbol(target_data, label)
+        except elf.ElfError as e:
+            logger.debug(f"Could not read symbols, falling back to nm: {e}")
+        else:
+            return [f"--start-address={symbol.value if symbol else 0}"]
+
         if not platform.nm_cmd:
             raise NmError(f"No nm command for {platform.id}")
 
@@ -103,7 +248,7 @@ class AsmDifferWrapper:
             target_path.write_bytes(target_data)
 
             flags += AsmDifferWrapper.get_objdump_target_function_flags(
-                sandbox, target_path, platform, label
+                sandbox, target_path, target_data, platform, label
             )
 
             if platform.objdump_cmd:
@@ -126,6 +271,54 @@ class AsmDifferWrapper:
         out = objdump_proc.stdout
         return out
 
+    @staticmethod
+    def disassemble(
+        elf_object: bytes,
+        platform: Platform,
+        config: asm_differ.Config,
+        label: Optional[str],
+    ) -> str:
+        """
+        objdump's output for an object, from the in-process disassembler of its arch
+        if it has one that supports the object
+        """
+        disassembler = disasm.for_arch(platform.arch)
+        if (
+            settings.IN_PROCESS_DISASSEMBLY
+            and disassembler is not None
+            and not (label and platform.supports_objdump_disassemble)
+        ):
+            try:
+                start_address = 0
+                if label:
+                    symbol = elf.find_symbol(elf_object, label)
+                    start_address = symbol.value if symbol else 0
+                out = disassembler.disassemble(elf_object, start_address)
+            except (disasm.UnsupportedObject, elf.ElfError) as e:
+                logger.debug(f"Could not disassemble in-process, using objdump: {e}")
+                metrics.increment("disassembly.fallbacks")
+            else:
+                metrics.increment("disassembly.in_process")
+                return out
+
+        return AsmDifferWrapper.run_objdump(elf_object, platform, config, label)
+
+    @staticmethod
+    def get_rodata_references(elf_object: bytes, config: asm_differ.Config) -> str:
+        """
+        The DATAREF lines that asm-differ prepends to the dump of an object
+        """
+        key = util.gen_stable_hash(
+            (config.diff_section, hashlib.sha256(elf_object).hexdigest())
+        )
+        references = _rodata_references.get(key)
+        if references is None:
+            references = asm_differ.serialize_rodata_references(
+                asm_differ.parse_elf_rodata_references(elf_object, config)
+            )
+            _rodata_references.put(key, references)
+        return references
+
     @staticmethod
     def get_dump(
         elf_object: bytes,
@@ -137,7 +330,7 @@ class AsmDifferWrapper:
         if len(elf_object) == 0:
             raise AssemblyError("Asm empty")
 
-        basedump = AsmDifferWrapper.run_objdump(
+        basedump = AsmDifferWrapper.disassemble(
             elf_object, platform, config, diff_label
         )
         if not basedump:
@@ -145,8 +338,10 @@ class AsmDifferWrapper:
 
         # Preprocess the dump
         try:
-            basedump = asm_differ.preprocess_objdump_out(
-                None, elf_object, basedump, config
+            # The object's .rodata references are cached, so leave them out here
+            basedump = asm_differ.preprocess_objdump_out(None, None, basedump, config)
+            basedump = (
+                AsmDifferWrapper.get_rodata_references(elf_object, config) + basedump
             )
         except AssertionError as e:
             logger.exception("Error preprocessing dump")
@@ -156,6 +351,49 @@ class AsmDifferWrapper:
 
         return basedump
 
+    @staticmethod
+    def get_target_dump(
+        target_assembly: Assembly,
+        platform: Platform,
+        diff_label: Optional[str],
+        config: asm_differ.Config,
+    ) -> Tuple[str, str]:
+        """
+        The hash and dump of a target assembly
+        """
+        hash = util.gen_stable_hash(
+            (
+                str(TARGET_DUMP_CACHE_VERSION),
+                platform.id,
+                diff_label or "",
+                target_assembly.hash,
+            )
+        )
+
+        dump = _target_dumps.get(hash)
+        if dump is not None:
+            metrics.increment("target_dump_cache.hits")
+            return hash, dump
+        metrics.increment("target_dump_cache.misses")
+
+        cached_dump: Optional[AssemblyDump] = None
+        if settings.PERSIST_TARGET_DUMPS:
+            cached_dump = AssemblyDump.objects.filter(hash=hash).first()
+
+        if cached_dump is not None:
+            dump = cached_dump.dump
+        else:
+            dump = AsmDifferWrapper.get_dump(
+                bytes(target_assembly.elf_object), platform, diff_label, config
+            )
+            if settings.PERSIST_TARGET_DUMPS:
+                AssemblyDump.objects.update_or_create(
+                    hash=hash, defaults={"assembly": target_assembly, "dump": dump}
+                )
+
+        _target_dumps.put(hash, dump)
+        return hash, dump
+
     @staticmethod
     def diff(
         target_assembly: Assembly,
@@ -163,7 +401,18 @@ class AsmDifferWrapper:
         diff_label: Optional[str],
         compiled_elf: bytes,
         allow_target_only: bool = False,
+        incremental_key: Optional[str] = None,
+        threeway: Optional[str] = None,
     ) -> DiffResult:
+        """
+        Diff the compiled object against the target. Diffs sharing an
+        `incremental_key` (i.e. those of the same scratch) reuse the work of the
+        previous one where its results would be the same.
+
+        With `threeway`, the diff has a third column comparing it against the
+        previous diff with the same `incremental_key` ("prev"), or against the first
+        one ("base"), like asm-differ's --threeway option.
+        """
 
         if platform == DUMMY:
             # Todo produce diff for dummy
@@ -177,8 +426,8 @@ class AsmDifferWrapper:
 
         config = AsmDifferWrapper.create_config(arch)
 
-        basedump = AsmDifferWrapper.get_dump(
-            bytes(target_assembly.elf_object), platform, diff_label, config
+        target_hash, target_dump = AsmDifferWrapper.get_target_dump(
+            target_assembly, platform, diff_label, config
         )
         try:
             mydump = AsmDifferWrapper.get_dump(
@@ -190,17 +439,149 @@ class AsmDifferWrapper:
             else:
                 raise e
 
+        target_key = (platform.id, diff_label or "", target_assembly.hash)
+        previous = _previous_diffs.get(incremental_key) if incremental_key else None
+        if previous is not None and previous.arch != arch.name:
+            previous = None
+
+        last_diff = None
+        if previous is not None and previous.target_key == target_key:
+            # Unless its third column shows the previous diff, the diff of an unchanged
+            # object is the same as before
+            if (
+                previous.mydump == mydump
+                and previous.threeway == threeway
+                and threeway != "prev"
+            ):
+                metrics.increment("incremental_diff.unchanged")
+                return previous.result
+
+            if threeway and previous.threeway:
+                last_diff = previous.last_diff
+
+        process_cache = asm_differ.ProcessCache(
+            previous.process_cache if previous is not None else None
+        )
+
         try:
-            display = asm_differ.Display(basedump, mydump, config)
+            result, process_cache, last_diff = process_pool.run(
+                diff_dumps,
+                arch.name,
+                target_hash,
+                target_dump,
+                mydump,
+                process_cache,
+                threeway,
+                last_diff,
+            )
         except Exception as e:
             raise DiffError(f"Error running asm-differ: {e}")
 
+        metrics.increment("incremental_diff.reused_instructions", process_cache.hits)
+        if incremental_key:
+            _previous_diffs.put(
+                incremental_key,
+                PreviousDiff(
+                    target_key,
+                    arch.name,
+                    mydump,
+                    process_cache,
+                    result,
+                    threeway,
+                    last_diff,
+                ),
+            )
+
+        return result
+
+    @staticmethod
+    def get_function_dumps(
+        elf_object: bytes, platform: Platform, config: asm_differ.Config
+    ) -> Dict[str, str]:
+        """
+        Disassemble a whole object once, and split it into a dump of each function
+        """
+
+        if len(elf_object) == 0:
+            raise AssemblyError("Asm empty")
+
+        objdump_out = AsmDifferWrapper.disassemble(elf_object, platform, config, None)
+        if not objdump_out:
+            raise ObjdumpError("Error running objdump")
+
+        try:
+            names: Optional[Set[str]] = elf.function_names(elf_object)
+        except elf.ElfError as e:
+            logger.debug(f"Could not read symbols, splitting at every label: {e}")
+            names = None
+
         try:
-            # TODO: It would be nice to get a python object from `run_diff()` to avoid the
-            # JSON roundtrip. See https://github.com/simonlindholm/asm-differ/issues/56
-            result = json.loads(display.run_diff()[0])
-            result["error"] = None
+            data_refs = AsmDifferWrapper.get_rodata_references(elf_object, config)
+            return {
+                name: data_refs + preprocess_function_dump(dump)
+                for name, dump in split_functions(objdump_out, names).items()
+            }
+        except Exception as e:
+            raise DiffError(f"Error preprocessing dump: {e}")
+
+    @staticmethod
+    def diff_object(
+        target_assembly: Assembly, platform: Platform, compiled_elf: bytes
+    ) -> DiffResult:
+        """
+        Diff every function of the compiled object against the function of the same
+        name in the target, in parallel, and summarize their scores. Target functions
+        missing from the compiled object get their max score.
+        """
+
+        if platform == DUMMY:
+            return {}
+
+        try:
+            arch = asm_differ.get_arch(platform.arch or "")
+        except ValueError:
+            logger.error(f"Unsupported arch: {platform.arch}. Continuing assuming mips")
+            arch = asm_differ.get_arch("mips")
+
+        config = AsmDifferWrapper.create_config(arch)
+
+        base_dumps = AsmDifferWrapper.get_function_dumps(
+            bytes(target_assembly.elf_object), platform, config
+        )
+        my_dumps = AsmDifferWrapper.get_function_dumps(compiled_elf, platform, config)
+
+        try:
+            scores = process_pool.run_all(
+                score_function,
+                [
+                    (arch.name, base_dump, my_dumps.get(name, ""))
+                    for name, base_dump in base_dumps.items()
+                ],
+            )
         except Exception as e:
             raise DiffError(f"Error running asm-differ: {e}")
 
-        return result
+        functions: List[Dict[str, Any]] = []
+        current_score = 0
+        max_score = 0
+        for name, (score, function_max_score) in zip(base_dumps, scores):
+            functions.append(
+                {
+                    "name": name,
+                    "status": "matched" if name in my_dumps else "missing",
+                    "current_score": score,
+                    "max_score": function_max_score,
+                }
+            )
+            current_score += score
+            max_score += function_max_score
+
+        for name in my_dumps:
+            if name not in base_dumps:
+                functions.append({"name": name, "status": "extra"})
+
+        return {
+            "current_score": current_score,
+            "max_score": max_score,
+            "functions": functions,
+        }
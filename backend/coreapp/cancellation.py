@@ -0,0 +1,120 @@
+"""
+Cancellation of work that a newer request from the same editor has superseded
+"""
+import contextlib
+import logging
+import threading
+from contextvars import ContextVar
+from typing import Callable, Dict, Hashable, Iterator, List, Optional
+
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class CompilationSuperseded(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_code = "superseded"
+    default_detail = "A newer compilation of this scratch was requested."
+
+
+class CancellationToken:
+    def __init__(self) -> None:
+        self.cancelled = False
+        self._lock = threading.Lock()
+        self._kills: List[Callable[[], None]] = []
+
+    def cancel(self) -> None:
+        with self._lock:
+            self.cancelled = True
+            kills = list(self._kills)
+
+        for kill in kills:
+            try:
+                kill()
+            except Exception:
+                logger.exception("Failed to kill superseded process")
+
+    def check(self) -> None:
+        if self.cancelled:
+            raise CompilationSuperseded()
+
+    def _add(self, kill: Callable[[], None]) -> None:
+        with self._lock:
+            self.check()
+            self._kills.append(kill)
+
+    def _remove(self, kill: Callable[[], None]) -> None:
+        with self._lock:
+            self._kills.remove(kill)
+
+
+_current_token: ContextVar[Optional[CancellationToken]] = ContextVar(
+    "cancellation_token", default=None
+)
+
+
+def cancelled() -> bool:
+    token = _current_token.get()
+    return token is not None and token.cancelled
+
+
+@contextlib.contextmanager
+def cancellable(kill: Callable[[], None]) -> Iterator[None]:
+    """
+    Runs the block with `kill` registered to stop it should the current request be
+    superseded, in which case the block raises CompilationSuperseded
+    """
+    token = _current_token.get()
+    if token is None:
+        yield
+        return
+
+    token._add(kill)
+    try:
+        yield
+    except Exception:
+        # Errors caused by the kill aren't interesting
+        token.check()
+        raise
+    finally:
+        token._remove(kill)
+
+    token.check()
+
+
+_in_flight: Dict[Hashable, CancellationToken] = {}
+_in_flight_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def supersedable(key: Optional[Hashable]) -> Iterator[CancellationToken]:
+    """
+    Runs the block as the latest request for `key`, cancelling any block still running
+    for the same key. Sandboxed processes started within the block are killed if a
+    newer request for the key arrives.
+    """
+    token = CancellationToken()
+
+    if key is not None:
+        with _in_flight_lock:
+            previous = _in_flight.get(key)
+            _in_flight[key] = token
+
+        if previous is not None:
+            metrics.increment("compilation.superseded")
+            previous.cancel()
+
+    reset = _current_token.set(token)
+    try:
+        yield token
+    finally:
+        _current_token.reset(reset)
+
+        if key is not None:
+            with _in_flight_lock:
+                if _in_flight.get(key) is token:
+                    del _in_flight[key]
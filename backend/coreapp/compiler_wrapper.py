@@ -7,15 +7,17 @@ from platform import uname
 from typing import Any, Dict, Optional, Tuple
 
 from django.conf import settings
+from django.utils.timezone import now
 
 from coreapp import compilers, platforms
 from coreapp.compilers import Compiler
 
 from coreapp.platforms import Platform
-from . import util
+from . import cancellation, metrics, util
+from .cancellation import CompilationSuperseded
 
 from .error import AssemblyError, CompilationError
-from .models.scratch import Asm, Assembly
+from .models.scratch import Asm, Assembly, CachedCompilation
 from .sandbox import Sandbox
 
 logger = logging.getLogger(__name__)
@@ -35,6 +37,14 @@ if "microsoft" in uname().release.lower() and not settings.USE_SANDBOX_JAIL:
 else:
     WINE = "wine"
 
+# Bump this to invalidate all persisted compilations, e.g. when the way compilers
+# are invoked changes in a way that affects their output
+COMPILATION_CACHE_VERSION = 2
+
+# Likewise for assemblies. Rows stored under an older version are no longer looked up,
+# and get removed by the `gc_assemblies` management command once nothing references them
+ASSEMBLY_CACHE_VERSION = 1
+
 
 @dataclass
 class CompilationResult:
@@ -42,11 +52,70 @@ class CompilationResult:
     errors: str
 
 
-def _check_assembly_cache(*args: str) -> Tuple[Optional[Assembly], str]:
-    hash = util.gen_hash(args)
+_compilations_in_flight: util.SingleFlight[CompilationResult] = util.SingleFlight()
+
+
+def _check_assembly_cache(
+    platform: Platform, asm: Asm
+) -> Tuple[Optional[Assembly], str]:
+    hash = util.gen_stable_hash(
+        (
+            str(ASSEMBLY_CACHE_VERSION),
+            platform.id,
+            platform.assemble_cmd,
+            platform.asm_prelude,
+            asm.hash,
+        )
+    )
     return Assembly.objects.filter(hash=hash).first(), hash
 
 
+def _check_compilation_cache(
+    compiler: Compiler, compiler_flags: str, code: str, context: str
+) -> Tuple[Optional[CompilationResult], str]:
+    hash = util.gen_stable_hash(
+        (
+            str(COMPILATION_CACHE_VERSION),
+            compiler.id,
+            # The flags as the compiler gets them, which keeps whitespace in quotes
+            Sandbox.quote_options(compiler_flags),
+            code,
+            context,
+        )
+    )
+
+    if settings.COMPILATION_DB_CACHE_SIZE <= 0:
+        return None, hash
+
+    cached: Optional[CachedCompilation] = CachedCompilation.objects.filter(
+        hash=hash
+    ).first()
+    if cached is None:
+        metrics.increment("compilation_cache.misses")
+        return None, hash
+
+    metrics.increment("compilation_cache.hits")
+    CachedCompilation.objects.filter(hash=hash).update(last_used=now())
+    return CompilationResult(bytes(cached.elf_object), cached.errors), hash
+
+
+def _save_compilation(hash: str, compiler: Compiler, result: CompilationResult) -> None:
+    # The least recently used compilations beyond COMPILATION_DB_CACHE_SIZE are
+    # removed by the `gc_compilations` management command
+    if settings.COMPILATION_DB_CACHE_SIZE <= 0:
+        return
+
+    CachedCompilation.objects.update_or_create(
+        hash=hash,
+        defaults={
+            "compiler": compiler.id,
+            "elf_object": result.elf_object,
+            "errors": result.errors,
+            "last_used": now(),
+        },
+    )
+
+
 class CompilerWrapper:
     @staticmethod
     def filter_compiler_flags(compiler_flags: str) -> str:
@@ -104,12 +173,46 @@ class CompilerWrapper:
     def compile_code(
         compiler: Compiler, compiler_flags: str, code: str, context: str
     ) -> CompilationResult:
-        if compiler == compilers.DUMMY:
-            return CompilationResult(f"compiled({context}\n{code}".encode("UTF-8"), "")
-
         code = code.replace("\r\n", "\n")
         context = context.replace("\r\n", "\n")
 
+        cached_result, hash = _check_compilation_cache(
+            compiler, compiler_flags, code, context
+        )
+        if cached_result:
+            logger.debug(f"Compilation cache hit! hash: {hash}")
+            return cached_result
+
+        def run() -> CompilationResult:
+            result = CompilerWrapper._run_compiler(
+                compiler, compiler_flags, code, context
+            )
+            _save_compilation(hash, compiler, result)
+            return result
+
+        # Identical compilations that are already running are waited for, not repeated
+        while True:
+            try:
+                result, shared = _compilations_in_flight.do(hash, run)
+                break
+            except CompilationSuperseded:
+                if cancellation.cancelled():
+                    raise
+                # The request we were waiting on was superseded, but this one wasn't
+                logger.debug(f"Retrying superseded compilation, hash: {hash}")
+
+        if shared:
+            logger.debug(f"Coalesced compilation with one in flight, hash: {hash}")
+            metrics.increment("compilation.coalesced")
+        return result
+
+    @staticmethod
+    def _run_compiler(
+        compiler: Compiler, compiler_flags: str, code: str, context: str
+    ) -> CompilationResult:
+        if compiler == compilers.DUMMY:
+            return CompilationResult(f"compiled({context}\n{code}".encode("UTF-8"), "")
+
         with Sandbox() as sandbox:
             code_path = sandbox.path / "code.c"
             object_path = sandbox.path / "object.o"
@@ -143,6 +246,7 @@ class CompilerWrapper:
                         "COMPILER_FLAGS": sandbox.quote_options(compiler_flags),
                         "MWCIncludes": "/tmp",
                     },
+                    wine=compiler.needs_wine,
                 )
             except subprocess.CalledProcessError as e:
                 # Compilation failed
@@ -173,7 +277,7 @@ class CompilerWrapper:
                 f"Assemble command for platform {platform.id} not found"
             )
 
-        cached_assembly, hash = _check_assembly_cache(platform.id, asm.hash)
+        cached_assembly, hash = _check_assembly_cache(platform, asm)
         if cached_assembly:
             logger.debug(f"Assembly cache hit! hash: {hash}")
             return cached_assembly
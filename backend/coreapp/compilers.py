@@ -35,12 +35,15 @@ class Compiler:
     is_gcc: ClassVar[bool] = False
     is_ido: ClassVar[bool] = False
     is_mwcc: ClassVar[bool] = False
-    needs_wine = False
 
     @property
     def path(self) -> Path:
         return COMPILER_BASE_PATH / (self.base_id or self.id)
 
+    @property
+    def needs_wine(self) -> bool:
+        return "${WINE}" in self.cc
+
     def available(self) -> bool:
         # consider compiler binaries present if the compiler's directory is found
         return self.path.exists()
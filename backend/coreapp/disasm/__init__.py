@@ -0,0 +1,22 @@
+"""
+In-process disassemblers, which produce the same output as objdump for the objects
+they support, without running it in a sandbox
+"""
+from typing import Dict, Optional
+
+from .base import Disassembler, UnsupportedObject
+from .mips import MipsDisassembler
+
+__all__ = ["Disassembler", "UnsupportedObject", "for_arch"]
+
+_disassemblers: Dict[str, Disassembler] = {
+    "mips": MipsDisassembler(),
+    "mipsel": MipsDisassembler(),
+}
+
+
+def for_arch(arch: Optional[str]) -> Optional[Disassembler]:
+    """
+    The in-process disassembler for an asm-differ arch, if there is one
+    """
+    return _disassemblers.get(arch or "")
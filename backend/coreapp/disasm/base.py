@@ -0,0 +1,515 @@
+"""
+The part of objdump's output that doesn't depend on the architecture: section and
+symbol headers, function names from --line-numbers, relocations, and the symbols
+that addresses in operands are shown relative to. Mirrors binutils' objdump.c and
+the ELF parts of BFD that it uses.
+"""
+import functools
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from .. import elf
+
+ET_REL = 1
+STB_GLOBAL = 1
+STB_WEAK = 2
+STT_NOTYPE = 0
+
+# Sections whose line number information objdump would show instead of function names
+DEBUG_SECTION_PREFIXES = (".debug", ".zdebug", ".stab", ".line")
+DEBUG_SECTIONS = (".mdebug",)
+
+
+def is_compiler_note(name: str) -> bool:
+    return "gnu_compiled" in name or "gcc2_compiled" in name
+
+
+class UnsupportedObject(Exception):
+    """
+    The object has something that an in-process disassembler can't reproduce
+    objdump's output for, so objdump has to disassemble it instead
+    """
+
+
+@dataclass(frozen=True)
+class Instruction:
+    size: int
+    # The bytes column, as objdump shows it
+    raw: str
+    mnemonic: str
+    operands: str = ""
+    # An address that objdump shows after the operands, with the nearest symbol
+    target: Optional[int] = None
+
+
+@dataclass
+class _LineState:
+    # The function of the last --line-numbers output
+    function: Optional[str] = None
+    # BFD's cache of the last function found, which keeps it for the whole of its
+    # size even if other symbols start within it
+    cache_section: Optional[int] = None
+    cache_symbol: Optional[elf.ElfSymbol] = None
+    cache_size: int = 0
+
+
+class Disassembler:
+    """
+    Disassembles the code sections of relocatable ELF objects into the same text as
+    `objdump --disassemble --disassemble-zeroes --line-numbers --reloc`, with
+    --start-address if given one, for the objects that it supports. Subclasses
+    decode the instructions of an architecture.
+    """
+
+    def file_format(self, elf_file: elf.ElfFile) -> str:
+        raise NotImplementedError
+
+    def check_object(self, elf_file: elf.ElfFile) -> None:
+        """
+        Raise UnsupportedObject if objdump would disassemble the object differently
+        than decode() does
+        """
+        raise NotImplementedError
+
+    def decode(self, data: bytes, offset: int, little_endian: bool) -> Instruction:
+        """
+        Decode the instruction at `offset` of a section, which is also its address
+        """
+        raise NotImplementedError
+
+    def relocation_name(self, type: int) -> str:
+        raise NotImplementedError
+
+    def disassemble(self, elf_object: bytes, start_address: int = 0) -> str:
+        try:
+            elf_file = elf.parse_elf(elf_object)
+        except elf.ElfError as e:
+            raise UnsupportedObject(f"Could not read object: {e}")
+        self.check_object(elf_file)
+        return _ObjdumpWriter(self, elf_file).write(start_address)
+
+
+class _ObjdumpWriter:
+    def __init__(self, disassembler: Disassembler, elf_file: elf.ElfFile):
+        self.disassembler = disassembler
+        self.elf_file = elf_file
+        self.sections = elf_file.sections
+        self.symbols = elf_file.symbols
+        self.address_width = 8 if elf_file.is_32bit else 16
+        self.out: List[str] = []
+        self.line_state = _LineState()
+
+        if elf_file.type != ET_REL:
+            raise UnsupportedObject("Not a relocatable object")
+        for section in self.sections:
+            if (
+                section.name.startswith(DEBUG_SECTION_PREFIXES)
+                or section.name in DEBUG_SECTIONS
+            ):
+                raise UnsupportedObject(f"Debugging information in {section.name}")
+
+        # Relocation sections, by the index of the section they apply to. objdump only
+        # treats addresses as relative to their own section in objects with some.
+        self.relocation_sections: Dict[int, elf.ElfSection] = {}
+        self.has_relocations = False
+        for section in self.sections:
+            if section.type not in (elf.SHT_REL, elf.SHT_RELA):
+                continue
+            entry_size = {
+                (elf.SHT_REL, True): 8,
+                (elf.SHT_RELA, True): 12,
+                (elf.SHT_REL, False): 16,
+                (elf.SHT_RELA, False): 24,
+            }[(section.type, elf_file.is_32bit)]
+            if (
+                section.entsize != entry_size
+                or section.link != elf_file.symtab_index
+                or not 0 < section.info < len(self.sections)
+                or self.sections[section.info].type in (elf.SHT_REL, elf.SHT_RELA)
+                or section.info in self.relocation_sections
+            ):
+                raise UnsupportedObject(f"Unusual relocation section {section.name}")
+            self.relocation_sections[section.info] = section
+            self.has_relocations = True
+
+        for symbol in self.symbols:
+            if symbol.bind not in (elf.STB_LOCAL, STB_GLOBAL, STB_WEAK):
+                raise UnsupportedObject(f"Unusual binding of {symbol.name}")
+            if symbol.type > elf.STT_FILE:
+                raise UnsupportedObject(f"Unusual type of {symbol.name}")
+            if (
+                symbol.section_index >= len(self.sections)
+                and not self.is_common(symbol)
+                and not (
+                    symbol.type == elf.STT_FILE and symbol.section_index == elf.SHN_ABS
+                )
+            ):
+                raise UnsupportedObject(f"Unusual section of {symbol.name}")
+            if (
+                symbol.other & 3
+                and symbol.bind == elf.STB_LOCAL
+                and symbol.type == STT_NOTYPE
+                and symbol.size == 0
+            ):
+                # Which binutils versions ignore as functions
+                raise UnsupportedObject(f"Hidden local symbol {symbol.name}")
+
+        # The symbols that objdump shows addresses relative to
+        self.address_symbols = [
+            symbol
+            for symbol in self.symbols
+            if symbol.name
+            and symbol.type not in (elf.STT_SECTION, elf.STT_FILE)
+            and symbol.defined
+            and not self.is_common(symbol)
+        ]
+
+    def is_common(self, symbol: elf.ElfSymbol) -> bool:
+        return symbol.section_index in (elf.SHN_COMMON, 0xFF03)  # SHN_MIPS_SCOMMON
+
+    def section_name(self, symbol: elf.ElfSymbol) -> str:
+        return self.sections[symbol.section_index].name
+
+    def code_sections(self) -> List[elf.ElfSection]:
+        # BFD creates the sections in order, except that a relocation section creates
+        # the section it applies to when it's reached first
+        order: List[int] = []
+        for section in self.sections[1:]:
+            if section.type in (elf.SHT_REL, elf.SHT_RELA):
+                index = section.info
+            else:
+                index = section.index
+            if index not in order:
+                order.append(index)
+        return [
+            self.sections[i]
+            for i in order
+            if self.sections[i].flags & elf.SHF_EXECINSTR
+            and self.sections[i].type != elf.SHT_NOBITS
+        ]
+
+    def write(self, start_address: int) -> str:
+        self.out.append(
+            f"\nout.s:     file format {self.disassembler.file_format(self.elf_file)}\n\n"
+        )
+        for section in self.code_sections():
+            self.write_section(section, start_address)
+        return "".join(self.out)
+
+    def format_value(self, value: int, skip_zeroes: bool) -> str:
+        text = f"{value:0{self.address_width}x}"
+        if skip_zeroes:
+            text = text.lstrip("0") or "0"
+        return text
+
+    def format_address(
+        self,
+        section: elf.ElfSection,
+        symbol: Optional[elf.ElfSymbol],
+        address: int,
+        skip_zeroes: bool,
+    ) -> str:
+        """
+        e.g. 1c <func+0x1c>, as objdump_print_addr_with_sym()
+        """
+        if symbol is None:
+            name = section.name
+            base = 0
+        else:
+            name = symbol.name
+            base = symbol.value
+        if base > address:
+            name += "-0x" + self.format_value(base - address, True)
+        elif address > base:
+            name += "+0x" + self.format_value(address - base, True)
+        return f"{self.format_value(address, skip_zeroes)} <{name}>"
+
+    def compare_symbols(
+        self, section: elf.ElfSection, a: elf.ElfSymbol, b: elf.ElfSymbol
+    ) -> int:
+        """
+        The order of objdump's sorted symbols, for disassembling `section`
+        """
+        if a.value != b.value:
+            return -1 if a.value < b.value else 1
+
+        # Prefer symbols in the section being disassembled
+        a_here = self.section_name(a) == section.name
+        b_here = self.section_name(b) == section.name
+        if a_here != b_here:
+            return -1 if a_here else 1
+
+        def is_file_name(name: str) -> bool:
+            return len(name) > 2 and name[-2] == "." and name[-1] in "oa"
+
+        for check in (is_compiler_note, is_file_name):
+            if check(a.name) != check(b.name):
+                return 1 if check(a.name) else -1
+
+        flag_order: Tuple[Tuple[Callable[[elf.ElfSymbol], bool], int], ...] = (
+            (lambda s: s.type == elf.STT_FUNC, -1),
+            (lambda s: s.type == elf.STT_OBJECT, -1),
+            (lambda s: s.bind == elf.STB_LOCAL, 1),
+            (lambda s: s.bind == STB_GLOBAL, -1),
+        )
+        for has_flag, order in flag_order:
+            if has_flag(a) != has_flag(b):
+                return order if has_flag(a) else -order
+
+        # Larger symbols first
+        if a.size != b.size:
+            return -1 if a.size > b.size else 1
+
+        # Then those that don't look like section names
+        if a.name.startswith(".") != b.name.startswith("."):
+            return 1 if a.name.startswith(".") else -1
+
+        return (a.name > b.name) - (a.name < b.name)
+
+    def find_symbol(
+        self,
+        symbols: List[elf.ElfSymbol],
+        section: elf.ElfSection,
+        address: int,
+        require_section: bool,
+    ) -> Tuple[Optional[elf.ElfSymbol], int]:
+        """
+        The symbol to show an address relative to, and its index in `symbols`, as
+        objdump's find_symbol_for_address()
+        """
+        if not symbols:
+            return None, 0
+
+        # The last symbol at or before the address, or the first one
+        low, high = 0, len(symbols)
+        while low + 1 < high:
+            middle = (low + high) // 2
+            if symbols[middle].value > address:
+                high = middle
+            elif symbols[middle].value < address:
+                low = middle
+            else:
+                low = middle
+                break
+        place = low
+        while place > 0 and symbols[place].value == symbols[place - 1].value:
+            place -= 1
+
+        def in_section(i: int) -> bool:
+            return symbols[i].section_index == section.index
+
+        # Prefer one in the same section, of those with the same value
+        i = place
+        while i < high and symbols[i].value == symbols[place].value:
+            if in_section(i):
+                return symbols[i], i
+            i += 1
+
+        want_section = require_section or (
+            self.has_relocations and 0 <= address < section.size
+        )
+        if want_section and not in_section(place):
+            new_place: Optional[int] = None
+            for j in range(i - 1, -1, -1):
+                if in_section(j):
+                    if new_place is not None and (
+                        symbols[j].value != symbols[new_place].value
+                    ):
+                        break
+                    new_place = j
+            if new_place is not None:
+                place = new_place
+            else:
+                # No symbol before it, so look for one after it
+                for j in range(place + 1, len(symbols)):
+                    if in_section(j):
+                        place = j
+                        break
+            if not in_section(place):
+                return None, 0
+
+        return symbols[place], place
+
+    def write_section(self, section: elf.ElfSection, start_address: int) -> None:
+        data = self.elf_file.section_data(section)
+        if not data or start_address >= len(data):
+            return
+
+        relocations: Deque[elf.ElfRelocation] = deque()
+        relocation_section = self.relocation_sections.get(section.index)
+        if relocation_section is not None:
+            relocations = deque(
+                sorted(
+                    (
+                        relocation
+                        for relocation in self.elf_file.relocations[
+                            relocation_section.index
+                        ]
+                        if relocation.offset >= start_address
+                    ),
+                    key=lambda relocation: relocation.offset,
+                )
+            )
+
+        def compare(a: elf.ElfSymbol, b: elf.ElfSymbol) -> int:
+            return self.compare_symbols(section, a, b)
+
+        symbols = sorted(self.address_symbols, key=functools.cmp_to_key(compare))
+
+        self.out.append(f"\nDisassembly of section {section.name}:\n")
+
+        # Disassemble a block for each symbol, starting from the one at or before
+        # the start address
+        symbol, place = self.find_symbol(symbols, section, start_address, True)
+        offset = start_address
+        while offset < len(data):
+            self.out.append(
+                f"\n{self.format_address(section, symbol, offset, False)}:\n"
+            )
+
+            next_symbol: Optional[elf.ElfSymbol]
+            if symbol is None or symbol.value > offset:
+                next_symbol = symbol
+            else:
+                current = symbol
+                while place < len(symbols) and not (
+                    self.section_name(symbols[place]) == section.name
+                    and symbols[place].value > current.value
+                ):
+                    place += 1
+                next_symbol = symbols[place] if place < len(symbols) else None
+
+            if next_symbol is None:
+                stop = len(data)
+            else:
+                stop = next_symbol.value
+            if stop > len(data) or stop <= offset:
+                stop = len(data)
+
+            if (
+                symbol is not None
+                and symbol.section_index == section.index
+                and symbol.value <= offset
+                and symbol.type != elf.STT_FUNC
+                and (symbol.type == elf.STT_OBJECT or is_compiler_note(symbol.name))
+            ):
+                # objdump shows these as data
+                raise UnsupportedObject(f"Data symbol {symbol.name} in code")
+
+            self.write_instructions(section, data, symbols, relocations, offset, stop)
+            offset = stop
+            symbol = next_symbol
+
+    def write_instructions(
+        self,
+        section: elf.ElfSection,
+        data: bytes,
+        symbols: List[elf.ElfSymbol],
+        relocations: Deque[elf.ElfRelocation],
+        offset: int,
+        stop: int,
+    ) -> None:
+        # Leading zeroes of addresses are left out in groups of 4, keeping at least one
+        end = self.format_value(len(data), False)
+        skip = len(end) - len(end.lstrip("0"))
+        if skip:
+            skip = (skip - 1) & -4
+
+        while offset < stop:
+            self.write_function_name(section, offset)
+
+            instruction = self.disassembler.decode(
+                data, offset, self.elf_file.is_little_endian
+            )
+            if offset + instruction.size > stop:
+                raise UnsupportedObject(f"Instruction across a symbol at {offset:#x}")
+
+            address = self.format_value(offset, False)[skip:]
+            address = address.lstrip("0").rjust(len(address))
+            if address.endswith(" "):
+                address = address[:-1] + "0"
+
+            text = instruction.mnemonic
+            operands = instruction.operands
+            if instruction.target is not None:
+                if instruction.target < 0 or instruction.target >> 32:
+                    raise UnsupportedObject(f"Unusual address at {offset:#x}")
+                operands += self.format_target(section, symbols, instruction.target)
+            if operands:
+                text += "\t" + operands
+            self.out.append(f"{address}:\t{instruction.raw}\t{text}\n")
+
+            while relocations and relocations[0].offset < offset + instruction.size:
+                self.write_relocation(relocations.popleft())
+
+            offset += instruction.size
+
+    def format_target(
+        self, section: elf.ElfSection, symbols: List[elf.ElfSymbol], address: int
+    ) -> str:
+        if not symbols:
+            return "0x" + self.format_value(address, True)
+        symbol, _ = self.find_symbol(symbols, section, address, False)
+        return self.format_address(section, symbol, address, True)
+
+    def write_relocation(self, relocation: elf.ElfRelocation) -> None:
+        name = self.disassembler.relocation_name(relocation.type)
+        if relocation.symbol_index == 0:
+            symbol_name = "*ABS*"
+        elif relocation.symbol_index > len(self.symbols):
+            raise UnsupportedObject("Relocation against a missing symbol")
+        else:
+            symbol = self.symbols[relocation.symbol_index - 1]
+            symbol_name = symbol.name
+            if not symbol_name:
+                if not 0 < symbol.section_index < len(self.sections):
+                    raise UnsupportedObject("Relocation against an unnamed symbol")
+                symbol_name = self.section_name(symbol)
+
+        addend = ""
+        if relocation.addend:
+            sign = "-" if relocation.addend < 0 else "+"
+            addend = f"{sign}0x{self.format_value(abs(relocation.addend), True)}"
+
+        offset = self.format_value(relocation.offset, True)
+        self.out.append(f"\t\t\t{offset}: {name}\t{symbol_name}{addend}\n")
+
+    def write_function_name(self, section: elf.ElfSection, offset: int) -> None:
+        """
+        The function name that --line-numbers shows when it changes, which without
+        debugging information comes from the symbol table
+        """
+        state = self.line_state
+        cached = state.cache_symbol
+        if (
+            state.cache_section != section.index
+            or cached is None
+            or offset < cached.value
+            or offset >= cached.value + state.cache_size
+        ):
+            state.cache_section = section.index
+            state.cache_symbol = None
+            state.cache_size = 0
+            low = 0
+            for symbol in self.symbols:
+                if (
+                    symbol.type in (elf.STT_SECTION, elf.STT_FILE, elf.STT_OBJECT)
+                    or symbol.section_index != section.index
+                ):
+                    continue
+                size = symbol.size or 1
+                if symbol.value <= offset and (
+                    symbol.value > low
+                    or (symbol.value == low and size > state.cache_size)
+                ):
+                    state.cache_symbol = symbol
+                    state.cache_size = size
+                    low = symbol.value
+
+        if state.cache_symbol is None or not state.cache_symbol.name:
+            return
+        name = state.cache_symbol.name
+        if name != state.function:
+            self.out.append(f"{name}():\n")
+            state.function = name
@@ -0,0 +1,431 @@
+"""
+Decoding of 32-bit MIPS code as `objdump -m mips:4300` shows it: the VR4300's
+instructions, up to MIPS III, with o32 register names and binutils' aliases
+"""
+from typing import Callable, Dict, Optional, Tuple
+
+from .. import elf
+from .base import Disassembler, Instruction, UnsupportedObject
+
+EM_MIPS = 8
+EF_MIPS_ABI2 = 0x20
+EF_MIPS_ARCH_ASE_M16 = 0x04000000
+EF_MIPS_MICROMIPS = 0x02000000
+STO_MIPS_ISA = 0x80
+
+GPR_NAMES = (
+    "zero",
+    "at",
+    "v0",
+    "v1",
+    "a0",
+    "a1",
+    "a2",
+    "a3",
+    "t0",
+    "t1",
+    "t2",
+    "t3",
+    "t4",
+    "t5",
+    "t6",
+    "t7",
+    "s0",
+    "s1",
+    "s2",
+    "s3",
+    "s4",
+    "s5",
+    "s6",
+    "s7",
+    "t8",
+    "t9",
+    "k0",
+    "k1",
+    "gp",
+    "sp",
+    "s8",
+    "ra",
+)
+
+RELOCATION_NAMES = {
+    0: "R_MIPS_NONE",
+    2: "R_MIPS_32",
+    4: "R_MIPS_26",
+    5: "R_MIPS_HI16",
+    6: "R_MIPS_LO16",
+    7: "R_MIPS_GPREL16",
+    8: "R_MIPS_LITERAL",
+    9: "R_MIPS_GOT16",
+    10: "R_MIPS_PC16",
+    11: "R_MIPS_CALL16",
+    12: "R_MIPS_GPREL32",
+    37: "R_MIPS_JALR",
+}
+
+# SPECIAL instructions by function field
+SPECIAL_SHIFTS = {0x00: "sll", 0x02: "srl", 0x03: "sra"}
+SPECIAL_SHIFTS.update({0x38: "dsll", 0x3A: "dsrl", 0x3B: "dsra"})
+SPECIAL_SHIFTS.update({0x3C: "dsll32", 0x3E: "dsrl32", 0x3F: "dsra32"})
+SPECIAL_VARIABLE_SHIFTS = {0x04: "sllv", 0x06: "srlv", 0x07: "srav"}
+SPECIAL_VARIABLE_SHIFTS.update({0x14: "dsllv", 0x16: "dsrlv", 0x17: "dsrav"})
+SPECIAL_ARITHMETIC = {
+    0x20: "add",
+    0x21: "addu",
+    0x22: "sub",
+    0x23: "subu",
+    0x24: "and",
+    0x25: "or",
+    0x26: "xor",
+    0x27: "nor",
+    0x2A: "slt",
+    0x2B: "sltu",
+    0x2C: "dadd",
+    0x2D: "daddu",
+    0x2E: "dsub",
+    0x2F: "dsubu",
+}
+SPECIAL_MULTIPLY = {0x18: "mult", 0x19: "multu", 0x1C: "dmult", 0x1D: "dmultu"}
+SPECIAL_DIVIDE = {0x1A: "div", 0x1B: "divu", 0x1E: "ddiv", 0x1F: "ddivu"}
+SPECIAL_TRAPS = {0x30: "tge", 0x31: "tgeu", 0x32: "tlt", 0x33: "tltu"}
+SPECIAL_TRAPS.update({0x34: "teq", 0x36: "tne"})
+SPECIAL_MOVES_FROM = {0x10: "mfhi", 0x12: "mflo"}
+SPECIAL_MOVES_TO = {0x11: "mthi", 0x13: "mtlo"}
+
+# Aliases for subtracting from zero, and moving
+NEGATIONS = {"sub": "neg", "subu": "negu", "dsub": "dneg", "dsubu": "dnegu"}
+MOVES = ("addu", "daddu", "or")
+
+REGIMM_BRANCHES = {0x00: "bltz", 0x01: "bgez", 0x02: "bltzl", 0x03: "bgezl"}
+REGIMM_BRANCHES.update({0x10: "bltzal", 0x11: "bgezal", 0x12: "bltzall"})
+REGIMM_BRANCHES.update({0x13: "bgezall"})
+REGIMM_TRAPS = {0x08: "tgei", 0x09: "tgeiu", 0x0A: "tlti", 0x0B: "tltiu"}
+REGIMM_TRAPS.update({0x0C: "teqi", 0x0E: "tnei"})
+
+BRANCHES = {0x04: "beq", 0x05: "bne", 0x14: "beql", 0x15: "bnel"}
+BRANCH_ALIASES = {"beq": "beqz", "bne": "bnez", "beql": "beqzl", "bnel": "bnezl"}
+ZERO_BRANCHES = {0x06: "blez", 0x07: "bgtz", 0x16: "blezl", 0x17: "bgtzl"}
+SIGNED_IMMEDIATES = {0x08: "addi", 0x09: "addiu", 0x0A: "slti", 0x0B: "sltiu"}
+SIGNED_IMMEDIATES.update({0x18: "daddi", 0x19: "daddiu"})
+UNSIGNED_IMMEDIATES = {0x0C: "andi", 0x0D: "ori", 0x0E: "xori"}
+LOADS_STORES = {
+    0x1A: "ldl",
+    0x1B: "ldr",
+    0x20: "lb",
+    0x21: "lh",
+    0x22: "lwl",
+    0x23: "lw",
+    0x24: "lbu",
+    0x25: "lhu",
+    0x26: "lwr",
+    0x27: "lwu",
+    0x28: "sb",
+    0x29: "sh",
+    0x2A: "swl",
+    0x2B: "sw",
+    0x2C: "sdl",
+    0x2D: "sdr",
+    0x2E: "swr",
+    0x30: "ll",
+    0x34: "lld",
+    0x37: "ld",
+    0x38: "sc",
+    0x3C: "scd",
+    0x3F: "sd",
+}
+FPU_LOADS_STORES = {0x31: "lwc1", 0x35: "ldc1", 0x39: "swc1", 0x3D: "sdc1"}
+
+COP0_MOVES = {0x00: "mfc0", 0x01: "dmfc0", 0x04: "mtc0", 0x05: "dmtc0"}
+COP1_MOVES = {0x00: "mfc1", 0x01: "dmfc1", 0x04: "mtc1", 0x05: "dmtc1"}
+COP1_CONTROL_MOVES = {0x02: "cfc1", 0x06: "ctc1"}
+COP1_BRANCHES = ("bc1f", "bc1t", "bc1fl", "bc1tl")
+
+FPU_FORMATS = {0x10: "s", 0x11: "d", 0x14: "w", 0x15: "l"}
+FPU_BINARY = {0x00: "add", 0x01: "sub", 0x02: "mul", 0x03: "div"}
+FPU_UNARY = {0x04: "sqrt", 0x05: "abs", 0x06: "mov", 0x07: "neg"}
+FPU_UNARY.update({0x08: "round.l", 0x09: "trunc.l", 0x0A: "ceil.l"})
+FPU_UNARY.update({0x0B: "floor.l", 0x0C: "round.w", 0x0D: "trunc.w"})
+FPU_UNARY.update({0x0E: "ceil.w", 0x0F: "floor.w"})
+FPU_CONVERSIONS = {0x20: "cvt.s", 0x21: "cvt.d", 0x24: "cvt.w", 0x25: "cvt.l"}
+FPU_CONDITIONS = (
+    "f",
+    "un",
+    "eq",
+    "ueq",
+    "olt",
+    "ult",
+    "ole",
+    "ule",
+    "sf",
+    "ngle",
+    "seq",
+    "ngl",
+    "lt",
+    "nge",
+    "le",
+    "ngt",
+)
+
+
+def _signed(value: int) -> int:
+    return value - 0x10000 if value & 0x8000 else value
+
+
+class _Fields:
+    def __init__(self, word: int, address: int):
+        self.word = word
+        self.address = address
+        self.rs = (word >> 21) & 0x1F
+        self.rt = (word >> 16) & 0x1F
+        self.rd = (word >> 11) & 0x1F
+        self.sa = (word >> 6) & 0x1F
+        self.funct = word & 0x3F
+        self.immediate = word & 0xFFFF
+
+    @property
+    def s(self) -> str:
+        return GPR_NAMES[self.rs]
+
+    @property
+    def t(self) -> str:
+        return GPR_NAMES[self.rt]
+
+    @property
+    def d(self) -> str:
+        return GPR_NAMES[self.rd]
+
+    @property
+    def offset(self) -> str:
+        return f"{_signed(self.immediate)}({self.s})"
+
+    @property
+    def branch_target(self) -> int:
+        return self.address + 4 + (_signed(self.immediate) << 2)
+
+    def require_zero(self, mask: int) -> None:
+        if self.word & mask:
+            raise UnsupportedObject(f"Unknown instruction {self.word:08x}")
+
+
+# (mnemonic, operands, branch target)
+_Decoded = Tuple[str, str, Optional[int]]
+
+
+def _decode_special(f: _Fields) -> _Decoded:
+    if f.word == 0:
+        return "nop", "", None
+    if f.funct in SPECIAL_SHIFTS:
+        f.require_zero(0x03E00000)
+        if f.word in (0x40, 0xC0):
+            # ssnop and ehb, which depend on the binutils version
+            raise UnsupportedObject(f"Unknown instruction {f.word:08x}")
+        return SPECIAL_SHIFTS[f.funct], f"{f.d},{f.t},{f.sa:#x}", None
+    if f.funct in SPECIAL_VARIABLE_SHIFTS:
+        f.require_zero(0x7C0)
+        return SPECIAL_VARIABLE_SHIFTS[f.funct], f"{f.d},{f.t},{f.s}", None
+    if f.funct in SPECIAL_ARITHMETIC:
+        f.require_zero(0x7C0)
+        mnemonic = SPECIAL_ARITHMETIC[f.funct]
+        if f.rt == 0 and mnemonic in MOVES:
+            return "move", f"{f.d},{f.s}", None
+        if f.rs == 0 and mnemonic in NEGATIONS:
+            return NEGATIONS[mnemonic], f"{f.d},{f.t}", None
+        if f.rt == 0 and mnemonic == "nor":
+            # Shown as either nor or not, depending on the binutils version
+            raise UnsupportedObject(f"Ambiguous instruction {f.word:08x}")
+        return mnemonic, f"{f.d},{f.s},{f.t}", None
+    if f.funct in SPECIAL_MULTIPLY:
+        f.require_zero(0xFFC0)
+        return SPECIAL_MULTIPLY[f.funct], f"{f.s},{f.t}", None
+    if f.funct in SPECIAL_DIVIDE:
+        f.require_zero(0xFFC0)
+        return SPECIAL_DIVIDE[f.funct], f"zero,{f.s},{f.t}", None
+    if f.funct in SPECIAL_TRAPS:
+        code = (f.word >> 6) & 0x3FF
+        operands = f"{f.s},{f.t},{code:#x}" if code else f"{f.s},{f.t}"
+        return SPECIAL_TRAPS[f.funct], operands, None
+    if f.funct in SPECIAL_MOVES_FROM:
+        f.require_zero(0x03FF07C0)
+        return SPECIAL_MOVES_FROM[f.funct], f.d, None
+    if f.funct in SPECIAL_MOVES_TO:
+        f.require_zero(0x001FFFC0)
+        return SPECIAL_MOVES_TO[f.funct], f.s, None
+    if f.funct == 0x08:
+        f.require_zero(0x001FFFC0)
+        return "jr", f.s, None
+    if f.funct == 0x09:
+        f.require_zero(0x001F07C0)
+        return "jalr", f.s if f.rd == 31 else f"{f.d},{f.s}", None
+    if f.funct == 0x0C:
+        code = (f.word >> 6) & 0xFFFFF
+        return "syscall", f"{code:#x}" if code else "", None
+    if f.funct == 0x0D:
+        code, extra = (f.word >> 16) & 0x3FF, (f.word >> 6) & 0x3FF
+        if extra:
+            return "break", f"{code:#x},{extra:#x}", None
+        return "break", f"{code:#x}" if code else "", None
+    if f.word == 0x0000000F:
+        return "sync", "", None
+    raise UnsupportedObject(f"Unknown instruction {f.word:08x}")
+
+
+def _decode_regimm(f: _Fields) -> _Decoded:
+    if f.rt in REGIMM_TRAPS:
+        return REGIMM_TRAPS[f.rt], f"{f.s},{_signed(f.immediate)}", None
+    if f.rt not in REGIMM_BRANCHES:
+        raise UnsupportedObject(f"Unknown instruction {f.word:08x}")
+    mnemonic = REGIMM_BRANCHES[f.rt]
+    if f.rs == 0:
+        aliases = {"bgez": "b", "bgezal": "bal"}
+        if mnemonic not in aliases:
+            # Some of these have aliases in some binutils versions
+            raise UnsupportedObject(f"Ambiguous instruction {f.word:08x}")
+        return aliases[mnemonic], "", f.branch_target
+    return mnemonic, f"{f.s},", f.branch_target
+
+
+def _decode_cop0(f: _Fields) -> _Decoded:
+    if f.rs in COP0_MOVES:
+        f.require_zero(0x7FF)
+        return COP0_MOVES[f.rs], f"{f.t},${f.rd}", None
+    # TLB instructions and eret, which binutils might show as generic c0 operations
+    raise UnsupportedObject(f"Unknown instruction {f.word:08x}")
+
+
+def _decode_fpu(f: _Fields) -> _Decoded:
+    fmt = FPU_FORMATS.get(f.rs)
+    if fmt is None:
+        raise UnsupportedObject(f"Unknown instruction {f.word:08x}")
+    ft, fs, fd = f"$f{f.rt}", f"$f{f.rd}", f"$f{f.sa}"
+
+    if fmt in ("w", "l"):
+        if f.funct not in (0x20, 0x21):
+            raise UnsupportedObject(f"Unknown instruction {f.word:08x}")
+        f.require_zero(0x001F0000)
+        return f"{FPU_CONVERSIONS[f.funct]}.{fmt}", f"{fd},{fs}", None
+
+    if f.funct in FPU_BINARY:
+        return f"{FPU_BINARY[f.funct]}.{fmt}", f"{fd},{fs},{ft}", None
+    if f.funct in FPU_UNARY:
+        f.require_zero(0x001F0000)
+        return f"{FPU_UNARY[f.funct]}.{fmt}", f"{fd},{fs}", None
+    if f.funct in FPU_CONVERSIONS and FPU_CONVERSIONS[f.funct] != f"cvt.{fmt}":
+        f.require_zero(0x001F0000)
+        return f"{FPU_CONVERSIONS[f.funct]}.{fmt}", f"{fd},{fs}", None
+    if f.funct >= 0x30:
+        f.require_zero(0x7C0)
+        return f"c.{FPU_CONDITIONS[f.funct & 0xF]}.{fmt}", f"{fs},{ft}", None
+    raise UnsupportedObject(f"Unknown instruction {f.word:08x}")
+
+
+def _decode_cop1(f: _Fields) -> _Decoded:
+    if f.rs in COP1_MOVES:
+        f.require_zero(0x7FF)
+        return COP1_MOVES[f.rs], f"{f.t},$f{f.rd}", None
+    if f.rs in COP1_CONTROL_MOVES:
+        f.require_zero(0x7FF)
+        return COP1_CONTROL_MOVES[f.rs], f"{f.t},${f.rd}", None
+    if f.rs == 0x08:
+        if f.rt >= len(COP1_BRANCHES):
+            # Condition codes other than 0 don't exist before MIPS IV
+            raise UnsupportedObject(f"Unknown instruction {f.word:08x}")
+        return COP1_BRANCHES[f.rt], "", f.branch_target
+    return _decode_fpu(f)
+
+
+def _decode(f: _Fields) -> _Decoded:
+    opcode = f.word >> 26
+    if opcode in OPCODE_DECODERS:
+        return OPCODE_DECODERS[opcode](f)
+
+    if opcode in (0x02, 0x03):
+        target = ((f.address + 4) & 0xF0000000) | ((f.word & 0x03FFFFFF) << 2)
+        return ("j", "jal")[opcode - 2], "", target
+    if opcode in BRANCHES:
+        mnemonic = BRANCHES[opcode]
+        if f.rt != 0:
+            return mnemonic, f"{f.s},{f.t},", f.branch_target
+        if f.rs == 0:
+            if mnemonic != "beq":
+                raise UnsupportedObject(f"Ambiguous instruction {f.word:08x}")
+            return "b", "", f.branch_target
+        return BRANCH_ALIASES[mnemonic], f"{f.s},", f.branch_target
+    if opcode in ZERO_BRANCHES:
+        f.require_zero(0x001F0000)
+        return ZERO_BRANCHES[opcode], f"{f.s},", f.branch_target
+    if opcode in SIGNED_IMMEDIATES:
+        mnemonic = SIGNED_IMMEDIATES[opcode]
+        if f.rs == 0:
+            if mnemonic != "addiu":
+                raise UnsupportedObject(f"Ambiguous instruction {f.word:08x}")
+            return "li", f"{f.t},{_signed(f.immediate)}", None
+        return mnemonic, f"{f.t},{f.s},{_signed(f.immediate)}", None
+    if opcode in UNSIGNED_IMMEDIATES:
+        mnemonic = UNSIGNED_IMMEDIATES[opcode]
+        if f.rs == 0 and mnemonic == "ori":
+            return "li", f"{f.t},{f.immediate:#x}", None
+        return mnemonic, f"{f.t},{f.s},{f.immediate:#x}", None
+    if opcode == 0x0F:
+        f.require_zero(0x03E00000)
+        return "lui", f"{f.t},{f.immediate:#x}", None
+    if opcode in LOADS_STORES:
+        return LOADS_STORES[opcode], f"{f.t},{f.offset}", None
+    if opcode in FPU_LOADS_STORES:
+        return FPU_LOADS_STORES[opcode], f"$f{f.rt},{f.offset}", None
+    if opcode == 0x2F:
+        return "cache", f"{f.rt:#x},{f.offset}", None
+    raise UnsupportedObject(f"Unknown instruction {f.word:08x}")
+
+
+OPCODE_DECODERS: Dict[int, Callable[[_Fields], _Decoded]] = {
+    0x00: _decode_special,
+    0x01: _decode_regimm,
+    0x10: _decode_cop0,
+    0x11: _decode_cop1,
+}
+
+
+class MipsDisassembler(Disassembler):
+    def file_format(self, elf_file: elf.ElfFile) -> str:
+        if elf_file.is_little_endian:
+            return "elf32-tradlittlemips"
+        return "elf32-tradbigmips"
+
+    def check_object(self, elf_file: elf.ElfFile) -> None:
+        if elf_file.machine != EM_MIPS or not elf_file.is_32bit:
+            raise UnsupportedObject("Not a 32-bit MIPS object")
+        if elf_file.flags & EF_MIPS_ABI2:
+            raise UnsupportedObject("n32 objects use other register names")
+        if elf_file.flags & (EF_MIPS_ARCH_ASE_M16 | EF_MIPS_MICROMIPS):
+            raise UnsupportedObject("MIPS16 or microMIPS code")
+
+        for section in elf_file.sections:
+            if section.flags & elf.SHF_EXECINSTR and section.size % 4:
+                raise UnsupportedObject(f"Partial instructions in {section.name}")
+
+        for symbol in elf_file.symbols:
+            if symbol.other & STO_MIPS_ISA:
+                raise UnsupportedObject(f"Compressed code at {symbol.name}")
+            if not 0 < symbol.section_index < len(elf_file.sections):
+                continue
+            section = elf_file.sections[symbol.section_index]
+            if section.flags & elf.SHF_EXECINSTR and symbol.value % 4:
+                raise UnsupportedObject(f"Misaligned symbol {symbol.name}")
+
+    def decode(self, data: bytes, offset: int, little_endian: bool) -> Instruction:
+        word = int.from_bytes(
+            data[offset : offset + 4], "little" if little_endian else "big"
+        )
+        mnemonic, operands, target = _decode(_Fields(word, offset))
+        return Instruction(
+            size=4,
+            raw=f"{word:08x} ",
+            mnemonic=mnemonic,
+            operands=operands,
+            target=target,
+        )
+
+    def relocation_name(self, type: int) -> str:
+        if type not in RELOCATION_NAMES:
+            raise UnsupportedObject(f"Unknown relocation type {type}")
+        return RELOCATION_NAMES[type]
@@ -0,0 +1,263 @@
+"""
+Minimal in-process ELF reading, to avoid running binutils in a sandbox for simple queries
+"""
+import struct
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+
+SHT_SYMTAB = 2
+SHT_RELA = 4
+SHT_NOBITS = 8
+SHT_REL = 9
+SHF_EXECINSTR = 0x4
+SHN_UNDEF = 0
+SHN_ABS = 0xFFF1
+SHN_COMMON = 0xFFF2
+STB_LOCAL = 0
+STT_OBJECT = 1
+STT_FUNC = 2
+STT_SECTION = 3
+STT_FILE = 4
+
+
+class ElfError(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class ElfSection:
+    index: int
+    name: str
+    type: int
+    flags: int
+    offset: int
+    size: int
+    link: int
+    info: int
+    entsize: int
+
+
+@dataclass(frozen=True)
+class ElfSymbol:
+    name: str
+    value: int
+    size: int
+    type: int
+    bind: int
+    section_index: int
+    other: int = 0
+
+    @property
+    def defined(self) -> bool:
+        return self.section_index != SHN_UNDEF
+
+
+@dataclass(frozen=True)
+class ElfRelocation:
+    offset: int
+    type: int
+    # Index into the symbol table, where 0 is the null symbol that parse_elf leaves out
+    symbol_index: int
+    # None for SHT_REL relocations, whose addends are in the relocated data
+    addend: Optional[int]
+
+
+@dataclass(frozen=True)
+class ElfFile:
+    data: bytes
+    is_32bit: bool
+    is_little_endian: bool
+    type: int
+    machine: int
+    flags: int
+    sections: List[ElfSection]
+    symtab_index: int
+    symbols: List[ElfSymbol]
+    # Keyed by the index of the SHT_REL or SHT_RELA section they're read from
+    relocations: Dict[int, List[ElfRelocation]]
+
+    def section_data(self, section: ElfSection) -> bytes:
+        if section.type == SHT_NOBITS:
+            return b""
+        if section.offset + section.size > len(self.data):
+            raise ElfError("Truncated ELF file")
+        return self.data[section.offset : section.offset + section.size]
+
+
+def parse_elf(data: bytes) -> ElfFile:
+    """
+    Read the sections, symbols and relocations of a 32- or 64-bit ELF file of either
+    endianness
+    """
+    e_ident = data[:16]
+    if e_ident[:4] != b"\x7FELF":
+        raise ElfError("Not an ELF file")
+
+    is_32bit = e_ident[4] == 1
+    is_little_endian = e_ident[5] == 1
+    str_end = "<" if is_little_endian else ">"
+    str_off = "I" if is_32bit else "Q"
+
+    def read(spec: str, offset: int) -> Tuple[int, ...]:
+        spec = spec.replace("P", str_off)
+        size = struct.calcsize(spec)
+        if offset < 0 or offset + size > len(data):
+            raise ElfError("Truncated ELF file")
+        return struct.unpack(str_end + spec, data[offset : offset + size])
+
+    def read_str(offset: int) -> str:
+        end = data.find(b"\0", offset)
+        if offset < 0 or end == -1:
+            raise ElfError("Unterminated string")
+        return data[offset:end].decode("latin1")
+
+    e_type, e_machine = read("HH", 0x10)
+    e_shoff = read("P", 0x20 if is_32bit else 0x28)[0]
+    e_flags = read("I", 0x24 if is_32bit else 0x30)[0]
+    e_shentsize, e_shnum, e_shstrndx = read("HHH", 0x2E if is_32bit else 0x3A)
+    if e_shoff == 0 or e_shnum == 0:
+        raise ElfError("No section headers")
+
+    headers = [read("IIPPPPIIPP", e_shoff + i * e_shentsize) for i in range(e_shnum)]
+    # Section names are optional here, since only some queries need them
+    names_offset = headers[e_shstrndx][4] if 0 < e_shstrndx < e_shnum else None
+
+    sections: List[ElfSection] = []
+    for i, header in enumerate(headers):
+        (
+            sh_name,
+            sh_type,
+            sh_flags,
+            sh_addr,
+            sh_offset,
+            sh_size,
+            sh_link,
+            sh_info,
+            sh_addralign,
+            sh_entsize,
+        ) = header
+        sections.append(
+            ElfSection(
+                index=i,
+                name=read_str(names_offset + sh_name) if names_offset else "",
+                type=sh_type,
+                flags=sh_flags,
+                offset=sh_offset,
+                size=sh_size,
+                link=sh_link,
+                info=sh_info,
+                entsize=sh_entsize,
+            )
+        )
+
+    symtabs = [s for s in sections if s.type == SHT_SYMTAB]
+    if len(symtabs) != 1:
+        raise ElfError("Expected exactly one symbol table")
+    symtab = symtabs[0]
+    if symtab.link >= len(sections) or symtab.entsize == 0:
+        raise ElfError("Malformed symbol table")
+    str_offset = sections[symtab.link].offset
+
+    symbols: List[ElfSymbol] = []
+    # The first entry is always the null symbol
+    for offset in range(
+        symtab.offset + symtab.entsize, symtab.offset + symtab.size, symtab.entsize
+    ):
+        if is_32bit:
+            st_name, st_value, st_size, st_info, st_other, st_shndx = read(
+                "IIIBBH", offset
+            )
+        else:
+            st_name, st_info, st_other, st_shndx, st_value, st_size = read(
+                "IBBHQQ", offset
+            )
+        symbols.append(
+            ElfSymbol(
+                name=read_str(str_offset + st_name),
+                value=st_value,
+                size=st_size,
+                type=st_info & 0xF,
+                bind=st_info >> 4,
+                section_index=st_shndx,
+                other=st_other,
+            )
+        )
+
+    relocations: Dict[int, List[ElfRelocation]] = {}
+    for section in sections:
+        if section.type not in (SHT_REL, SHT_RELA) or section.entsize == 0:
+            continue
+        is_rela = section.type == SHT_RELA
+        # (r_offset, r_info, r_addend)
+        spec = "PP" + ("i" if is_32bit else "q") if is_rela else "PP"
+        entries: List[ElfRelocation] = []
+        for offset in range(
+            section.offset, section.offset + section.size, section.entsize
+        ):
+            r_offset, r_info, *r_addend = read(spec, offset)
+            if is_32bit:
+                symbol_index, type = r_info >> 8, r_info & 0xFF
+            else:
+                symbol_index, type = r_info >> 32, r_info & 0xFFFFFFFF
+            entries.append(
+                ElfRelocation(
+                    offset=r_offset,
+                    type=type,
+                    symbol_index=symbol_index,
+                    addend=r_addend[0] if is_rela else None,
+                )
+            )
+        relocations[section.index] = entries
+
+    return ElfFile(
+        data=data,
+        is_32bit=is_32bit,
+        is_little_endian=is_little_endian,
+        type=e_type,
+        machine=e_machine,
+        flags=e_flags,
+        sections=sections,
+        symtab_index=symtab.index,
+        symbols=symbols,
+        relocations=relocations,
+    )
+
+
+def parse_symbols(data: bytes) -> List[ElfSymbol]:
+    """
+    Read the symbol table of a 32- or 64-bit ELF file of either endianness
+    """
+    return parse_elf(data).symbols
+
+
+def find_symbol(data: bytes, name: str) -> Optional[ElfSymbol]:
+    """
+    Find a defined symbol by name, as listed by `nm`
+    """
+    for symbol in parse_symbols(data):
+        if (
+            symbol.name == name
+            and symbol.defined
+            and symbol.type not in (STT_SECTION, STT_FILE)
+        ):
+            return symbol
+    return None
+
+
+def function_names(data: bytes) -> Set[str]:
+    """
+    Names of the defined functions: symbols typed as functions, and untyped global
+    ones, like those of glabel
+    """
+    return {
+        symbol.name
+        for symbol in parse_symbols(data)
+        if symbol.defined
+        and (
+            symbol.type == STT_FUNC
+            or (
+                symbol.type not in (STT_OBJECT, STT_SECTION, STT_FILE)
+                and symbol.bind != STB_LOCAL
+            )
+        )
+    }
@@ -1,5 +1,5 @@
 from subprocess import CalledProcessError
-from typing import ClassVar
+from typing import Any, ClassVar, Dict
 
 from rest_framework.response import Response
 from rest_framework.status import HTTP_400_BAD_REQUEST
@@ -27,6 +27,20 @@ def custom_exception_handler(exc, context):
     return response
 
 
+def error_json(exc: BaseException) -> Dict[str, Any]:
+    """
+    Describe an error in the same shape as custom_exception_handler, for places
+    that report errors outside of a response (e.g. batches and background jobs)
+    """
+    detail: Dict[str, Any]
+    if isinstance(exc, SubprocessError):
+        detail = {"code": exc.SUBPROCESS_NAME, "detail": exc.msg}
+    else:
+        detail = {"detail": "Internal error"}
+    detail["kind"] = exc.__class__.__name__
+    return detail
+
+
 class SubprocessError(Exception):
     SUBPROCESS_NAME: ClassVar[str] = "Subprocess"
     msg: str
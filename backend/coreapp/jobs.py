@@ -0,0 +1,243 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connections
+
+from .error import error_json
+
+logger = logging.getLogger(__name__)
+
+# Lower values run first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+PRIORITIES = {
+    "interactive": PRIORITY_INTERACTIVE,
+    "background": PRIORITY_BACKGROUND,
+}
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Job:
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    def __init__(
+        self, fn: Callable[[], Dict[str, Any]], priority: int, profile_id: Optional[int]
+    ) -> None:
+        self.id = uuid.uuid4().hex
+        self.fn = fn
+        self.priority = priority
+        self.profile_id = profile_id
+        self.status = Job.QUEUED
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[Dict[str, Any]] = None
+        self.finished_at: Optional[float] = None
+
+        self._done = threading.Event()
+        self._listeners: List[Callable[["Job"], Any]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    def add_listener(self, listener: Callable[["Job"], Any]) -> None:
+        """
+        Calls `listener` (on an arbitrary thread) once the job has finished,
+        or right away if it already has
+        """
+        with self._lock:
+            if not self.finished:
+                self._listeners.append(listener)
+                return
+        listener(self)
+
+    def run(self) -> None:
+        self.status = Job.RUNNING
+        try:
+            self.result = self.fn()
+            self.status = Job.DONE
+        except Exception as e:
+            logger.debug(f"Job {self.id} failed", exc_info=True)
+            self.error = error_json(e)
+            self.status = Job.FAILED
+
+        with self._lock:
+            self.finished_at = time.monotonic()
+            self._done.set()
+            listeners, self._listeners = self._listeners, []
+
+        for listener in listeners:
+            try:
+                listener(self)
+            except Exception:
+                logger.exception(f"Listener of job {self.id} failed")
+
+    def to_json(self) -> Dict[str, Any]:
+        ret: Dict[str, Any] = {"id": self.id, "status": self.status}
+        if self.result is not None:
+            ret["result"] = self.result
+        if self.error is not None:
+            ret["error"] = self.error
+        return ret
+
+
+class JobQueue:
+    """
+    An in-process queue that runs jobs on a fixed number of worker threads.
+
+    Jobs run in order of priority, then submission. Each profile can only have
+    `profile_limit` jobs running at once; further jobs of that profile wait without
+    holding up other profiles' jobs. Finished jobs are kept around for `ttl` seconds
+    so that their results can be fetched.
+
+    Submitting a job raises QueueFull if its profile already has `profile_max_pending`
+    unfinished jobs, or the queue `max_pending` of them in total (unless those are 0).
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        profile_limit: int,
+        ttl: float,
+        profile_max_pending: int = 0,
+        max_pending: int = 0,
+    ) -> None:
+        self.workers = workers
+        self.profile_limit = profile_limit
+        self.ttl = ttl
+        self.profile_max_pending = profile_max_pending
+        self.max_pending = max_pending
+
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        # Queued jobs, per profile, as heaps of (priority, seq, job)
+        self._queued: Dict[Optional[int], List[Tuple[int, int, Job]]] = {}
+        self._running: Dict[Optional[int], int] = {}
+        # Queued and running jobs, per profile
+        self._pending: Dict[Optional[int], int] = {}
+        self._jobs: Dict[str, Job] = {}
+        self._threads: List[threading.Thread] = []
+
+    def submit(
+        self,
+        fn: Callable[[], Dict[str, Any]],
+        priority: int = PRIORITY_INTERACTIVE,
+        profile_id: Optional[int] = None,
+    ) -> Job:
+        job = Job(fn, priority, profile_id)
+
+        with self._cond:
+            pending = self._pending.get(profile_id, 0)
+            if 0 < self.profile_max_pending <= pending:
+                raise QueueFull("Too many jobs of this profile are pending")
+            if 0 < self.max_pending <= sum(self._pending.values()):
+                raise QueueFull("Too many jobs are pending")
+            self._pending[profile_id] = pending + 1
+
+            self._expire()
+            self._jobs[job.id] = job
+            heapq.heappush(
+                self._queued.setdefault(profile_id, []),
+                (priority, next(self._seq), job),
+            )
+            self._start_workers()
+            self._cond.notify()
+
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def _expire(self) -> None:
+        cutoff = time.monotonic() - self.ttl
+        for job_id, job in list(self._jobs.items()):
+            if job.finished_at is not None and job.finished_at < cutoff:
+                del self._jobs[job_id]
+
+    def _start_workers(self) -> None:
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(
+                target=self._work,
+                name=f"job-worker-{len(self._threads)}",
+                daemon=True,
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def _take(self) -> Optional[Job]:
+        # The highest-priority job among profiles that are below their limit
+        best: Optional[Tuple[int, int, Job]] = None
+        for profile_id, heap in self._queued.items():
+            if self._running.get(profile_id, 0) >= self.profile_limit:
+                continue
+            if best is None or heap[0][:2] < best[:2]:
+                best = heap[0]
+
+        if best is None:
+            return None
+
+        job = best[2]
+        heap = self._queued[job.profile_id]
+        heapq.heappop(heap)
+        if not heap:
+            del self._queued[job.profile_id]
+        self._running[job.profile_id] = self._running.get(job.profile_id, 0) + 1
+        return job
+
+    def _work(self) -> None:
+        while True:
+            with self._cond:
+                job = self._take()
+                while job is None:
+                    self._cond.wait()
+                    job = self._take()
+
+            try:
+                job.run()
+            finally:
+                # Worker threads outlive requests, so don't leave their connections open
+                connections.close_all()
+
+                with self._cond:
+                    for counts in (self._running, self._pending):
+                        counts[job.profile_id] -= 1
+                        if not counts[job.profile_id]:
+                            del counts[job.profile_id]
+                    # A job of this profile may have become runnable
+                    self._cond.notify_all()
+
+
+_default_queue: Optional[JobQueue] = None
+_default_queue_lock = threading.Lock()
+
+
+def default_queue() -> JobQueue:
+    global _default_queue
+
+    with _default_queue_lock:
+        if _default_queue is None:
+            _default_queue = JobQueue(
+                settings.JOB_QUEUE_WORKERS,
+                settings.JOB_QUEUE_PROFILE_LIMIT,
+                settings.JOB_QUEUE_RESULT_TTL,
+                settings.JOB_QUEUE_PROFILE_MAX_PENDING,
+                settings.JOB_QUEUE_MAX_PENDING,
+            )
+        return _default_queue
@@ -1,13 +1,12 @@
-import contextlib
-import io
 import logging
+from typing import List
 
-from mips_to_c.src.main import parse_flags, run
+from django.conf import settings
+from mips_to_c.src.main import DecompilationResult, decompile, parse_flags
 
+from coreapp import process_pool
 from coreapp.compilers import Compiler
 
-from coreapp.sandbox import Sandbox
-
 logger = logging.getLogger(__name__)
 
 
@@ -15,6 +14,14 @@ class M2CError(Exception):
     pass
 
 
+def run_m2c(flags: List[str], asm: str, context: str) -> DecompilationResult:
+    """
+    Run mips_to_c with command line flags, in the process pool
+    """
+    options = parse_flags(flags)
+    return decompile(asm, options, context)
+
+
 class M2CWrapper:
     @staticmethod
     def get_triple(compiler: Compiler, arch: str) -> str:
@@ -38,32 +45,25 @@ class M2CWrapper:
 
     @staticmethod
     def decompile(asm: str, context: str, compiler: Compiler, arch: str) -> str:
-        with Sandbox() as sandbox:
-            flags = ["--stop-on-error", "--pointer-style=left"]
-
-            flags.append(f"--target={M2CWrapper.get_triple(compiler, arch)}")
-
-            # Create temp asm file
-            asm_path = sandbox.path / "asm.s"
-            asm_path.write_text(asm)
+        flags = ["--stop-on-error", "--pointer-style=left"]
 
-            if context:
-                # Create temp context file
-                ctx_path = sandbox.path / "ctx.c"
-                ctx_path.write_text(context)
+        flags.append(f"--target={M2CWrapper.get_triple(compiler, arch)}")
 
-                flags.append("--context")
-                flags.append(str(ctx_path))
-
-            flags.append(str(asm_path))
-            options = parse_flags(flags)
-
-            out_string = io.StringIO()
-            with contextlib.redirect_stdout(out_string):
-                returncode = run(options)
-            out_text = out_string.getvalue()
-
-            if returncode == 0:
-                return out_text
-            else:
-                raise M2CError(out_text)
+        # Share parsed contexts between worker processes and across restarts
+        if settings.M2C_CONTEXT_CACHE_DIR:
+            flags.append(f"--context-cache-dir={settings.M2C_CONTEXT_CACHE_DIR}")
+        else:
+            flags.append("--no-cache")
+
+        # The assembly and context are passed in memory, but mips_to_c's flags
+        # require a filename
+        flags.append("-")
+
+        try:
+            result = process_pool.run(run_m2c, flags, asm, context)
+        except process_pool.WorkerError as e:
+            raise M2CError(f"/* Error running mips_to_c: {e} */") from e
+        if result.returncode == 0:
+            return result.output
+        else:
+            raise M2CError(result.output)
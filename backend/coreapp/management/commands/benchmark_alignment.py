@@ -0,0 +1,109 @@
+import random
+import time
+from typing import List, NamedTuple, Sequence, Tuple
+
+import asm_differ.diff as asm_differ
+from django.core.management.base import BaseCommand, CommandParser
+
+from coreapp.asm_diff_wrapper import AsmDifferWrapper
+from coreapp.management.commands.benchmark_diff import (
+    dump_function,
+    generate_function,
+)
+
+ALGORITHMS = ["levenshtein", "difflib", "anchored"]
+
+
+class Alignment(NamedTuple):
+    algorithm: str
+    seconds: float
+    # Lower scores and more matched mnemonics mean a better alignment
+    score: int
+    matched: int
+
+
+def edited_function(rng: random.Random, size: int, edit_rate: float) -> Tuple[str, str]:
+    """
+    Dumps of a generated function and of a copy with instructions inserted, removed
+    or replaced in a few places
+    """
+    target = generate_function(rng, size)
+    current = list(target)
+    for _ in range(int(size * edit_rate)):
+        index = rng.randrange(len(current))
+        count = rng.randint(1, 4)
+        current[index : index + count] = generate_function(rng, rng.randint(0, 4))
+    return dump_function(target), dump_function(current)
+
+
+def compare_algorithms(
+    config: asm_differ.Config, basedump: str, mydump: str, algorithms: Sequence[str]
+) -> List[Alignment]:
+    base_lines = asm_differ.process(basedump, config)
+    my_lines = asm_differ.process(mydump, config)
+
+    alignments = []
+    for algorithm in algorithms:
+        start = time.perf_counter()
+        diffed_lines = asm_differ.diff_lines(base_lines, my_lines, algorithm)
+        elapsed = time.perf_counter() - start
+
+        matched = sum(
+            1
+            for line1, line2 in diffed_lines
+            if line1 and line2 and line1.mnemonic == line2.mnemonic
+        )
+        alignments.append(
+            Alignment(
+                algorithm,
+                elapsed,
+                asm_differ.score_diff_lines(diffed_lines, config),
+                matched,
+            )
+        )
+    return alignments
+
+
+class Command(BaseCommand):
+    help = "Compare the latency and quality of asm-differ's alignment algorithms"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--sizes",
+            type=int,
+            nargs="+",
+            default=[2000, 5000, 20000],
+            help="Lengths of the functions to align (default: 2000 5000 20000)",
+        )
+        parser.add_argument(
+            "--edit-rate",
+            type=float,
+            default=0.02,
+            help="Number of edits per instruction (default: 0.02)",
+        )
+        parser.add_argument(
+            "--algorithms",
+            nargs="+",
+            choices=ALGORITHMS,
+            default=ALGORITHMS,
+            help="Algorithms to compare (default: all)",
+        )
+
+    def handle(self, *args, **options) -> None:
+        rng = random.Random(0)
+        config = AsmDifferWrapper.create_config(asm_differ.get_arch("mips"))
+        config.max_function_size_lines = max(options["sizes"]) * 2
+
+        self.stdout.write(
+            f"{'size':>6} {'algorithm':<12} {'time':>10} {'score':>8} {'matched':>8}"
+        )
+        for size in options["sizes"]:
+            basedump, mydump = edited_function(rng, size, options["edit_rate"])
+            for alignment in compare_algorithms(
+                config, basedump, mydump, options["algorithms"]
+            ):
+                self.stdout.write(
+                    f"{size:>6} {alignment.algorithm:<12} "
+                    f"{alignment.seconds * 1000:>7.1f} ms "
+                    f"{alignment.score:>8} {alignment.matched:>8}"
+                )
@@ -0,0 +1,114 @@
+import random
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+from django.core.management.base import BaseCommand, CommandParser
+from mips_to_c.src import c_types
+from pycparser.c_parser import CParser
+
+TYPES = ["s32", "u8", "u16", "f32", "Vec3f", "void*", "Callback"]
+
+
+def generate_context(rng: random.Random, declarations: int) -> str:
+    """
+    A context in the style of those generated by decomp projects' m2ctx scripts
+    """
+    types = list(TYPES)
+    lines = [
+        "typedef struct Vec3f { f32 x, y, z; } Vec3f;",
+        "typedef void (*Callback)(void* arg, s32 n);",
+    ]
+    for i in range(declarations):
+        kind = rng.randrange(6)
+        if kind == 0:
+            fields = [
+                f"    /* 0x{j * 4:02X} */ {rng.choice(types)} unk_{j:X};"
+                for j in range(rng.randint(2, 12))
+            ]
+            lines.append(f"typedef struct Struct{i} {{")
+            lines.extend(fields)
+            lines.append(f"}} Struct{i}; // size = 0x{len(fields) * 4:X}")
+            types.append(f"Struct{i}")
+        elif kind == 1:
+            lines.append(f"typedef enum Enum{i} {{")
+            lines.extend(
+                f"    ENUM{i}_{j} = {j * 2}," for j in range(rng.randint(2, 8))
+            )
+            lines.append(f"}} Enum{i};")
+        elif kind == 2:
+            params = ", ".join(
+                f"{rng.choice(types)} arg{j}" for j in range(rng.randint(0, 4))
+            )
+            lines.append(f"{rng.choice(types)} func_{i:08X}({params or 'void'});")
+        elif kind == 3:
+            lines.append(f"extern {rng.choice(types)} D_{i:08X}[{rng.randint(1, 16)}];")
+        elif kind == 4:
+            lines.append(f"#define MACRO_{i}(x) ((x) + {i})")
+        else:
+            lines.append(f"union Union{i} {{ s32 a; f32 b; {rng.choice(types)} c; }};")
+    return "\n".join(lines) + "\n"
+
+
+def count_tokens(token: Callable[[], Optional[object]]) -> int:
+    tokens = 0
+    while token() is not None:
+        tokens += 1
+    return tokens
+
+
+class Command(BaseCommand):
+    help = "Measure how long mips_to_c takes to parse a C context"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--declarations",
+            type=int,
+            default=30000,
+            help="Number of declarations in the generated context (default: 30000)",
+        )
+        parser.add_argument(
+            "--context",
+            type=Path,
+            help="Parse this context instead of a generated one",
+        )
+
+    def handle(self, *args, **options) -> None:
+        if options["context"]:
+            context = options["context"].read_text()
+        else:
+            context = generate_context(random.Random(0), options["declarations"])
+        self.stdout.write(f"context: {len(context) / 1024 / 1024:.2f} MB")
+
+        start = time.perf_counter()
+        stripped = c_types.strip_macro_defs(c_types.strip_comments(context))
+        self.stdout.write(f"strip: {(time.perf_counter() - start) * 1000:.0f} ms")
+
+        _, fast_lexer = c_types.get_c_parser()
+        for name, lexer in [
+            ("lex (ply)", CParser().clex),
+            ("lex (fast)", fast_lexer),
+        ]:
+            lexer.input(stripped)
+            start = time.perf_counter()
+            tokens = count_tokens(lexer.token)
+            self.stdout.write(
+                f"{name}: {(time.perf_counter() - start) * 1000:.0f} ms, "
+                f"{tokens} tokens"
+            )
+
+        def build(name: str, source: str) -> None:
+            start = time.perf_counter()
+            c_types.build_typemap_from_source(source)
+            self.stdout.write(f"{name}: {(time.perf_counter() - start) * 1000:.0f} ms")
+
+        build("parse", context)
+
+        # Edits, as when a scratch's context is changed, reuse the chunks before them
+        build("append a declaration", context + "s32 appended_declaration;\n")
+        middle = context.find("\ntypedef", len(context) // 2)
+        if middle != -1:
+            build(
+                "edit the middle",
+                context[:middle] + "\ns32 edited_declaration;" + context[middle:],
+            )
@@ -0,0 +1,159 @@
+import random
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import asm_differ.diff as asm_differ
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from coreapp.asm_diff_wrapper import AsmDifferWrapper
+
+# Instructions and their relocations, as objdump shows them for each architecture
+INSTRUCTIONS: Dict[str, List[str]] = {
+    "mips": [
+        "addiu\tsp,sp,-24",
+        "sw\tra,20(sp)",
+        "lw\tv0,0(a0)",
+        "addu\tv0,v0,a1",
+        "jal\t0",
+        "nop",
+        "lui\tat,0x0",
+        "addiu\tat,at,0",
+        "beqz\tv0,{target:x}",
+        "beql\tv0,zero,{target:x}",
+        "sll\tt6,t7,0x2",
+    ],
+    "ppc": [
+        "stwu\tr1,-24(r1)",
+        "mflr\tr0",
+        "stw\tr0,28(r1)",
+        "lwz\tr3,0(r4)",
+        "addi\tr3,r3,1",
+        "bl\t{target:x}",
+        "lis\tr3,0",
+        "addi\tr3,r3,0",
+        "cmpwi\tr3,0",
+        "beq-\t{target:x}",
+        "blr",
+    ],
+    "arm32": [
+        "push\t{{r4, lr}}",
+        "ldr\tr0, [pc, #8]\t; ({target:x} <func+0x{target:x}>)",
+        "add\tr0, r0, #1",
+        "bl\t0 <func>",
+        "str\tr1, [sp, #4]",
+        "cmp\tr0, #0",
+        "beq\t{target:x} <func+0x{target:x}>",
+        "mov\tr1, r0",
+        "bx\tlr",
+    ],
+}
+
+RELOCATIONS: Dict[str, Dict[str, str]] = {
+    "mips": {
+        "jal": "R_MIPS_26\tfunc_{symbol}",
+        "lui": "R_MIPS_HI16\tD_{symbol}",
+        "addiu\tat": "R_MIPS_LO16\tD_{symbol}",
+    },
+    "ppc": {
+        "bl\t": "R_PPC_REL24\tfunc_{symbol}",
+        "lis": "R_PPC_ADDR16_HA\tD_{symbol}",
+        "addi\tr3,r3,0": "R_PPC_ADDR16_LO\tD_{symbol}",
+    },
+    "arm32": {
+        "bl\t": "R_ARM_CALL\tfunc_{symbol}",
+    },
+}
+
+# (instruction, relocation)
+Instruction = Tuple[str, Optional[str]]
+
+
+def generate_function(
+    rng: random.Random, length: int, arch: str = "mips"
+) -> List[Instruction]:
+    instructions: List[Instruction] = []
+    for _ in range(length):
+        instruction = rng.choice(INSTRUCTIONS[arch]).format(
+            target=rng.randrange(length) * 4
+        )
+        reloc = None
+        for prefix, reloc_format in RELOCATIONS[arch].items():
+            if instruction.startswith(prefix):
+                reloc = reloc_format.format(symbol=rng.randrange(100))
+        instructions.append((instruction, reloc))
+    return instructions
+
+
+def dump_function(instructions: List[Instruction]) -> str:
+    """
+    Format instructions like the objdump output of an object file
+    """
+    rows = []
+    for i, (instruction, reloc) in enumerate(instructions):
+        rows.append(f"{i * 4:8x}:\t00000000 \t{instruction}")
+        if reloc is not None:
+            rows.append(f"\t\t\t{i * 4:x}: {reloc}")
+    return "\n".join(rows)
+
+
+class Command(BaseCommand):
+    help = "Compare the latency of full and incremental diffs of an edited function"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--instructions",
+            type=int,
+            default=2500,
+            help="Length of the function (default: 2500)",
+        )
+        parser.add_argument(
+            "--edits",
+            type=int,
+            default=20,
+            help="Number of edits to diff in each mode (default: 20)",
+        )
+
+    def handle(self, *args, **options) -> None:
+        rng = random.Random(0)
+        config = AsmDifferWrapper.create_config(asm_differ.get_arch("mips"))
+
+        target = generate_function(rng, options["instructions"])
+        base_lines = asm_differ.process(dump_function(target), config)
+
+        # As if the unedited function had been diffed before
+        cache = asm_differ.ProcessCache()
+        asm_differ.process(dump_function(target), config, cache)
+
+        times = {"full": [0.0, 0.0], "incremental": [0.0, 0.0]}
+        current = list(target)
+        for _ in range(options["edits"]):
+            # Insert, remove or replace a few instructions, like a small change to
+            # the source would
+            index = rng.randrange(len(current))
+            count = rng.randint(1, 4)
+            current[index : index + count] = generate_function(rng, rng.randint(0, 4))
+            mydump = dump_function(current)
+
+            cache = asm_differ.ProcessCache(cache)
+            outputs = []
+            for name, process_cache in [("full", None), ("incremental", cache)]:
+                start = time.perf_counter()
+                my_lines = asm_differ.process(mydump, config, process_cache)
+                processed = time.perf_counter()
+                diff_output = asm_differ.do_diff(base_lines, my_lines, config)
+                meta, rows = asm_differ.align_diffs(diff_output, diff_output, config)
+                assert isinstance(config.formatter, asm_differ.JsonFormatter)
+                outputs.append(config.formatter.table_data(meta, rows))
+                end = time.perf_counter()
+
+                times[name][0] += processed - start
+                times[name][1] += end - start
+
+            if outputs[0] != outputs[1]:
+                raise CommandError("Incremental diff differs from the full diff")
+
+        for name, (processing, total) in times.items():
+            self.stdout.write(
+                f"{name}: {total / options['edits'] * 1000:.2f} ms per diff, "
+                f"of which {processing / options['edits'] * 1000:.2f} ms processing"
+            )
@@ -0,0 +1,72 @@
+import random
+import time
+import tracemalloc
+from pathlib import Path
+from typing import List, Tuple
+
+import asm_differ.diff as asm_differ
+from django.core.management.base import BaseCommand, CommandParser
+
+from coreapp.asm_diff_wrapper import AsmDifferWrapper
+from coreapp.management.commands.benchmark_diff import (
+    INSTRUCTIONS,
+    dump_function,
+    generate_function,
+)
+
+
+class Command(BaseCommand):
+    help = "Measure how long asm-differ takes to process objdump output"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--instructions",
+            type=int,
+            default=5000,
+            help="Length of the generated functions (default: 5000)",
+        )
+        parser.add_argument(
+            "--iterations",
+            type=int,
+            default=20,
+            help="Number of times to process each dump (default: 20)",
+        )
+        parser.add_argument(
+            "--dump",
+            type=Path,
+            help="Process this objdump output instead of generated functions",
+        )
+        parser.add_argument(
+            "--arch",
+            default="mips",
+            help="Architecture of the --dump (default: mips)",
+        )
+
+    def handle(self, *args, **options) -> None:
+        dumps: List[Tuple[str, str]] = []
+        if options["dump"]:
+            dumps.append((options["arch"], options["dump"].read_text()))
+        else:
+            rng = random.Random(0)
+            for arch in INSTRUCTIONS:
+                instructions = generate_function(rng, options["instructions"], arch)
+                dumps.append((arch, dump_function(instructions)))
+
+        for arch, dump in dumps:
+            config = AsmDifferWrapper.create_config(asm_differ.get_arch(arch))
+            # Warm up, and measure how much memory the processed lines take
+            tracemalloc.start()
+            lines = asm_differ.process(dump, config)
+            size = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+
+            start = time.perf_counter()
+            for _ in range(options["iterations"]):
+                asm_differ.process(dump, config)
+            elapsed = (time.perf_counter() - start) / options["iterations"]
+
+            self.stdout.write(
+                f"{arch}: {elapsed * 1000:.2f} ms per dump, "
+                f"{elapsed / len(lines) * 1e6:.2f} us per line, "
+                f"{size / len(lines):.0f} bytes per line"
+            )
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from coreapp.compiler_wrapper import PATH
+from coreapp.sandbox import Sandbox, SandboxPool
+
+
+class Command(BaseCommand):
+    help = "Compare the latency of one-shot and pooled sandbox commands"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--iterations",
+            type=int,
+            default=50,
+            help="Number of commands to run in each mode (default: 50)",
+        )
+        parser.add_argument(
+            "--command",
+            default="true",
+            help="Shell command to run in the sandbox (default: true)",
+        )
+
+    def handle(self, *args, **options) -> None:
+        iterations: int = options["iterations"]
+
+        one_shot = SandboxPool(size=0, max_jobs=0)
+        pooled = SandboxPool(size=1, max_jobs=iterations + 1)
+        pooled.warm()
+
+        try:
+            for name, pool in [("one-shot", one_shot), ("pooled", pooled)]:
+                start = time.perf_counter()
+                for _ in range(iterations):
+                    with Sandbox(pool) as sandbox:
+                        sandbox.run_subprocess(
+                            options["command"], shell=True, env={"PATH": PATH}
+                        )
+                elapsed = time.perf_counter() - start
+                self.stdout.write(
+                    f"{name}: {elapsed / iterations * 1000:.2f} ms per command"
+                )
+        finally:
+            pooled.shutdown()
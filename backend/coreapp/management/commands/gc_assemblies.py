@@ -0,0 +1,37 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandParser
+from django.utils.timezone import now
+
+from coreapp.models.scratch import Assembly
+
+
+class Command(BaseCommand):
+    help = "Delete assemblies that are not referenced by any scratch"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--min-age-hours",
+            type=int,
+            default=24,
+            help="Only delete assemblies created at least this many hours ago, so that "
+            "scratches which are still being created keep their target (default: 24)",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report how many assemblies would be deleted",
+        )
+
+    def handle(self, *args, **options) -> None:
+        cutoff = now() - timedelta(hours=options["min_age_hours"])
+        orphans = Assembly.objects.filter(scratch__isnull=True, time__lt=cutoff)
+
+        if options["dry_run"]:
+            self.stdout.write(f"Would delete {orphans.count()} orphaned assemblies")
+            return
+
+        _, deleted = orphans.delete()
+        self.stdout.write(
+            f"Deleted {deleted.get('coreapp.Assembly', 0)} orphaned assemblies"
+        )
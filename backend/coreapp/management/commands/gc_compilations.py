@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandParser
+
+from coreapp import metrics
+from coreapp.models.scratch import CachedCompilation
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete the least recently used persisted compilations beyond "
+        "COMPILATION_DB_CACHE_SIZE"
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Delete this many compilations per query (default: 1000)",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report how many compilations would be deleted",
+        )
+
+    def handle(self, *args, **options) -> None:
+        excess = CachedCompilation.objects.count() - max(
+            settings.COMPILATION_DB_CACHE_SIZE, 0
+        )
+
+        if options["dry_run"]:
+            self.stdout.write(f"Would delete {max(excess, 0)} compilations")
+            return
+
+        deleted = 0
+        while excess > 0:
+            stale = CachedCompilation.objects.order_by("last_used").values_list(
+                "hash", flat=True
+            )[: min(excess, options["batch_size"])]
+            evicted, _ = CachedCompilation.objects.filter(hash__in=list(stale)).delete()
+            if not evicted:
+                break
+            deleted += evicted
+            excess -= evicted
+
+        if deleted:
+            metrics.increment("compilation_cache.evictions", deleted)
+        self.stdout.write(f"Deleted {deleted} compilations")
@@ -0,0 +1,24 @@
+"""
+In-process counters for cache hits/misses and similar events
+"""
+import threading
+from collections import Counter
+from typing import Dict
+
+_lock = threading.Lock()
+_counters: "Counter[str]" = Counter()
+
+
+def increment(name: str, amount: int = 1) -> None:
+    with _lock:
+        _counters[name] += amount
+
+
+def get(name: str) -> int:
+    with _lock:
+        return _counters[name]
+
+
+def snapshot() -> Dict[str, int]:
+    with _lock:
+        return dict(_counters)
@@ -0,0 +1,27 @@
+# Generated by Django 4.0.10 on 2026-10-17 05:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("coreapp", "0018_rename_compilers"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CachedCompilation",
+            fields=[
+                (
+                    "hash",
+                    models.CharField(max_length=64, primary_key=True, serialize=False),
+                ),
+                ("time", models.DateTimeField(auto_now_add=True)),
+                ("last_used", models.DateTimeField(auto_now_add=True, db_index=True)),
+                ("compiler", models.CharField(max_length=100)),
+                ("elf_object", models.BinaryField(blank=True)),
+                ("errors", models.TextField(blank=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.0.10 on 2026-10-17 05:50
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("coreapp", "0019_cached_compilation"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AssemblyDump",
+            fields=[
+                (
+                    "hash",
+                    models.CharField(max_length=64, primary_key=True, serialize=False),
+                ),
+                ("time", models.DateTimeField(auto_now_add=True)),
+                ("dump", models.TextField()),
+                (
+                    "assembly",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="coreapp.assembly",
+                    ),
+                ),
+            ],
+        ),
+    ]
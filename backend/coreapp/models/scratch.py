@@ -33,6 +33,26 @@ class Assembly(models.Model):
     elf_object = models.BinaryField(blank=True)
 
 
+class AssemblyDump(models.Model):
+    """
+    The preprocessed objdump output of an assembly, as diffed against
+    """
+
+    hash = models.CharField(max_length=64, primary_key=True)
+    time = models.DateTimeField(auto_now_add=True)
+    assembly = models.ForeignKey(Assembly, on_delete=models.CASCADE)
+    dump = models.TextField()
+
+
+class CachedCompilation(models.Model):
+    hash = models.CharField(max_length=64, primary_key=True)
+    time = models.DateTimeField(auto_now_add=True)
+    last_used = models.DateTimeField(auto_now_add=True, db_index=True)
+    compiler = models.CharField(max_length=100)
+    elf_object = models.BinaryField(blank=True)
+    errors = models.TextField(blank=True)
+
+
 class CompilerConfig(models.Model):
     # TODO: validate compiler and platform
     compiler = models.CharField(max_length=100)
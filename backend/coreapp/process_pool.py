@@ -0,0 +1,223 @@
+"""
+A pool of worker processes for CPU-bound work like diffing and decompiling, which
+would otherwise hold the GIL in request threads and stall other requests
+"""
+import logging
+import multiprocessing
+import threading
+import time
+from multiprocessing.connection import Connection, wait
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Forking this multithreaded server could copy locks that other threads hold into
+# the workers, so they start from a clean server
+_context = multiprocessing.get_context("forkserver")
+
+
+class WorkerError(Exception):
+    pass
+
+
+def warm_up() -> None:
+    """
+    Load what work in the pool needs before a worker takes its first task
+    """
+    import asm_differ.diff as asm_differ
+    import django
+    import mips_to_c.src.main  # noqa: F401
+
+    # Workers aren't forked from the server, so they load the apps themselves before
+    # unpickling work from modules that import models
+    django.setup()
+
+    for arch in asm_differ.ARCH_SETTINGS:
+        # Compiles the architecture's regexes
+        arch.normalizer
+
+
+def _serve(conn: Connection) -> None:
+    warm_up()
+    conn.send(None)
+    while True:
+        try:
+            fn, args = conn.recv()
+        except EOFError:
+            return
+
+        try:
+            result: Tuple[bool, Any] = (True, fn(*args))
+        except Exception as e:
+            result = (False, e)
+        try:
+            conn.send(result)
+        except Exception as e:
+            # The result or exception couldn't be pickled
+            conn.send((False, WorkerError(f"{fn.__name__}: {e}")))
+
+
+class Worker:
+    """
+    A worker process, which runs one task at a time sent through a pipe
+    """
+
+    def __init__(self) -> None:
+        self.conn, child_conn = _context.Pipe()
+        self.process = _context.Process(target=_serve, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+        # Wait until it's warmed up, so that its first task's time limit is spent on
+        # the task itself
+        try:
+            self.conn.recv()
+        except EOFError:
+            self.kill()
+            raise WorkerError("The worker process failed to start")
+
+    def kill(self) -> None:
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class ProcessPool:
+    """
+    Up to `size` worker processes, started on first use. A worker that crashes or
+    takes too long is killed and replaced, without affecting the others.
+    """
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self._idle: List[Worker] = []
+        self._started = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, block: bool) -> Optional[Worker]:
+        """
+        Take an idle worker, starting one if there are fewer than `size`. Returns
+        None if all of them are busy, unless `block` is set.
+        """
+        with self._condition:
+            while not self._idle and self._started >= self.size:
+                if not block:
+                    return None
+                self._condition.wait()
+            while self._idle:
+                worker = self._idle.pop()
+                if worker.process.is_alive():
+                    return worker
+                # It died while idle, for example killed for using too much memory
+                worker.conn.close()
+                self._started -= 1
+            self._started += 1
+
+        try:
+            return Worker()
+        except Exception:
+            with self._condition:
+                self._started -= 1
+                self._condition.notify()
+            raise
+
+    def release(self, worker: Worker) -> None:
+        with self._condition:
+            self._idle.append(worker)
+            self._condition.notify()
+
+    def discard(self, worker: Worker) -> None:
+        worker.kill()
+        with self._condition:
+            self._started -= 1
+            self._condition.notify()
+
+
+_pool: Optional[ProcessPool] = None
+_pool_lock = threading.Lock()
+
+
+def process_pool() -> ProcessPool:
+    """
+    The worker processes shared by all requests
+    """
+    global _pool
+
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPool(settings.PROCESS_POOL_WORKERS)
+        return _pool
+
+
+def run_all(fn: Callable[..., T], calls: Sequence[Tuple[Any, ...]]) -> List[T]:
+    """
+    Run fn(*args) for each args of `calls` in parallel in the worker processes, or
+    one after the other in this process if PROCESS_POOL_WORKERS is 0. `fn` and its
+    arguments must be picklable.
+
+    Raises WorkerError if a call takes longer than PROCESS_POOL_TIMEOUT seconds once
+    a worker has started it, or crashes its worker, and whatever `fn` raises
+    otherwise. Only the workers running these calls are killed.
+    """
+    if settings.PROCESS_POOL_WORKERS <= 0:
+        return [fn(*args) for args in calls]
+
+    pool = process_pool()
+    results: List[Any] = [None] * len(calls)
+    # Connection -> (index of the call, worker, deadline)
+    running: Dict[Connection, Tuple[int, Worker, float]] = {}
+    next_call = 0
+    try:
+        while next_call < len(calls) or running:
+            # Start as many calls as there are free workers, waiting for one only
+            # when none of these calls are running
+            while next_call < len(calls):
+                worker = pool.acquire(block=not running)
+                if worker is None:
+                    break
+                deadline = time.monotonic() + settings.PROCESS_POOL_TIMEOUT
+                running[worker.conn] = (next_call, worker, deadline)
+                next_call += 1
+                try:
+                    worker.conn.send((fn, calls[next_call - 1]))
+                except OSError:
+                    raise WorkerError("The worker process crashed")
+
+            first_deadline = min(deadline for _, _, deadline in running.values())
+            ready = wait(list(running), max(first_deadline - time.monotonic(), 0))
+            if not ready and time.monotonic() >= first_deadline:
+                logger.warning(f"{fn.__name__} timed out, restarting its worker")
+                raise WorkerError(
+                    f"Took longer than {settings.PROCESS_POOL_TIMEOUT} seconds"
+                )
+
+            for conn in ready:
+                assert isinstance(conn, Connection)
+                index, worker, _ = running[conn]
+                try:
+                    ok, result = conn.recv()
+                except (EOFError, OSError):
+                    logger.error(f"A worker crashed running {fn.__name__}")
+                    raise WorkerError("The worker process crashed")
+                del running[conn]
+                pool.release(worker)
+                if not ok:
+                    raise result
+                results[index] = result
+        return results
+    finally:
+        # Workers still running these calls would send their results to the next
+        # caller, so they are replaced
+        for _, worker, _ in running.values():
+            pool.discard(worker)
+
+
+def run(fn: Callable[..., T], *args: Any) -> T:
+    """
+    Run fn(*args) in a worker process, as run_all does
+    """
+    return run_all(fn, [args])[0]
@@ -1,36 +1,395 @@
 import contextlib
+import json
 import logging
 import os
+import queue
 import shlex
+import shutil
+import signal
 import subprocess
+import sys
+import threading
 from pathlib import Path
-from tempfile import TemporaryDirectory
-from typing import Dict, List, Optional, Union
+from tempfile import TemporaryDirectory, mkdtemp
+from typing import Any, Dict, List, Optional, Union
 
 from django.conf import settings
 
+from coreapp import cancellation, wineserver
 from coreapp.error import SandboxError
 
 logger = logging.getLogger(__name__)
 
+TIME_LIMIT_SECONDS = 30
+
+# Starts a persistent wineserver in the background, and exits once it's ready. If one
+# is already running, it exits straight away with status 2 instead.
+WINESERVER_COMMAND = [
+    "/bin/sh",
+    "-c",
+    "exec wineserver -p </dev/null >/dev/null 2>&1",
+]
+
+# Job loop run by pooled sandbox workers. It only uses the standard library, as it
+# runs with the system python3 inside the jail. Each line on stdin is a job, and each
+# line written to stdout is the result of the corresponding job.
+WORKER_SOURCE = """
+import json, os, resource, signal, subprocess, sys
+
+proc = None
+
+def limit_cpu(seconds):
+    # The worker itself is long-lived, so each job gets its own CPU time limit
+    if seconds is not None:
+        resource.setrlimit(resource.RLIMIT_CPU, (seconds, seconds))
+
+def terminate(signum, frame):
+    # Take the running job down with the worker
+    try:
+        if proc is not None:
+            os.killpg(proc.pid, signal.SIGKILL)
+    except OSError:
+        pass
+    os._exit(1)
+
+signal.signal(signal.SIGTERM, terminate)
+
+for line in sys.stdin:
+    job = json.loads(line)
+    proc = None
+    try:
+        proc = subprocess.Popen(
+            job["args"],
+            env={**os.environ, **job["env"]},
+            cwd=job["cwd"],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            errors="replace",
+            start_new_session=True,
+            preexec_fn=lambda: limit_cpu(job["cpu_limit"]),
+        )
+        try:
+            stdout, stderr = proc.communicate(timeout=job["timeout"])
+            result = {"returncode": proc.returncode, "stdout": stdout, "stderr": stderr}
+        except subprocess.TimeoutExpired:
+            os.killpg(proc.pid, signal.SIGKILL)
+            stdout, stderr = proc.communicate()
+            result = {"returncode": -signal.SIGKILL, "stdout": stdout, "stderr": stderr, "timeout": True}
+    except OSError as e:
+        result = {"returncode": 127, "stdout": "", "stderr": str(e)}
+    sys.stdout.write(json.dumps(result) + "\\n")
+    sys.stdout.flush()
+"""
+
+
+def _sandbox_tmp_dir(use_jail: bool) -> Optional[str]:
+    if not use_jail:
+        return None
+
+    # Only use SANDBOX_TMP_PATH if USE_SANDBOX_JAIL is enabled,
+    # otherwise use the system default
+    settings.SANDBOX_TMP_PATH.mkdir(parents=True, exist_ok=True)
+    return str(settings.SANDBOX_TMP_PATH)
+
+
+def jail_command(
+    path: Path,
+    mounts: List[Path],
+    env: Dict[str, str],
+    time_limit: bool = True,
+) -> List[str]:
+    settings.SANDBOX_CHROOT_PATH.mkdir(parents=True, exist_ok=True)
+    settings.WINEPREFIX.mkdir(parents=True, exist_ok=True)
+
+    assert ":" not in str(path)
+    assert ":" not in str(settings.WINEPREFIX)
+    # fmt: off
+    wrapper = [
+        str(settings.SANDBOX_NSJAIL_BIN_PATH),
+        "--mode", "o",
+        "--chroot", str(settings.SANDBOX_CHROOT_PATH),
+        "--bindmount", f"{path}:/tmp",
+        "--bindmount", f"{path}:/run/user/{os.getuid()}",
+        "--bindmount_ro", "/bin",
+        "--bindmount_ro", "/etc/alternatives",
+        "--bindmount_ro", "/etc/fonts",
+        "--bindmount_ro", "/lib",
+        "--bindmount_ro", "/lib64",
+        "--bindmount_ro", "/usr",
+        "--bindmount_ro", str(settings.COMPILER_BASE_PATH),
+        "--bindmount_ro", f"{settings.WINEPREFIX}:/wine",
+        "--env", "PATH=/usr/bin:/bin",
+        "--env", "WINEDEBUG=-all",
+        "--env", "WINEPREFIX=/wine",
+        "--cwd", "/tmp",
+        "--rlimit_fsize", "soft",
+        "--disable_proc",  # Needed for running inside Docker
+    ]
+    # fmt: on
+
+    if time_limit:
+        wrapper.extend(["--time_limit", str(TIME_LIMIT_SECONDS)])
+        wrapper.extend(["--rlimit_cpu", str(TIME_LIMIT_SECONDS)])
+    else:
+        # Long-lived processes add up the CPU time of everything they run, so pooled
+        # workers limit each of their jobs instead
+        wrapper.extend(["--rlimit_cpu", "soft"])
+    if not settings.DEBUG:
+        wrapper.append("--really_quiet")
+    for mount in mounts:
+        wrapper.extend(["--bindmount_ro", str(mount)])
+    for key in env:
+        wrapper.extend(["--env", key])
+
+    wrapper.append("--")
+    return wrapper
+
+
+class SandboxWorker:
+    """
+    A long-lived (and, if enabled, jailed) process that runs jobs inside its own
+    directory, which is mounted at /tmp within the jail.
+    """
+
+    def __init__(self, use_jail: bool) -> None:
+        self.use_jail = use_jail
+        self.jobs = 0
+        self.broken = False
+        self.path = Path(mkdtemp(prefix="worker-", dir=_sandbox_tmp_dir(use_jail)))
+
+        if use_jail:
+            command = jail_command(self.path, [], {}, time_limit=False) + [
+                "/usr/bin/python3",
+                "-c",
+                WORKER_SOURCE,
+            ]
+        else:
+            command = [sys.executable, "-c", WORKER_SOURCE]
+
+        # Like one-shot sandboxes, jobs only see the environment they are given
+        worker_env: Dict[str, str] = {}
+        self.proc = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            cwd=self.path,
+            env=worker_env,
+        )
+
+    @property
+    def cwd(self) -> str:
+        return "/tmp" if self.use_jail else str(self.path)
+
+    def alive(self) -> bool:
+        return not self.broken and self.proc.poll() is None
+
+    def run(
+        self, args: List[str], env: Dict[str, str]
+    ) -> subprocess.CompletedProcess[str]:
+        self.jobs += 1
+        return self._run_job(
+            {
+                "args": args,
+                "env": env,
+                "cwd": self.cwd,
+                "timeout": TIME_LIMIT_SECONDS,
+                "cpu_limit": TIME_LIMIT_SECONDS,
+            }
+        )
+
+    def ensure_wineserver(self) -> None:
+        """
+        Start a persistent wineserver inside the worker's jail, or restart it if it
+        died. The wine compiles that the worker runs share it, along with the jail's
+        PID namespace, which wine clients and the server need.
+        """
+        proc = self._run_job(
+            {
+                "args": WINESERVER_COMMAND,
+                "env": {},
+                "cwd": self.cwd,
+                "timeout": TIME_LIMIT_SECONDS,
+                # The server adds up the CPU time of every compile it serves
+                "cpu_limit": None,
+            }
+        )
+        if proc.returncode not in (0, 2):
+            # Wine starts a short-lived server of its own, as usual
+            logger.warning(f"Failed to start wineserver: {proc.returncode}")
+
+    def _run_job(self, job: Dict[str, Any]) -> subprocess.CompletedProcess[str]:
+        assert self.proc.stdin and self.proc.stdout
+
+        # The worker enforces the time limit itself; this only catches a hung worker
+        watchdog = threading.Timer(TIME_LIMIT_SECONDS + 5, self.proc.kill)
+        watchdog.start()
+        try:
+            self.proc.stdin.write(json.dumps(job) + "\n")
+            self.proc.stdin.flush()
+            line = self.proc.stdout.readline()
+        except OSError as e:
+            self.broken = True
+            raise SandboxError(f"Failed to communicate with sandbox worker: {e}")
+        finally:
+            watchdog.cancel()
+
+        if not line:
+            self.broken = True
+            raise SandboxError("Sandbox worker exited unexpectedly")
+
+        result = json.loads(line)
+        if result.get("timeout"):
+            # Anything the job left behind (e.g. daemons) dies with the worker
+            self.broken = True
+
+        return subprocess.CompletedProcess(
+            job["args"], result["returncode"], result["stdout"], result["stderr"]
+        )
+
+    def abort(self) -> None:
+        """
+        Stop the worker, along with the job it's running. Safe to call from any thread.
+        """
+        self.broken = True
+        self.proc.terminate()
+
+    def clean(self) -> None:
+        for child in self.path.iterdir():
+            if child.name == f".wine-{os.getuid()}":
+                # The socket directory of the worker's persistent wineserver
+                continue
+            if child.is_dir() and not child.is_symlink():
+                shutil.rmtree(child, ignore_errors=True)
+            else:
+                child.unlink(missing_ok=True)
+
+    def kill(self) -> None:
+        if self.proc.poll() is None:
+            self.proc.kill()
+        self.proc.wait()
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+class SandboxPool:
+    """
+    A pool of pre-warmed sandbox workers, which avoids paying for process and jail
+    setup on every compiler, assembler, objdump or nm invocation.
+
+    Workers are recycled after `max_jobs` jobs, or as soon as they fail. When all
+    workers are busy, sandboxes fall back to spawning a one-shot process per command.
+    """
+
+    def __init__(self, size: int, max_jobs: int) -> None:
+        self.size = size
+        self.max_jobs = max_jobs
+        self._idle: "queue.LifoQueue[SandboxWorker]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._spawned = 0
+
+    def _spawn(self) -> Optional[SandboxWorker]:
+        with self._lock:
+            if self._spawned >= self.size:
+                return None
+            self._spawned += 1
+
+        try:
+            return SandboxWorker(settings.USE_SANDBOX_JAIL)
+        except Exception:
+            logger.exception("Failed to spawn sandbox worker")
+            with self._lock:
+                self._spawned -= 1
+            return None
+
+    def warm(self) -> None:
+        while True:
+            worker = self._spawn()
+            if worker is None:
+                break
+            self._idle.put(worker)
+
+    def acquire(self) -> Optional[SandboxWorker]:
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                return self._spawn()
+
+            if worker.alive():
+                return worker
+            self._discard(worker)
+
+    def release(self, worker: SandboxWorker) -> None:
+        if not worker.alive() or worker.jobs >= self.max_jobs:
+            self._discard(worker)
+            return
+
+        try:
+            worker.clean()
+        except OSError:
+            logger.exception("Failed to clean sandbox worker directory")
+            self._discard(worker)
+            return
+
+        self._idle.put(worker)
+
+    def _discard(self, worker: SandboxWorker) -> None:
+        worker.kill()
+        with self._lock:
+            self._spawned -= 1
+
+    def shutdown(self) -> None:
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(worker)
+
+
+_default_pool: Optional[SandboxPool] = None
+_default_pool_lock = threading.Lock()
+
+
+def default_pool() -> SandboxPool:
+    global _default_pool
+
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = SandboxPool(
+                settings.SANDBOX_POOL_SIZE, settings.SANDBOX_POOL_MAX_JOBS
+            )
+            _default_pool.warm()
+        return _default_pool
+
 
 class Sandbox(contextlib.AbstractContextManager["Sandbox"]):
+    def __init__(self, pool: Optional[SandboxPool] = None) -> None:
+        self.pool = pool
+
     def __enter__(self):
         self.use_jail = settings.USE_SANDBOX_JAIL
 
-        tmpdir: Optional[str] = None
-        if self.use_jail:
-            # Only use SANDBOX_TMP_PATH if USE_SANDBOX_JAIL is enabled,
-            # otherwise use the system default
-            settings.SANDBOX_TMP_PATH.mkdir(parents=True, exist_ok=True)
-            tmpdir = str(settings.SANDBOX_TMP_PATH)
+        if self.pool is None:
+            self.pool = default_pool()
 
-        self.temp_dir = TemporaryDirectory(dir=tmpdir)
+        self.worker = self.pool.acquire()
+        if self.worker:
+            self.path = self.worker.path
+            return self
+
+        self.temp_dir = TemporaryDirectory(dir=_sandbox_tmp_dir(self.use_jail))
         self.path = Path(self.temp_dir.name)
         return self
 
     def __exit__(self, *exc):
-        self.temp_dir.cleanup()
+        if self.worker:
+            assert self.pool
+            self.pool.release(self.worker)
+        else:
+            self.temp_dir.cleanup()
 
     @staticmethod
     def quote_options(opts: str) -> str:
@@ -45,46 +404,18 @@ class Sandbox(contextlib.AbstractContextManager["Sandbox"]):
         if not self.use_jail:
             return []
 
-        settings.SANDBOX_CHROOT_PATH.mkdir(parents=True, exist_ok=True)
-        settings.WINEPREFIX.mkdir(parents=True, exist_ok=True)
-
-        assert ":" not in str(self.path)
-        assert ":" not in str(settings.WINEPREFIX)
-        # fmt: off
-        wrapper = [
-            str(settings.SANDBOX_NSJAIL_BIN_PATH),
-            "--mode", "o",
-            "--chroot", str(settings.SANDBOX_CHROOT_PATH),
-            "--bindmount", f"{self.path}:/tmp",
-            "--bindmount", f"{self.path}:/run/user/{os.getuid()}",
-            "--bindmount_ro", "/bin",
-            "--bindmount_ro", "/etc/alternatives",
-            "--bindmount_ro", "/etc/fonts",
-            "--bindmount_ro", "/lib",
-            "--bindmount_ro", "/lib64",
-            "--bindmount_ro", "/usr",
-            "--bindmount_ro", str(settings.COMPILER_BASE_PATH),
-            "--bindmount_ro", f"{settings.WINEPREFIX}:/wine",
-            "--env", "PATH=/usr/bin:/bin",
-            "--env", "WINEDEBUG=-all",
-            "--env", "WINEPREFIX=/wine",
-            "--cwd", "/tmp",
-            "--rlimit_fsize", "soft",
-            "--rlimit_cpu", "30",  # seconds
-            "--time_limit", "30",  # seconds
-            "--disable_proc",  # Needed for running inside Docker
-        ]
-        # fmt: on
-
-        if not settings.DEBUG:
-            wrapper.append("--really_quiet")
-        for mount in mounts:
-            wrapper.extend(["--bindmount_ro", str(mount)])
-        for key in env:
-            wrapper.extend(["--env", key])
-
-        wrapper.append("--")
-        return wrapper
+        return jail_command(self.path, mounts, env)
+
+    def can_use_worker(self, mounts: List[Path]) -> bool:
+        if not self.worker:
+            return False
+        if not self.use_jail:
+            return True
+
+        # Workers are started without any job-specific mounts
+        return all(
+            mount.is_relative_to(settings.COMPILER_BASE_PATH) for mount in mounts
+        )
 
     def run_subprocess(
         self,
@@ -93,34 +424,77 @@ class Sandbox(contextlib.AbstractContextManager["Sandbox"]):
         mounts: Optional[List[Path]] = None,
         env: Optional[Dict[str, str]] = None,
         shell: bool = False,
+        wine: bool = False,
     ) -> subprocess.CompletedProcess[str]:
+        """
+        Run a command in the sandbox. `wine` marks commands that run through wine,
+        which share a persistent wineserver if PERSISTENT_WINESERVER is enabled.
+        """
         mounts = mounts if mounts is not None else []
         env = env if env is not None else {}
 
-        try:
-            wrapper = self.sandbox_command(mounts, env)
-        except Exception as e:
-            raise SandboxError(f"Failed to initialize sandbox command: {e}")
+        if wine and not self.use_jail and wineserver.host_server():
+            # Outside of the jail, wine finds the server through the prefix
+            env = {**env, "WINEPREFIX": str(settings.WINEPREFIX)}
 
         if shell:
             if isinstance(args, list):
                 args = " ".join(args)
 
-            command = wrapper + ["/bin/bash", "-euo", "pipefail", "-c", args]
+            command = ["/bin/bash", "-euo", "pipefail", "-c", args]
         else:
             assert isinstance(args, list)
-            command = wrapper + args
+            command = args
 
         debug_env_str = " ".join(
             f"{key}={shlex.quote(value)}" for key, value in env.items()
         )
+
+        if self.worker and self.can_use_worker(mounts):
+            logger.debug(
+                f"Sandbox Worker Command: {debug_env_str} {shlex.join(command)}"
+            )
+            with cancellation.cancellable(self.worker.abort):
+                if wine and self.use_jail and settings.PERSISTENT_WINESERVER:
+                    self.worker.ensure_wineserver()
+                proc = self.worker.run(command, env)
+                if proc.returncode != 0:
+                    raise subprocess.CalledProcessError(
+                        proc.returncode, command, proc.stdout, proc.stderr
+                    )
+            return proc
+
+        try:
+            wrapper = self.sandbox_command(mounts, env)
+        except Exception as e:
+            raise SandboxError(f"Failed to initialize sandbox command: {e}")
+
+        command = wrapper + command
+
         logger.debug(f"Sandbox Command: {debug_env_str} {shlex.join(command)}")
-        return subprocess.run(
+        with subprocess.Popen(
             command,
-            capture_output=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
             text=True,
             env=env,
             cwd=self.path,
-            check=True,
             shell=False,
-        )
+            # So that the whole process tree can be killed if the request is superseded
+            start_new_session=True,
+        ) as popen:
+
+            def kill() -> None:
+                try:
+                    os.killpg(popen.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+
+            with cancellation.cancellable(kill):
+                stdout, stderr = popen.communicate()
+                if popen.returncode != 0:
+                    raise subprocess.CalledProcessError(
+                        popen.returncode, command, stdout, stderr
+                    )
+
+        return subprocess.CompletedProcess(command, popen.returncode, stdout, stderr)
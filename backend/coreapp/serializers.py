@@ -7,6 +7,7 @@ from rest_framework.fields import SerializerMethodField
 from rest_framework.relations import HyperlinkedIdentityField, HyperlinkedRelatedField
 from rest_framework.reverse import reverse
 
+from .jobs import PRIORITIES
 from .middleware import Request
 from .models.github import GitHubRepo, GitHubUser
 
@@ -120,6 +121,21 @@ class ScratchCreateSerializer(serializers.Serializer[None]):
     rom_address = serializers.IntegerField(required=False)
 
 
+class JobCreateSerializer(serializers.Serializer[None]):
+    scratch = serializers.CharField()
+    priority = serializers.ChoiceField(choices=list(PRIORITIES), default="interactive")
+
+    # Overrides, as in ScratchViewSet.compile
+    compiler = serializers.CharField(allow_blank=True, required=False)
+    compiler_flags = serializers.CharField(allow_blank=True, required=False)
+    source_code = serializers.CharField(
+        allow_blank=True, required=False, trim_whitespace=False
+    )
+    context = serializers.CharField(  # type: ignore
+        allow_blank=True, required=False, trim_whitespace=False
+    )
+
+
 class ScratchSerializer(serializers.HyperlinkedModelSerializer):
     slug = serializers.SlugField(read_only=True)
     url = UrlField()
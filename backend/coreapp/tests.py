@@ -1,28 +1,86 @@
+import asyncio
+import dataclasses
+import json
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
 import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
 from time import sleep
-from typing import Optional
+from typing import Any, Dict, List, Optional
 from unittest import skip, skipIf, skipUnless
 from unittest.mock import Mock, patch
 
+import asm_differ.diff as asm_differ
 import responses
+from pycparser.c_parser import CParser
+from mips_to_c.src import c_types
 from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.http import StreamingHttpResponse
+from django.test import override_settings
 from django.test.testcases import TestCase
 from django.urls import reverse
+from django.utils.timezone import now
 from rest_framework import status
 from rest_framework.test import APITestCase
 
-from coreapp import compilers, platforms
-
-from coreapp.compiler_wrapper import CompilerWrapper
+from coreapp import (
+    asm_diff_wrapper,
+    cancellation,
+    compilers,
+    disasm,
+    elf,
+    metrics,
+    platforms,
+    process_pool,
+    wineserver,
+)
+from coreapp.asm_diff_wrapper import AsmDifferWrapper
+from coreapp.cancellation import CompilationSuperseded
+from coreapp.compiler_wrapper import CompilationResult, CompilerWrapper
 from coreapp.compilers import Compiler, GCC281, IDO53, IDO71, MWCC_247_92
-from coreapp.m2c_wrapper import M2CWrapper
+from coreapp.error import CompilationError
+from coreapp.jobs import (
+    Job,
+    JobQueue,
+    PRIORITY_BACKGROUND,
+    PRIORITY_INTERACTIVE,
+    QueueFull,
+    default_queue,
+)
+from coreapp.m2c_wrapper import M2CError, M2CWrapper
+from coreapp.management.commands import benchmark_alignment, benchmark_diff
 from coreapp.platforms import N64
-from coreapp.views.scratch import compile_scratch_update_score
+from coreapp.sandbox import (
+    TIME_LIMIT_SECONDS,
+    WINESERVER_COMMAND,
+    Sandbox,
+    SandboxPool,
+    SandboxWorker,
+    jail_command,
+)
+from coreapp.views.jobs import job_websocket
+from coreapp.views.scratch import compile_scratch, compile_scratch_update_score
 from .models.github import GitHubRepo, GitHubUser
 
 from .models.profile import Profile
 from .models.project import Project, ProjectFunction, ProjectImportConfig, ProjectMember
-from .models.scratch import CompilerConfig, Scratch
+from .models.scratch import (
+    Asm,
+    Assembly,
+    AssemblyDump,
+    CachedCompilation,
+    CompilerConfig,
+    Scratch,
+)
 
 
 def requiresCompiler(*compilers: Compiler):
@@ -120,6 +178,65 @@ sb  $t6, %lo(D_801D702C)($at)
         self.assertEqual(scratch.max_score, 200)
 
 
+class AssemblyCacheTests(BaseTestCase):
+    def test_assembly_cache_reuse(self):
+        """
+        Ensure that scratches with the same target share a single assembly
+        """
+        first = self.create_nop_scratch()
+        second = self.create_nop_scratch()
+
+        self.assertEqual(first.target_assembly.hash, second.target_assembly.hash)
+        self.assertEqual(Assembly.objects.count(), 1)
+
+    def test_gc_assemblies(self):
+        """
+        Ensure that gc_assemblies only deletes old assemblies without scratches
+        """
+        scratch = self.create_nop_scratch()
+        orphan = Assembly.objects.create(
+            hash="orphan",
+            arch="dummy",
+            source_asm=scratch.target_assembly.source_asm,
+        )
+        Assembly.objects.filter(
+            hash__in=["orphan", scratch.target_assembly.hash]
+        ).update(time=now() - timedelta(days=2))
+
+        call_command("gc_assemblies", "--dry-run", stdout=StringIO())
+        self.assertTrue(Assembly.objects.filter(hash=orphan.hash).exists())
+
+        call_command("gc_assemblies", stdout=StringIO())
+        self.assertFalse(Assembly.objects.filter(hash=orphan.hash).exists())
+        self.assertTrue(
+            Assembly.objects.filter(hash=scratch.target_assembly.hash).exists()
+        )
+
+    def test_target_dump_cache(self):
+        """
+        Ensure that target assemblies are only dumped once, even across restarts
+        """
+        scratch = self.create_nop_scratch()
+        target = scratch.target_assembly
+        dump = "   0:\t03e00008 \tjr\tra\n   4:\t00000000 \tnop\n"
+
+        with patch.object(AsmDifferWrapper, "get_dump", return_value=dump) as get_dump:
+            first = AsmDifferWrapper.diff(target, N64, None, b"compiled")
+            second = AsmDifferWrapper.diff(target, N64, None, b"compiled")
+
+            # Simulate a different worker process
+            asm_diff_wrapper._target_dumps.clear()
+            third = AsmDifferWrapper.diff(target, N64, None, b"compiled")
+
+        dumped = [call.args[0] for call in get_dump.call_args_list]
+        self.assertEqual(dumped.count(bytes(target.elf_object)), 1)
+        self.assertEqual(dumped.count(b"compiled"), 3)
+        self.assertEqual(first, second)
+        self.assertEqual(first, third)
+        self.assertEqual(first["current_score"], 0)
+        self.assertEqual(AssemblyDump.objects.filter(assembly=target).count(), 1)
+
+
 class ScratchModificationTests(BaseTestCase):
     @requiresCompiler(GCC281, IDO53)
     def test_update_scratch_score(self):
@@ -411,6 +528,1180 @@ class CompilationTests(BaseTestCase):
             len(result.elf_object), 0, "The compilation result should be non-null"
         )
 
+    def test_persistent_compilation_cache(self):
+        """
+        Ensure that compilations are persisted and reused after the in-memory cache is gone
+        """
+        CompilerWrapper.compile_code.cache_clear()
+        hits = metrics.get("compilation_cache.hits")
+
+        result = CompilerWrapper.compile_code(compilers.DUMMY, "-O2", "int x;\r\n", "")
+        self.assertEqual(CachedCompilation.objects.count(), 1)
+
+        # Simulate a different worker process, with equivalent flags and line endings
+        CompilerWrapper.compile_code.cache_clear()
+        cached_result = CompilerWrapper.compile_code(
+            compilers.DUMMY, " -O2 ", "int x;\n", ""
+        )
+
+        self.assertEqual(result, cached_result)
+        self.assertEqual(metrics.get("compilation_cache.hits"), hits + 1)
+        self.assertEqual(CachedCompilation.objects.count(), 1)
+
+    @override_settings(COMPILATION_DB_CACHE_SIZE=2)
+    def test_gc_compilations(self):
+        """
+        Ensure that gc_compilations deletes the least recently used compilations
+        beyond the cache size
+        """
+        for i in range(4):
+            CachedCompilation.objects.create(hash=str(i), compiler="dummy")
+            CachedCompilation.objects.filter(hash=str(i)).update(
+                last_used=now() - timedelta(hours=4 - i)
+            )
+
+        call_command("gc_compilations", "--dry-run", stdout=StringIO())
+        self.assertEqual(CachedCompilation.objects.count(), 4)
+
+        call_command("gc_compilations", "--batch-size", "1", stdout=StringIO())
+        self.assertEqual(
+            sorted(CachedCompilation.objects.values_list("hash", flat=True)),
+            ["2", "3"],
+        )
+
+    def test_compilation_cache_quoted_flags(self):
+        """
+        Ensure that flags which only differ in whitespace inside quotes, and so give
+        different objects, don't share a persisted compilation
+        """
+        CompilerWrapper.compile_code.cache_clear()
+        CompilerWrapper.compile_code(compilers.DUMMY, '-DX="a  b"', "int x;", "")
+        CompilerWrapper.compile_code(compilers.DUMMY, '-DX="a b"', "int x;", "")
+        self.assertEqual(CachedCompilation.objects.count(), 2)
+
+    # Compiling happens on other threads, which can't write to the in-memory test db
+    @override_settings(COMPILATION_DB_CACHE_SIZE=0)
+    def test_coalesced_compilation(self):
+        """
+        Ensure that identical compilations running at the same time only compile once
+        """
+        CompilerWrapper.compile_code.cache_clear()
+        coalesced = metrics.get("compilation.coalesced")
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_compile(*args: Any) -> CompilationResult:
+            started.set()
+            release.wait(5)
+            return CompilationResult(b"object", "")
+
+        results: List[CompilationResult] = []
+
+        def compile_in_thread() -> None:
+            results.append(
+                CompilerWrapper.compile_code(compilers.DUMMY, "", "int x;", "")
+            )
+
+        with patch.object(
+            CompilerWrapper, "_run_compiler", side_effect=slow_compile
+        ) as run_compiler:
+            leader = threading.Thread(target=compile_in_thread)
+            leader.start()
+            self.assertTrue(started.wait(5))
+
+            follower = threading.Thread(target=compile_in_thread)
+            follower.start()
+            # Give the follower time to start waiting on the leader
+            sleep(0.2)
+            release.set()
+
+            leader.join(5)
+            follower.join(5)
+
+        self.assertEqual(run_compiler.call_count, 1)
+        self.assertEqual(results, [CompilationResult(b"object", "")] * 2)
+        self.assertEqual(metrics.get("compilation.coalesced"), coalesced + 1)
+
+
+class BatchCompileTests(BaseTestCase):
+    def batch_compile(self, items: List[Any]) -> List[Dict[str, Any]]:
+        response = self.client.post(
+            reverse("compile-batch"), {"items": items}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        assert isinstance(response, StreamingHttpResponse)
+        content = b"".join(response.streaming_content).decode("utf-8")
+        return sorted(
+            (json.loads(line) for line in content.splitlines()),
+            key=lambda line: line["index"],
+        )
+
+    # Compiling happens on worker threads, which can't write to the in-memory test db
+    @override_settings(COMPILATION_DB_CACHE_SIZE=0)
+    def test_batch_compile(self):
+        """
+        Ensure that a batch compiles every item, and compiles identical items only once
+        """
+        scratch = self.create_nop_scratch()
+        other = self.create_nop_scratch()
+
+        with patch(
+            "coreapp.views.batch.compile_scratch", wraps=compile_scratch
+        ) as compile_mock:
+            lines = self.batch_compile(
+                [
+                    scratch.slug,
+                    {"slug": other.slug, "source_code": "int x;"},
+                    scratch.slug,
+                    "doesnotexist",
+                ]
+            )
+
+        self.assertEqual([line["index"] for line in lines], [0, 1, 2, 3])
+        self.assertEqual(lines[0]["errors"], "")
+        self.assertEqual(lines[1]["diff_output"], {})
+        self.assertEqual(lines[2]["slug"], scratch.slug)
+        self.assertEqual(lines[3]["error"]["kind"], "NotFound")
+        self.assertEqual(compile_mock.call_count, 2)
+
+    def test_batch_compile_invalid(self):
+        """
+        Ensure that malformed batches are rejected up front
+        """
+        response = self.client.post(
+            reverse("compile-batch"), {"items": [{"source_code": ""}]}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class JobQueueTests(BaseTestCase):
+    def blocker(self, queue: JobQueue, profile_id: int) -> threading.Event:
+        release = threading.Event()
+        queue.submit(lambda: {"released": release.wait(5)}, profile_id=profile_id)
+        return release
+
+    def test_priorities(self):
+        """
+        Ensure that interactive jobs run before background jobs
+        """
+        queue = JobQueue(workers=1, profile_limit=1, ttl=60)
+        order: List[str] = []
+
+        def record(name: str) -> Dict[str, Any]:
+            order.append(name)
+            return {}
+
+        release = self.blocker(queue, profile_id=1)
+        background = queue.submit(
+            lambda: record("background"), priority=PRIORITY_BACKGROUND, profile_id=2
+        )
+        interactive = queue.submit(
+            lambda: record("interactive"), priority=PRIORITY_INTERACTIVE, profile_id=3
+        )
+        release.set()
+
+        self.assertTrue(background.wait(5))
+        self.assertTrue(interactive.wait(5))
+        self.assertEqual(order, ["interactive", "background"])
+
+    def test_profile_limit(self):
+        """
+        Ensure that a profile at its concurrency limit doesn't hold up other profiles
+        """
+        queue = JobQueue(workers=2, profile_limit=1, ttl=60)
+
+        release = self.blocker(queue, profile_id=1)
+        same_profile = queue.submit(lambda: {}, profile_id=1)
+        other_profile = queue.submit(lambda: {}, profile_id=2)
+
+        self.assertTrue(other_profile.wait(5))
+        self.assertEqual(same_profile.status, Job.QUEUED)
+
+        release.set()
+        self.assertTrue(same_profile.wait(5))
+        self.assertEqual(same_profile.status, Job.DONE)
+
+    def test_max_pending(self):
+        """
+        Ensure that profiles can't queue more than their share of jobs
+        """
+        queue = JobQueue(
+            workers=1, profile_limit=1, ttl=60, profile_max_pending=2, max_pending=3
+        )
+
+        release = self.blocker(queue, profile_id=1)
+        queue.submit(lambda: {}, profile_id=1)
+        with self.assertRaises(QueueFull):
+            queue.submit(lambda: {}, profile_id=1)
+
+        last = queue.submit(lambda: {}, profile_id=2)
+        with self.assertRaises(QueueFull):
+            queue.submit(lambda: {}, profile_id=3)
+
+        release.set()
+        self.assertTrue(last.wait(5))
+        self.assertTrue(queue.submit(lambda: {}, profile_id=1).wait(5))
+
+    def test_queue_full(self):
+        """
+        Ensure that jobs beyond the pending limit are rejected with 429
+        """
+        scratch = self.create_nop_scratch()
+        queue = JobQueue(workers=1, profile_limit=1, ttl=60, profile_max_pending=1)
+
+        with patch("coreapp.views.jobs.default_queue", return_value=queue):
+            release = self.blocker(queue, profile_id=self.client.session["profile_id"])
+            response = self.client.post(
+                reverse("job-list"), {"scratch": scratch.slug}, format="json"
+            )
+            release.set()
+
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_failed_job(self):
+        """
+        Ensure that errors are reported like API errors
+        """
+        queue = JobQueue(workers=1, profile_limit=1, ttl=60)
+
+        def fail() -> Dict[str, Any]:
+            raise CompilationError("oh no")
+
+        job = queue.submit(fail)
+        self.assertTrue(job.wait(5))
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.to_json()["error"]["kind"], "CompilationError")
+
+    # Jobs run on worker threads, which can't write to the in-memory test db
+    @override_settings(COMPILATION_DB_CACHE_SIZE=0)
+    def test_compile_job(self):
+        """
+        Ensure that compilations can be queued and their results polled
+        """
+        scratch = self.create_nop_scratch()
+
+        response = self.client.post(
+            reverse("job-list"),
+            {"scratch": scratch.slug, "priority": "background"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        job_id = response.json()["id"]
+
+        # Polls only wait briefly, so wait for the job here
+        job = default_queue().get(job_id)
+        assert job is not None
+        self.assertTrue(job.wait(5))
+
+        response = self.client.get(
+            reverse("job-detail", kwargs={"job_id": job_id}), {"wait": 5}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["status"], Job.DONE)
+        self.assertEqual(response.json()["result"]["errors"], "")
+
+        response = self.client.get(reverse("job-detail", kwargs={"job_id": "nope"}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_invalid_job(self):
+        """
+        Ensure that malformed job requests are rejected
+        """
+        scratch = self.create_nop_scratch()
+
+        for body in (
+            [scratch.slug],
+            scratch.slug,
+            {"scratch": scratch.slug, "priority": "asap"},
+        ):
+            response = self.client.post(reverse("job-list"), body, format="json")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @patch("coreapp.views.jobs.MAX_POLL_WAIT_SECONDS", 0.1)
+    def test_poll_wait_limit(self):
+        """
+        Ensure that polls don't wait for longer than MAX_POLL_WAIT_SECONDS
+        """
+        release = threading.Event()
+        job = default_queue().submit(lambda: {"released": release.wait(5)})
+
+        start = time.monotonic()
+        response = self.client.get(
+            reverse("job-detail", kwargs={"job_id": job.id}), {"wait": 60}
+        )
+        release.set()
+
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertIn(response.json()["status"], (Job.QUEUED, Job.RUNNING))
+
+    def test_job_websocket(self):
+        """
+        Ensure that the job websocket pushes the job's result once it finishes
+        """
+        release = threading.Event()
+        job = default_queue().submit(lambda: {"released": release.wait(5)})
+
+        async def communicate() -> List[Dict[str, Any]]:
+            incoming: asyncio.Queue[Dict[str, Any]] = asyncio.Queue()
+            outgoing: List[Dict[str, Any]] = []
+            await incoming.put({"type": "websocket.connect"})
+
+            async def send(message: Dict[str, Any]) -> None:
+                outgoing.append(message)
+                if message["type"] == "websocket.accept":
+                    release.set()
+
+            scope = {"type": "websocket", "path": f"/api/jobs/{job.id}/ws"}
+            await asyncio.wait_for(job_websocket(scope, incoming.get, send), 5)
+            return outgoing
+
+        messages = asyncio.run(communicate())
+        self.assertEqual(
+            [message["type"] for message in messages],
+            ["websocket.accept", "websocket.send", "websocket.send", "websocket.close"],
+        )
+        self.assertEqual(
+            json.loads(messages[2]["text"]),
+            {"id": job.id, "status": Job.DONE, "result": {"released": True}},
+        )
+
+
+class DiffOutputTests(BaseTestCase):
+    def test_structured_diff_output(self):
+        """
+        Ensure that structured diff output matches asm-differ's JSON
+        """
+        config = AsmDifferWrapper.create_config(asm_differ.get_arch("mips"))
+        base = asm_differ.process("   0:\t03e00008 \tjr\tra\n", config)
+        mine = asm_differ.process("   0:\t03e00008 \tjr\tra\n   4:\t0 \tnop\n", config)
+        diff = asm_differ.do_diff(base, mine, config)
+        meta, rows = asm_differ.align_diffs(diff, diff, config)
+
+        assert isinstance(config.formatter, asm_differ.JsonFormatter)
+        data = config.formatter.table_data(meta, rows)
+        self.assertEqual(data, json.loads(config.formatter.table(meta, rows)))
+        self.assertEqual(len(data["rows"]), 2)
+
+    def test_incremental_processing(self):
+        """
+        Ensure that reprocessing an edited dump with the previous one's instructions
+        gives the same lines as processing it from scratch
+        """
+        config = AsmDifferWrapper.create_config(asm_differ.get_arch("mips"))
+        rng = random.Random(0)
+        instructions = benchmark_diff.generate_function(rng, 200)
+
+        cache = asm_differ.ProcessCache()
+        asm_differ.process(benchmark_diff.dump_function(instructions), config, cache)
+
+        # Shift the rest of the function, including delay slots of branch-likelies
+        instructions[50:51] = [("nop", None), ("nop", None)]
+        dump = benchmark_diff.dump_function(instructions)
+        cache = asm_differ.ProcessCache(cache)
+        self.assertEqual(
+            asm_differ.process(dump, config, cache), asm_differ.process(dump, config)
+        )
+        self.assertLessEqual(cache.misses, 2)
+
+    def test_normalizer_per_arch(self):
+        """
+        Ensure that architectures derived from another one don't share its
+        precompiled normalizer
+        """
+        mips = asm_differ.get_arch("mips")
+        derived = dataclasses.replace(mips, re_reg=re.compile(r"\bzero\b"))
+        self.assertIs(mips.normalizer, mips.normalizer)
+        self.assertIsNot(mips.normalizer, derived.normalizer)
+
+        dump = "   0:\t00000000 \taddu\tv0,v0,zero\n"
+        lines = asm_differ.process(dump, AsmDifferWrapper.create_config(derived))
+        self.assertEqual(lines[0].diff_row, "addu\tv0,v0,<reg>")
+
+    def test_score(self):
+        """
+        Ensure that each differing line is penalized, including repeated ones
+        """
+        config = AsmDifferWrapper.create_config(asm_differ.get_arch("mips"))
+        base = benchmark_diff.dump_function(
+            [
+                ("lw\tv0,0(a0)", None),
+                ("addu\tv0,v0,a1", None),
+                ("sll\tt6,t7,0x2", None),
+                ("lw\tv0,4(a0)", None),
+                ("addu\tv0,v0,a1", None),
+                ("jr\tra", None),
+                ("nop", None),
+            ]
+        )
+        mine = benchmark_diff.dump_function(
+            [
+                ("lw\tv1,0(a0)", None),
+                ("addu\tv1,v1,a1", None),
+                ("lw\tv1,4(a0)", None),
+                ("sll\tt6,t7,0x2", None),
+                ("addu\tv1,v1,a1", None),
+                ("jr\tra", None),
+                ("nop", None),
+            ]
+        )
+        diff = asm_differ.do_diff(
+            asm_differ.process(base, config), asm_differ.process(mine, config), config
+        )
+
+        # One register in the first lw, two in each addu, and the moved lw has a
+        # different register, so it's an insertion and a deletion
+        self.assertEqual(diff.score, 5 + 2 * 10 + 100 + 100)
+
+    def test_anchored_alignment(self):
+        """
+        Ensure that the anchored algorithm aligns every mnemonic of a function too
+        large to align exactly
+        """
+        rng = random.Random(0)
+        seq1 = [rng.choice(["lw", "sw", "addu", "jal", "nop"]) for _ in range(20000)]
+        seq2 = list(seq1)
+        for _ in range(200):
+            index = rng.randrange(len(seq2))
+            seq2[index : index + rng.randint(1, 4)] = ["lui"] * rng.randint(0, 4)
+
+        opcodes = asm_differ.diff_sequences(seq1, seq2, "anchored")
+
+        end1, end2 = 0, 0
+        for tag, i1, i2, j1, j2 in opcodes:
+            self.assertEqual((i1, j1), (end1, end2))
+            if tag == "equal":
+                self.assertEqual(seq1[i1:i2], seq2[j1:j2])
+            end1, end2 = i2, j2
+        self.assertEqual((end1, end2), (len(seq1), len(seq2)))
+
+    def test_anchored_quality(self):
+        """
+        Ensure that the anchored algorithm, selected through the config, aligns a
+        function it splits at anchors almost as well as Levenshtein
+        """
+        config = AsmDifferWrapper.create_config(asm_differ.get_arch("mips"))
+        config.max_function_size_lines = 30000
+        basedump, mydump = benchmark_alignment.edited_function(
+            random.Random(0), 12000, 0.02
+        )
+        levenshtein, anchored = benchmark_alignment.compare_algorithms(
+            config, basedump, mydump, ["levenshtein", "anchored"]
+        )
+
+        self.assertLessEqual(anchored.score, levenshtein.score * 1.01)
+        self.assertGreaterEqual(anchored.matched, levenshtein.matched * 0.99)
+
+        anchored_config = dataclasses.replace(config, algorithm="anchored")
+        base = asm_differ.process(basedump, anchored_config)
+        mine = asm_differ.process(mydump, anchored_config)
+        with patch.object(
+            asm_differ,
+            "diff_sequences_anchored",
+            wraps=asm_differ.diff_sequences_anchored,
+        ) as diff_sequences_anchored:
+            asm_differ.do_diff(base, mine, anchored_config)
+        diff_sequences_anchored.assert_called_once()
+
+    def test_unchanged_rediff(self):
+        """
+        Ensure that rediffing a scratch whose compiled code didn't change reuses the
+        previous diff
+        """
+        target = self.create_nop_scratch().target_assembly
+        dump = "   0:\t03e00008 \tjr\tra\n   4:\t00000000 \tnop\n"
+
+        with patch.object(AsmDifferWrapper, "get_dump", return_value=dump):
+            first = AsmDifferWrapper.diff(
+                target, N64, None, b"compiled", incremental_key="scratch"
+            )
+            unchanged = metrics.get("incremental_diff.unchanged")
+            second = AsmDifferWrapper.diff(
+                target, N64, None, b"compiled", incremental_key="scratch"
+            )
+
+        self.assertIs(first, second)
+        self.assertEqual(metrics.get("incremental_diff.unchanged"), unchanged + 1)
+
+    def test_threeway_diff(self):
+        """
+        Ensure that three-way diffs compare against the previous diff of the scratch
+        """
+        target = self.create_nop_scratch().target_assembly
+        target_dump = "   0:\t8c820000 \tlw\tv0,0(a0)\n   4:\t03e00008 \tjr\tra\n   8:\t00000000 \tnop\n"
+        dumps = [
+            "   0:\t8c830000 \tlw\tv1,0(a0)\n   4:\t03e00008 \tjr\tra\n   8:\t00000000 \tnop\n",
+            "   0:\t03e00008 \tjr\tra\n   4:\t00000000 \tnop\n",
+            "   0:\t03e00008 \tjr\tra\n   4:\t00000000 \tnop\n",
+        ]
+
+        results = []
+        for dump in dumps:
+            with patch.object(
+                AsmDifferWrapper,
+                "get_dump",
+                side_effect=lambda data, *args: dump
+                if data == b"compiled"
+                else target_dump,
+            ):
+                results.append(
+                    AsmDifferWrapper.diff(
+                        target,
+                        N64,
+                        # Keeps the target's dump apart from other tests' dumps
+                        "threeway",
+                        b"compiled",
+                        incremental_key="scratch",
+                        threeway="prev",
+                    )
+                )
+
+        scores = [result["current_score"] for result in results]
+        self.assertEqual(scores, [5, 100, 100])
+        self.assertEqual([result["previous_score"] for result in results], [5, 5, 100])
+        self.assertIn("previous", results[1]["rows"][0])
+        self.assertNotIn("previous", results[2]["rows"][0])
+
+    def test_object_diff(self):
+        """
+        Ensure that object diffs score each function against the target's function
+        of the same name
+        """
+        target = self.create_nop_scratch().target_assembly
+        header = "\nout.s:     file format elf32-tradbigmips\n\n\nDisassembly of section .text:\n\n"
+        target_dump = (
+            header
+            + "00000000 <a>:\n   0:\t03e00008 \tjr\tra\n   4:\t00000000 \tnop\n\n"
+            + "00000008 <b>:\n   8:\t8c820000 \tlw\tv0,0(a0)\n"
+            + "0000000c <.L1>:\n   c:\t03e00008 \tjr\tra\n  10:\t00000000 \tnop\n"
+        )
+        compiled_dump = (
+            header
+            + "00000000 <b>:\n   0:\t8c830000 \tlw\tv1,0(a0)\n   4:\t03e00008 \tjr\tra\n   8:\t00000000 \tnop\n\n"
+            + "0000000c <c>:\n   c:\t03e00008 \tjr\tra\n  10:\t00000000 \tnop\n"
+        )
+        dumps = {bytes(target.elf_object): target_dump, b"compiled": compiled_dump}
+
+        with patch.object(
+            AsmDifferWrapper,
+            "run_objdump",
+            side_effect=lambda data, *args: dumps[data],
+        ):
+            with patch.object(
+                elf, "function_names", side_effect=[{"a", "b"}, {"b", "c"}]
+            ):
+                result = AsmDifferWrapper.diff_object(target, N64, b"compiled")
+
+        self.assertEqual(
+            result["functions"],
+            [
+                {
+                    "name": "a",
+                    "status": "missing",
+                    "current_score": 200,
+                    "max_score": 200,
+                },
+                {
+                    "name": "b",
+                    "status": "matched",
+                    "current_score": 5,
+                    "max_score": 300,
+                },
+                {"name": "c", "status": "extra"},
+            ],
+        )
+        self.assertEqual(result["current_score"], 205)
+        self.assertEqual(result["max_score"], 500)
+
+    def test_function_dumps_sections(self):
+        """
+        Ensure that functions split out of an object's dump don't pick up section
+        headers or elided zeroes that follow them
+        """
+        dump = (
+            "\nout.s:     file format elf32-tradbigmips\n\n\n"
+            + "Disassembly of section .text:\n\n"
+            + "00000000 <a>:\n   0:\t03e00008 \tjr\tra\n   4:\t00000000 \tnop\n\t...\n\n"
+            + "Disassembly of section .text.b:\n\n"
+            + "00000000 <b>:\n   0:\t03e00008 \tjr\tra\n   4:\t00000000 \tnop\n"
+        )
+        config = AsmDifferWrapper.create_config(asm_differ.get_arch("mips"))
+
+        with patch.object(AsmDifferWrapper, "run_objdump", return_value=dump):
+            with patch.object(elf, "function_names", return_value={"a", "b"}):
+                with patch.object(
+                    AsmDifferWrapper, "get_rodata_references", return_value=""
+                ):
+                    dumps = AsmDifferWrapper.get_function_dumps(b"object", N64, config)
+
+        function = "   0:\t03e00008 \tjr\tra\n   4:\t00000000 \tnop"
+        self.assertEqual(dumps, {"a": function, "b": function})
+        lines = asm_differ.process(dumps["a"], config)
+        self.assertEqual([line.source_lines for line in lines], [(), ()])
+
+
+class ElfTests(TestCase):
+    @skipUnless(shutil.which("cc") and shutil.which("nm"), "requires cc and nm")
+    def test_symbols_match_nm(self):
+        """
+        Ensure that symbols read from objects in-process match those listed by nm
+        """
+        source = "static int counter;\nextern int ext(void);\nint a(void) { return ++counter; }\nint b(void) { return ext() + a(); }\n"
+        with tempfile.TemporaryDirectory() as dir:
+            source_path = Path(dir) / "test.c"
+            object_path = Path(dir) / "test.o"
+            source_path.write_text(source)
+
+            flag_sets: List[List[str]] = [[], ["-m32"]]
+            for flags in flag_sets:
+                try:
+                    subprocess.run(
+                        ["cc", "-c", *flags, "-o", str(object_path), str(source_path)],
+                        check=True,
+                        capture_output=True,
+                    )
+                except subprocess.CalledProcessError:
+                    continue
+
+                nm_proc = subprocess.run(
+                    ["nm", str(object_path)], check=True, capture_output=True, text=True
+                )
+                data = object_path.read_bytes()
+                for line in nm_proc.stdout.splitlines():
+                    nm_line = line.split()
+                    symbol = elf.find_symbol(data, nm_line[-1])
+                    if len(nm_line) == 3:
+                        assert symbol is not None
+                        self.assertEqual(symbol.value, int(nm_line[0], 16))
+                    else:
+                        self.assertIsNone(symbol)
+
+    @skipUnless(shutil.which("cc") and shutil.which("readelf"), "requires cc, readelf")
+    def test_rodata_references_match_readelf(self):
+        """
+        Ensure that .rodata references to .text, like jump tables, are read correctly
+        and only once per object
+        """
+        cases = "".join(f"case {i}: return g({i * 3});\n" for i in range(8))
+        source = (
+            f"int g(int);\nint f(int x) {{\nswitch (x) {{\n{cases}}}\nreturn 0;\n}}\n"
+        )
+        with tempfile.TemporaryDirectory() as dir:
+            source_path = Path(dir) / "test.c"
+            object_path = Path(dir) / "test.o"
+            source_path.write_text(source)
+            try:
+                subprocess.run(
+                    ["cc", "-O2", "-fno-pic", "-c", "-o", object_path, source_path],
+                    check=True,
+                    capture_output=True,
+                )
+            except subprocess.CalledProcessError:
+                self.skipTest("cc can't build non-PIC objects")
+
+            readelf_proc = subprocess.run(
+                ["readelf", "-rW", str(object_path)],
+                check=True,
+                capture_output=True,
+                text=True,
+            )
+            data = object_path.read_bytes()
+
+        # e.g. 0000000000000008  0000000200000001 R_X86_64_64  0000000000000000 .text + 30
+        expected = []
+        section = ""
+        for line in readelf_proc.stdout.splitlines():
+            if line.startswith("Relocation section"):
+                section = line.split("'")[1]
+            fields = line.split()
+            if section in (".rel.rodata", ".rela.rodata") and ".text" in fields:
+                expected.append((int(fields[-1], 16), int(fields[0], 16)))
+        self.assertTrue(expected)
+
+        config = AsmDifferWrapper.create_config(asm_differ.get_arch("mips"))
+        references = asm_differ.parse_elf_rodata_references(data, config)
+        self.assertEqual(sorted(ref[:2] for ref in references), sorted(expected))
+
+        with patch.object(
+            asm_differ, "parse_elf_rodata_references", return_value=references
+        ) as parse:
+            first = AsmDifferWrapper.get_rodata_references(data, config)
+            second = AsmDifferWrapper.get_rodata_references(data, config)
+        self.assertEqual(parse.call_count, 1)
+        self.assertEqual(first, second)
+        self.assertEqual(first.count("DATAREF"), len(expected))
+
+    def test_not_elf(self):
+        """
+        Ensure that non-ELF data is rejected rather than misread
+        """
+        with self.assertRaises(elf.ElfError):
+            elf.find_symbol(b"not an elf file", "func")
+        with self.assertRaises(elf.ElfError):
+            elf.find_symbol(b"\x7FELF\x01\x01\x01" + b"\0" * 9, "func")
+
+
+DISASSEMBLY_TEST_ASM = """
+.text
+glabel func
+    addiu   $sp, $sp, -0x18
+    sw      $ra, 0x14($sp)
+    lui     $a0, %hi(data)
+    lw      $a0, %lo(data)($a0)
+    beqz    $a0, .L1
+     nop
+    jal     helper
+     move   $a1, $a0
+    jal     ext
+     li     $a2, -1
+.L1:
+    lw      $ra, 0x14($sp)
+    jr      $ra
+     addiu  $sp, $sp, 0x18
+
+    .type helper, @function
+helper:
+    lwc1    $f0, 4($a0)
+    cvt.d.s $f2, $f0
+    c.lt.d  $f2, $f4
+    bc1tl   helper
+     sdc1   $f2, 8($a0)
+    mfc1    $v0, $f0
+    ctc1    $v0, $31
+    dsll32  $v0, $v0, 3
+    div     $zero, $a0, $a1
+    mflo    $v0
+    jr      $ra
+     negu   $v0, $v0
+    .size helper, . - helper
+
+glabel after_size
+    b       after_size
+     nop
+inner:
+    bnezl   $a0, inner
+     lbu    $v1, -1($a1)
+    jalr    $t9
+     break  7
+
+.section .text.b, "ax"
+glabel other
+    j       func
+     sll    $v0, $v0, 2
+    jr      $ra
+     sltiu  $v0, $v0, 0x10
+
+.data
+data:
+    .word 1
+"""
+
+
+class DisassemblerTests(TestCase):
+    def test_mips_instructions(self):
+        """
+        Ensure that MIPS instructions are shown as objdump shows them, aliases included
+        """
+        expected = {
+            0x27BDFFE8: "addiu\tsp,sp,-24",
+            0x8C820000: "lw\tv0,0(a0)",
+            0x03E00008: "jr\tra",
+            0x00000000: "nop",
+            0x00042040: "sll\ta0,a0,0x1",
+            0x3C048000: "lui\ta0,0x8000",
+            0x2402FFFF: "li\tv0,-1",
+            0x3402FFFF: "li\tv0,0xffff",
+            0x00802825: "move\ta1,a0",
+            0x00041023: "negu\tv0,a0",
+            0x0085001A: "div\tzero,a0,a1",
+            0x0320F809: "jalr\tt9",
+            0x0000000D: "break",
+            0x0007000D: "break\t0x7",
+            0xC4800004: "lwc1\t$f0,4(a0)",
+            0x46020032: "c.eq.s\t$f0,$f2",
+            0x46000021: "cvt.d.s\t$f0,$f0",
+            0x44C2F800: "ctc1\tv0,$31",
+            0x40026000: "mfc0\tv0,$12",
+        }
+        mips = disasm.for_arch("mips")
+        assert mips is not None
+        for word, text in expected.items():
+            instruction = mips.decode(word.to_bytes(4, "big"), 0, False)
+            operands = f"\t{instruction.operands}" if instruction.operands else ""
+            self.assertEqual(instruction.mnemonic + operands, text)
+            self.assertEqual(instruction.raw, f"{word:08x} ")
+
+        # Little-endian, at 0x10
+        data = bytes(0x10) + bytes.fromhex("fcff8010")
+        instruction = mips.decode(data, 0x10, True)
+        self.assertEqual((instruction.mnemonic, instruction.operands), ("beqz", "a0,"))
+        self.assertEqual(instruction.target, 0x4)
+
+        for word in (0x00000040, 0x7C000000, 0x4A000000, 0x00A00027):
+            with self.assertRaises(disasm.UnsupportedObject):
+                mips.decode(word.to_bytes(4, "big"), 0, False)
+
+    @override_settings(IN_PROCESS_DISASSEMBLY=True)
+    def test_fallback_to_objdump(self):
+        """
+        Ensure that objects the in-process disassembler can't handle are disassembled
+        by objdump
+        """
+        config = AsmDifferWrapper.create_config(asm_differ.get_arch("mips"))
+        fallbacks = metrics.get("disassembly.fallbacks")
+        with patch.object(AsmDifferWrapper, "run_objdump", return_value="dump") as run:
+            out = AsmDifferWrapper.disassemble(b"not an elf file", N64, config, "f")
+        self.assertEqual(out, "dump")
+        run.assert_called_once_with(b"not an elf file", N64, config, "f")
+        self.assertEqual(metrics.get("disassembly.fallbacks"), fallbacks + 1)
+
+        with override_settings(IN_PROCESS_DISASSEMBLY=False):
+            with patch.object(disasm.Disassembler, "disassemble") as in_process:
+                with patch.object(AsmDifferWrapper, "run_objdump", return_value="dump"):
+                    AsmDifferWrapper.disassemble(b"object", N64, config, None)
+        in_process.assert_not_called()
+
+    @skipUnless(
+        shutil.which("mips-linux-gnu-as") and shutil.which("mips-linux-gnu-objdump"),
+        "requires mips-linux-gnu binutils",
+    )
+    def test_mips_matches_objdump(self):
+        """
+        Ensure that the in-process MIPS disassembler's output matches objdump's, for
+        whole objects and from each function
+        """
+        mips = disasm.for_arch("mips")
+        assert mips is not None
+
+        # Random instructions, of those the disassembler accepts
+        rng = random.Random(0)
+        words: List[int] = []
+        while len(words) < 2000:
+            word = rng.getrandbits(32)
+            if rng.random() < 0.5:
+                # Mostly SPECIAL, REGIMM, COP0 and COP1 instructions
+                word = rng.choice([0x00, 0x01, 0x10, 0x11]) << 26 | word >> 6
+            try:
+                instruction = mips.decode(
+                    word.to_bytes(4, "big"), len(words) * 4, False
+                )
+            except disasm.UnsupportedObject:
+                continue
+            if instruction.target is None or 0 <= instruction.target < 0x10000000:
+                words.append(word)
+        random_asm = '\n.section .text.random, "ax"\nglabel random\n' + "".join(
+            f".word 0x{word:08x}\n" for word in words
+        )
+
+        config = AsmDifferWrapper.create_config(asm_differ.get_arch("mips"))
+        with tempfile.TemporaryDirectory() as dir:
+            source_path = Path(dir) / "test.s"
+            object_path = Path(dir) / "out.s"
+            source_path.write_text(N64.asm_prelude + DISASSEMBLY_TEST_ASM + random_asm)
+
+            endian_flag_sets: List[List[str]] = [[], ["-EL"]]
+            for endian_flags in endian_flag_sets:
+                subprocess.run(
+                    ["mips-linux-gnu-as", "-march=vr4300", "-mabi=32"]
+                    + endian_flags
+                    + ["-o", str(object_path), str(source_path)],
+                    check=True,
+                    capture_output=True,
+                )
+                data = object_path.read_bytes()
+
+                starts = [0] + [
+                    symbol.value
+                    for symbol in elf.parse_symbols(data)
+                    if symbol.type != elf.STT_SECTION and symbol.defined
+                ]
+                for start in starts:
+                    objdump_proc = subprocess.run(
+                        ["mips-linux-gnu-objdump"]
+                        + config.arch.arch_flags
+                        + [
+                            "--disassemble",
+                            "--disassemble-zeroes",
+                            "--line-numbers",
+                            "--reloc",
+                            f"--start-address={start}",
+                            "out.s",
+                        ],
+                        cwd=dir,
+                        check=True,
+                        capture_output=True,
+                        text=True,
+                    )
+                    self.assertEqual(mips.disassemble(data, start), objdump_proc.stdout)
+
+    @skipUnless(
+        shutil.which("mips-linux-gnu-as") and shutil.which("mips-linux-gnu-objdump"),
+        "requires mips-linux-gnu binutils",
+    )
+    def test_mips_dump_matches_objdump(self):
+        """
+        Ensure that diffs see the same dump of a function with either disassembler
+        """
+        asm = Asm.objects.create(data=DISASSEMBLY_TEST_ASM, hash="disassembly")
+        assembly = CompilerWrapper.assemble_asm(N64, asm)
+        config = AsmDifferWrapper.create_config(asm_differ.get_arch("mips"))
+        dumps = []
+        for in_process in (False, True):
+            with override_settings(IN_PROCESS_DISASSEMBLY=in_process):
+                in_process_count = metrics.get("disassembly.in_process")
+                dumps.append(
+                    AsmDifferWrapper.get_dump(
+                        bytes(assembly.elf_object), N64, "func", config
+                    )
+                )
+                self.assertEqual(
+                    metrics.get("disassembly.in_process"),
+                    in_process_count + in_process,
+                )
+        self.assertEqual(dumps[0], dumps[1])
+        self.assertEqual(
+            asm_differ.process(dumps[0], config), asm_differ.process(dumps[1], config)
+        )
+
+
+class SandboxPoolTests(TestCase):
+    def setUp(self):
+        self.pool = SandboxPool(size=1, max_jobs=2)
+
+    def tearDown(self):
+        self.pool.shutdown()
+
+    def test_pooled_command(self):
+        """
+        Ensure that pooled sandboxes run commands in their own directory, with the given env
+        """
+        with Sandbox(self.pool) as sandbox:
+            self.assertIsNotNone(sandbox.worker)
+            (sandbox.path / "input.txt").write_text("meow")
+            proc = sandbox.run_subprocess(
+                'cat input.txt && echo " $CAT"', shell=True, env={"CAT": "purr"}
+            )
+            self.assertEqual(proc.stdout, "meow purr\n")
+
+            with self.assertRaises(subprocess.CalledProcessError):
+                sandbox.run_subprocess("exit 3", shell=True)
+
+    def test_worker_recycling(self):
+        """
+        Ensure that workers are cleaned between sandboxes and replaced after max_jobs
+        """
+        with Sandbox(self.pool) as sandbox:
+            first_path = sandbox.path
+            (sandbox.path / "leftover.o").write_bytes(b"")
+            sandbox.run_subprocess(["true"])
+
+        with Sandbox(self.pool) as sandbox:
+            self.assertEqual(sandbox.path, first_path)
+            self.assertFalse((sandbox.path / "leftover.o").exists())
+            sandbox.run_subprocess(["true"])
+
+        with Sandbox(self.pool) as sandbox:
+            self.assertNotEqual(sandbox.path, first_path)
+
+    def test_cpu_limit(self):
+        """
+        Ensure that pooled workers limit the CPU time of each job they run
+        """
+        with Sandbox(self.pool) as sandbox:
+            self.assertIsNotNone(sandbox.worker)
+            proc = sandbox.run_subprocess(
+                [
+                    sys.executable,
+                    "-c",
+                    "import resource; print(resource.getrlimit(resource.RLIMIT_CPU))",
+                ]
+            )
+        self.assertEqual(proc.stdout, f"({TIME_LIMIT_SECONDS}, {TIME_LIMIT_SECONDS})\n")
+
+    def test_one_shot_fallback(self):
+        """
+        Ensure that sandboxes still work when every pooled worker is busy
+        """
+        with Sandbox(self.pool) as busy_sandbox:
+            self.assertIsNotNone(busy_sandbox.worker)
+            with Sandbox(self.pool) as sandbox:
+                self.assertIsNone(sandbox.worker)
+                proc = sandbox.run_subprocess(["echo", "hi"])
+                self.assertEqual(proc.stdout, "hi\n")
+
+
+class ProcessPoolTests(TestCase):
+    def test_worker_process(self):
+        """
+        Ensure that work runs in another process, unless the pool is disabled
+        """
+        self.assertNotEqual(process_pool.run(os.getpid), os.getpid())
+        self.assertEqual(process_pool.run_all(max, [(1, 2), (4, 3)]), [2, 4])
+
+        with override_settings(PROCESS_POOL_WORKERS=0):
+            self.assertEqual(process_pool.run(os.getpid), os.getpid())
+
+    def test_crash_isolation(self):
+        """
+        Ensure that a crashed or stuck worker fails only its own work
+        """
+        with self.assertRaises(process_pool.WorkerError):
+            process_pool.run(os._exit, 1)
+        self.assertEqual(process_pool.run(max, 1, 2), 2)
+
+        with override_settings(PROCESS_POOL_TIMEOUT=0):
+            with self.assertRaises(process_pool.WorkerError):
+                process_pool.run(sleep, 10)
+        self.assertEqual(process_pool.run(max, 1, 2), 2)
+
+        # Work running next to a stuck call isn't affected when it times out
+        results: List[Any] = []
+
+        def run_later() -> None:
+            sleep(1)
+            results.append(process_pool.run(sleep, 1.5))
+
+        with override_settings(PROCESS_POOL_TIMEOUT=2):
+            thread = threading.Thread(target=run_later)
+            thread.start()
+            with self.assertRaises(process_pool.WorkerError):
+                process_pool.run(sleep, 10)
+            thread.join()
+        self.assertEqual(results, [None])
+
+
+class CancellationTests(TestCase):
+    def assert_superseded(self, pool: SandboxPool) -> None:
+        started = threading.Event()
+        errors: List[Exception] = []
+
+        def stale_compile() -> None:
+            with cancellation.supersedable(("profile", "scratch")):
+                with Sandbox(pool) as sandbox:
+                    started.set()
+                    try:
+                        sandbox.run_subprocess("sleep 10", shell=True)
+                    except CompilationSuperseded as e:
+                        errors.append(e)
+
+        thread = threading.Thread(target=stale_compile)
+        thread.start()
+        self.assertTrue(started.wait(5))
+        # Give the command time to start
+        sleep(0.2)
+
+        with cancellation.supersedable(("profile", "scratch")):
+            thread.join(5)
+
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(len(errors), 1)
+
+    def test_superseded_one_shot(self):
+        """
+        Ensure that a newer compilation kills the sandboxed process of a superseded one
+        """
+        self.assert_superseded(SandboxPool(size=0, max_jobs=0))
+
+    def test_superseded_pooled(self):
+        """
+        Ensure that a newer compilation kills the pooled worker of a superseded one
+        """
+        pool = SandboxPool(size=1, max_jobs=10)
+        self.assert_superseded(pool)
+
+        # The worker running the superseded command is replaced
+        with Sandbox(pool) as sandbox:
+            self.assertEqual(sandbox.run_subprocess(["echo", "hi"]).stdout, "hi\n")
+        pool.shutdown()
+
+    def test_other_editors_unaffected(self):
+        """
+        Ensure that compilations of other scratches or profiles are not superseded
+        """
+        with cancellation.supersedable(("profile", "scratch")) as token:
+            with cancellation.supersedable(("profile", "other scratch")):
+                pass
+            with cancellation.supersedable(("other profile", "scratch")):
+                pass
+            self.assertFalse(token.cancelled)
+
+
+class WineServerTests(TestCase):
+    def test_needs_wine(self):
+        """
+        Ensure that only compilers run through wine use a persistent wineserver
+        """
+        self.assertTrue(compilers.MWCC_247_92.needs_wine)
+        self.assertTrue(compilers.PSYQ41.needs_wine)
+        self.assertFalse(compilers.GCC263_MIPSEL.needs_wine)
+        self.assertFalse(compilers.IDO71.needs_wine)
+
+    @override_settings(PERSISTENT_WINESERVER=False)
+    def test_disabled(self):
+        """
+        Ensure that no wineserver is started unless persistent wineservers are enabled
+        """
+        with patch.object(wineserver.WineServer, "start") as start:
+            self.assertIsNone(wineserver.host_server())
+            start.assert_not_called()
+
+    def test_worker_wineserver(self):
+        """
+        Ensure that a pooled worker's wineserver outlives the sandboxes it serves, and
+        isn't limited to the CPU time of a compile
+        """
+        worker = SandboxWorker(use_jail=False)
+        try:
+            with patch.object(
+                worker,
+                "_run_job",
+                return_value=subprocess.CompletedProcess([], 0, "", ""),
+            ) as run_job:
+                worker.ensure_wineserver()
+            job = run_job.call_args.args[0]
+            self.assertEqual(job["args"], WINESERVER_COMMAND)
+            self.assertIsNone(job["cpu_limit"])
+            self.assertEqual(worker.jobs, 0)
+
+            socket_dir = worker.path / f".wine-{os.getuid()}"
+            socket_dir.mkdir()
+            (worker.path / "object.o").write_bytes(b"")
+            worker.clean()
+            self.assertTrue(socket_dir.exists())
+            self.assertFalse((worker.path / "object.o").exists())
+        finally:
+            worker.kill()
+
+    def test_pid_isolation(self):
+        """
+        Ensure that jailed commands always get their own PID namespace
+        """
+        command = jail_command(Path("/tmp/test"), [], {})
+        self.assertNotIn("--disable_clone_newpid", command)
+
+    def test_no_cpu_limit(self):
+        """
+        Ensure that long-lived jails aren't limited to the CPU time of a compile
+        """
+        command = jail_command(Path("/tmp/test"), [], {}, time_limit=False)
+        index = command.index("--rlimit_cpu")
+        self.assertEqual(command[index + 1], "soft")
+        self.assertNotIn("--time_limit", command)
+
+        command = jail_command(Path("/tmp/test"), [], {})
+        index = command.index("--rlimit_cpu")
+        self.assertEqual(command[index + 1], str(TIME_LIMIT_SECONDS))
+
+    @override_settings(PERSISTENT_WINESERVER=True)
+    def test_restart_backoff(self):
+        """
+        Ensure that a wineserver that fails to start is not restarted on every compile
+        """
+        server = wineserver.WineServer()
+        with patch.object(subprocess, "Popen", side_effect=OSError) as popen:
+            self.assertFalse(server.ensure_running())
+            self.assertFalse(server.ensure_running())
+            self.assertEqual(popen.call_count, 1)
+
 
 class DecompilationTests(BaseTestCase):
     @requiresCompiler(GCC281)
@@ -504,6 +1795,126 @@ class M2CTests(TestCase):
             c_code,
         )
 
+    """
+    Ensure that contexts are only parsed once, in memory and across restarts
+    """
+
+    @override_settings(PROCESS_POOL_WORKERS=0)
+    def test_context_cache(self):
+        asm = "glabel func\njr $ra\nlw $v0,0($a0)\n"
+        context = "typedef int s32;\ns32 func(s32 *cache_test);\n"
+
+        with tempfile.TemporaryDirectory() as cache_dir, override_settings(
+            M2C_CONTEXT_CACHE_DIR=cache_dir
+        ), patch.object(
+            c_types, "_parse_into_typemap", wraps=c_types._parse_into_typemap
+        ) as parse:
+            outputs = [M2CWrapper.decompile(asm, context, IDO53, "mips")]
+            outputs.append(M2CWrapper.decompile(asm, context, IDO53, "mips"))
+            self.assertEqual(parse.call_count, 1)
+
+            # Simulate a restart
+            c_types._typemap_cache.clear()
+            outputs.append(M2CWrapper.decompile(asm, context, IDO53, "mips"))
+            self.assertEqual(parse.call_count, 1)
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+        self.assertEqual(
+            outputs[0], "s32 func(s32* cache_test) {\n    return *cache_test;\n}\n"
+        )
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertEqual(outputs[0], outputs[2])
+
+    """
+    Ensure that editing the end of a context only parses the edited part again
+    """
+
+    @override_settings(PROCESS_POOL_WORKERS=0)
+    def test_incremental_context_parsing(self):
+        asm = "glabel func\njr $ra\nlw $v0,0($a0)\n"
+        context = "".join(
+            f"typedef struct Incremental{i} {{\n    int x;\n}} Incremental{i};\n"
+            for i in range(20)
+        )
+
+        with patch.object(c_types, "CONTEXT_CHUNK_SIZE", 100), patch.object(
+            c_types, "_parse_c_with_parser", wraps=c_types._parse_c_with_parser
+        ) as parse:
+            M2CWrapper.decompile(asm, context, IDO53, "mips")
+            chunks = parse.call_count
+
+            context += "s32 func(Incremental3 *arg);\n"
+            c_code = M2CWrapper.decompile(asm, context, IDO53, "mips")
+
+        self.assertGreater(chunks, 5)
+        self.assertEqual(parse.call_count, chunks + 1)
+        self.assertEqual(
+            c_code, "s32 func(Incremental3* arg) {\n    return arg->x;\n}\n"
+        )
+
+    """
+    Ensure that decompilations in concurrent threads don't mix up their output
+    """
+
+    @override_settings(PROCESS_POOL_WORKERS=0)
+    def test_concurrent_decompilation(self):
+        def decompile(i: int) -> str:
+            return M2CWrapper.decompile(
+                f"glabel return_{i}\njr $ra\nli $v0,{i}\n", "", IDO53, "mips"
+            )
+
+        results: Dict[int, str] = {}
+
+        def worker(i: int) -> None:
+            for _ in range(5):
+                results[i] = decompile(i)
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for i in range(4):
+            self.assertEqual(
+                results[i], f"? return_{i}(void) {{\n    return {i};\n}}\n"
+            )
+
+    """
+    Ensure that a crashed or stuck worker is reported as a decompilation error
+    """
+
+    def test_worker_error(self):
+        with patch.object(
+            process_pool, "run", side_effect=process_pool.WorkerError("crashed")
+        ):
+            with self.assertRaisesRegex(M2CError, "Error running mips_to_c: crashed"):
+                M2CWrapper.decompile("glabel func\njr $ra\nnop\n", "", IDO53, "mips")
+
+    """
+    Ensure that the lexer used for contexts produces the same tokens as pycparser's
+    """
+
+    def test_fast_context_lexer(self):
+        source = (
+            "typedef struct Foo {\n\n\tint x[4], y;\n} Foo;\n"
+            'const char *s = L"wide", *t = u8"utf8";\n'
+            "int L = 'a' + u'b' + sizeof(Foo) * 0x10;\n"
+            "#pragma pack(1)\nvoid f(Foo *p, ...);\n"
+        )
+        _, fast_lexer = c_types.get_c_parser()
+        self.assertIs(c_types.get_c_parser()[1], fast_lexer)
+
+        def tokens(lexer: Any) -> List[Any]:
+            lexer.input(source)
+            lexer.lexer.lineno = 1
+            result = []
+            while (tok := lexer.token()) is not None:
+                result.append((tok.type, tok.value, tok.lineno, tok.lexpos))
+            return result
+
+        self.assertEqual(tokens(fast_lexer), tokens(CParser().clex))
+
 
 class UserTests(BaseTestCase):
     current_user_url: str
@@ -1,9 +1,12 @@
 from django.urls import path
 
-from coreapp.views import compilers, project, scratch, user
+from coreapp.views import batch, compilers, jobs, project, scratch, user
 
 urlpatterns = [
     path("compilers", compilers.CompilersDetail.as_view(), name="compilers"),
+    path("compile/batch", batch.BatchCompile.as_view(), name="compile-batch"),
+    path("jobs", jobs.JobList.as_view(), name="job-list"),
+    path("jobs/<str:job_id>", jobs.JobDetail.as_view(), name="job-detail"),
     *scratch.router.urls,
     *project.router.urls,
     path("user", user.CurrentUser.as_view(), name="current-user"),
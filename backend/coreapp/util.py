@@ -1,13 +1,96 @@
 import hashlib
 import logging
-import time
-from typing import Tuple
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Generic, Hashable, Optional, Tuple, TypeVar
 
 logger = logging.getLogger(__name__)
 
-_startup_time = int(time.time())
-logger.info("Startup time: %s", _startup_time)
+T = TypeVar("T")
+K = TypeVar("K", bound=Hashable)
 
 
-def gen_hash(key: Tuple[str, ...]) -> str:
-    return hashlib.sha256(str(key + (_startup_time,)).encode("utf-8")).hexdigest()
+def gen_stable_hash(key: Tuple[str, ...]) -> str:
+    """
+    Hash a key so that the result does not change across process restarts
+    """
+    return hashlib.sha256(str(key).encode("utf-8")).hexdigest()
+
+
+class _Flight(Generic[T]):
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Optional[T] = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight(Generic[T]):
+    """
+    Runs at most one call per key at a time. Callers that arrive while a call with
+    the same key is running wait for it and share its result (or exception).
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._flights: Dict[str, _Flight[T]] = {}
+
+    def do(self, key: str, fn: Callable[[], T]) -> Tuple[T, bool]:
+        """
+        Returns the result of the call, and whether it was shared with another caller
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if flight is None:
+                flight = _Flight()
+                self._flights[key] = flight
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True  # type: ignore
+
+        try:
+            flight.result = fn()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+        return flight.result, False
+
+
+class LRUCache(Generic[K, T]):
+    """
+    A thread-safe mapping that forgets its least recently used entries beyond `maxsize`
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[K, T]" = OrderedDict()
+
+    def get(self, key: K) -> Optional[T]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: K, value: T) -> None:
+        if self.maxsize <= 0:
+            return
+
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
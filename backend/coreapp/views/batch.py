@@ -0,0 +1,189 @@
+import copy
+import json
+import logging
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.db import connections
+from django.http import StreamingHttpResponse
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.request import Request
+from rest_framework.views import APIView
+
+from ..compiler_wrapper import CompilationResult, DiffResult
+from ..error import SubprocessError, error_json
+from ..models.scratch import Scratch
+from .scratch import compile_scratch, diff_compilation, update_scratch_score
+
+logger = logging.getLogger(__name__)
+
+# Fields of a scratch that a batch item may override, as in ScratchViewSet.compile
+OVERRIDABLE_FIELDS = ["compiler", "compiler_flags", "source_code", "context"]
+
+Outcome = Tuple[CompilationResult, DiffResult]
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def batch_executor() -> ThreadPoolExecutor:
+    """
+    The worker pool shared by all batch compilations, which bounds how many
+    compilations batches can run at once
+    """
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.BATCH_COMPILE_WORKERS,
+                thread_name_prefix="batch-compile",
+            )
+        return _executor
+
+
+def compile_and_diff(scratch: Scratch) -> Outcome:
+    try:
+        compilation = compile_scratch(scratch)
+        return compilation, diff_compilation(scratch, compilation)
+    finally:
+        # Worker threads outlive the request, so don't leave their connections open
+        connections.close_all()
+
+
+class BatchCompile(APIView):
+    """
+    Compile and diff many scratches in one request, with optional overrides like
+    those accepted by the scratch compile endpoint:
+
+        {"items": ["slug", {"slug": "other", "compiler_flags": "-O2"}, ...]}
+
+    Results are streamed as newline-delimited JSON, one line per item, in the order
+    in which they finish. Identical items are only compiled once. Scores are updated
+    for items without overrides.
+    """
+
+    def parse_items(self, request: Request) -> List[Dict[str, str]]:
+        items = request.data.get("items") if isinstance(request.data, dict) else None
+        if not isinstance(items, list):
+            raise ValidationError({"items": "Expected a list of scratches"})
+
+        if len(items) > settings.BATCH_COMPILE_MAX_ITEMS:
+            raise ValidationError(
+                {
+                    "items": f"At most {settings.BATCH_COMPILE_MAX_ITEMS} items can be compiled at once"
+                }
+            )
+
+        parsed: List[Dict[str, str]] = []
+        for item in items:
+            if isinstance(item, str):
+                item = {"slug": item}
+            if not isinstance(item, dict) or not isinstance(item.get("slug"), str):
+                raise ValidationError({"items": "Each item needs a scratch slug"})
+            for field in OVERRIDABLE_FIELDS:
+                if field in item and not isinstance(item[field], str):
+                    raise ValidationError({"items": f"{field} must be a string"})
+            parsed.append(item)
+        return parsed
+
+    def post(self, request: Request) -> StreamingHttpResponse:
+        items = self.parse_items(request)
+
+        scratches = Scratch.objects.select_related("target_assembly").in_bulk(
+            [item["slug"] for item in items], field_name="slug"
+        )
+
+        return StreamingHttpResponse(
+            (
+                json.dumps(line).encode("utf-8") + b"\n"
+                for line in self.run(items, scratches)
+            ),
+            status=status.HTTP_200_OK,
+            content_type="application/x-ndjson",
+        )
+
+    def run(
+        self, items: List[Dict[str, str]], scratches: Dict[str, Scratch]
+    ) -> Iterator[Dict[str, Any]]:
+        executor = batch_executor()
+
+        futures: Dict[Tuple[Any, ...], "Future[Outcome]"] = {}
+        waiting: Dict["Future[Outcome]", List[int]] = {}
+        item_scratches: Dict[int, Scratch] = {}
+
+        for index, item in enumerate(items):
+            base = scratches.get(item["slug"])
+            if base is None:
+                yield {
+                    "index": index,
+                    "slug": item["slug"],
+                    "error": {"detail": "Not found.", "kind": "NotFound"},
+                }
+                continue
+
+            # Each item gets its own copy, so that overrides don't leak into others
+            scratch = copy.copy(base)
+            for field in OVERRIDABLE_FIELDS:
+                if field in item:
+                    setattr(scratch, field, item[field])
+            item_scratches[index] = scratch
+
+            key = (
+                scratch.compiler,
+                scratch.compiler_flags,
+                scratch.source_code,
+                scratch.context,
+                scratch.target_assembly_id,
+                scratch.platform,
+                scratch.diff_label,
+            )
+            future = futures.get(key)
+            if future is None:
+                future = executor.submit(compile_and_diff, scratch)
+                futures[key] = future
+                waiting[future] = []
+            waiting[future].append(index)
+
+        pending: Set["Future[Outcome]"] = set(waiting)
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    for index in waiting[future]:
+                        yield self.result_line(
+                            index, items[index], item_scratches[index], future
+                        )
+        finally:
+            # The client went away: don't compile anything it will never see
+            for future in pending:
+                future.cancel()
+
+    def result_line(
+        self,
+        index: int,
+        item: Dict[str, str],
+        scratch: Scratch,
+        future: "Future[Outcome]",
+    ) -> Dict[str, Any]:
+        line: Dict[str, Any] = {"index": index, "slug": item["slug"]}
+
+        exc = future.exception()
+        if exc is not None:
+            if not isinstance(exc, SubprocessError):
+                logger.error(
+                    f"Batch compilation of {item['slug']} failed", exc_info=exc
+                )
+            line["error"] = error_json(exc)
+            return line
+
+        compilation, diff = future.result()
+        if not any(field in item for field in OVERRIDABLE_FIELDS):
+            update_scratch_score(scratch, diff)
+
+        line["diff_output"] = diff
+        line["errors"] = compilation.errors
+        return line
@@ -0,0 +1,132 @@
+import asyncio
+import json
+import re
+from functools import partial
+from typing import Any, Dict
+
+from django.shortcuts import get_object_or_404
+from rest_framework import status
+from rest_framework.exceptions import NotFound, Throttled, ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from ..jobs import PRIORITIES, QueueFull, default_queue
+from ..middleware import Request
+from ..models.scratch import Scratch
+from ..serializers import JobCreateSerializer
+from .batch import OVERRIDABLE_FIELDS
+from .scratch import compile_scratch, diff_compilation, update_scratch_score
+
+# Longest time a poll may wait for a job to finish. Polls hold a request thread the
+# whole time, so clients that want to wait longer should use the job's websocket
+MAX_POLL_WAIT_SECONDS = 2
+
+JOB_WEBSOCKET_PATH = re.compile(r"^/api/jobs/(?P<id>[0-9a-f]+)/ws$")
+
+
+def compile_job(scratch: Scratch, update_score: bool) -> Dict[str, Any]:
+    compilation = compile_scratch(scratch)
+    diff = diff_compilation(scratch, compilation)
+
+    if update_score:
+        update_scratch_score(scratch, diff)
+
+    return {
+        "diff_output": diff,
+        "errors": compilation.errors,
+    }
+
+
+class JobList(APIView):
+    def post(self, request: Request):
+        """
+        Queue a compilation of a scratch, with the same optional overrides as the
+        scratch compile endpoint. Interactive jobs run before background ones.
+        """
+        ser = JobCreateSerializer(data=request.data)
+        ser.is_valid(raise_exception=True)
+        data = ser.validated_data
+
+        scratch = get_object_or_404(
+            Scratch.objects.select_related("target_assembly"), slug=data["scratch"]
+        )
+
+        overridden = False
+        for field in OVERRIDABLE_FIELDS:
+            if field in data:
+                setattr(scratch, field, data[field])
+                overridden = True
+
+        try:
+            job = default_queue().submit(
+                partial(compile_job, scratch, update_score=not overridden),
+                priority=PRIORITIES[data["priority"]],
+                profile_id=request.profile.id,
+            )
+        except QueueFull as e:
+            raise Throttled(detail=str(e))
+
+        return Response(job.to_json(), status=status.HTTP_202_ACCEPTED)
+
+
+class JobDetail(APIView):
+    def get(self, request: Request, job_id: str):
+        """
+        Get the status of a job, and its result once it has finished. Pass `wait`
+        to wait up to that many seconds (at most MAX_POLL_WAIT_SECONDS) for the job to
+        finish before responding.
+        """
+        job = default_queue().get(job_id)
+        if job is None:
+            raise NotFound()
+
+        try:
+            wait = float(request.query_params.get("wait", 0))
+        except ValueError:
+            raise ValidationError({"wait": "Must be a number of seconds"})
+
+        if wait > 0:
+            job.wait(min(wait, MAX_POLL_WAIT_SECONDS))
+
+        return Response(job.to_json())
+
+
+async def job_websocket(scope, receive, send) -> None:
+    """
+    ASGI handler for /api/jobs/<id>/ws, which sends the job's current status upon
+    connecting, and pushes it again once the job has finished
+    """
+    if (await receive())["type"] != "websocket.connect":
+        return
+
+    match = JOB_WEBSOCKET_PATH.match(scope["path"])
+    job = default_queue().get(match["id"]) if match else None
+    if job is None:
+        await send({"type": "websocket.close", "code": 4404})
+        return
+
+    await send({"type": "websocket.accept"})
+    await send({"type": "websocket.send", "text": json.dumps(job.to_json())})
+
+    loop = asyncio.get_running_loop()
+    finished: "asyncio.Future[None]" = loop.create_future()
+
+    def set_finished() -> None:
+        if not finished.done():
+            finished.set_result(None)
+
+    job.add_listener(lambda job: loop.call_soon_threadsafe(set_finished))
+
+    async def disconnected() -> None:
+        while (await receive())["type"] != "websocket.disconnect":
+            pass
+
+    disconnect = asyncio.ensure_future(disconnected())
+    done, _ = await asyncio.wait(
+        {finished, disconnect}, return_when=asyncio.FIRST_COMPLETED
+    )
+    disconnect.cancel()
+
+    if finished in done:
+        await send({"type": "websocket.send", "text": json.dumps(job.to_json())})
+        await send({"type": "websocket.close", "code": 1000})
@@ -11,13 +11,13 @@ import django_filters
 from django.http import HttpResponse, QueryDict
 from rest_framework import filters, mixins, serializers, status
 from rest_framework.decorators import action
-from rest_framework.exceptions import APIException
+from rest_framework.exceptions import APIException, ValidationError
 from rest_framework.pagination import CursorPagination
 from rest_framework.response import Response
 from rest_framework.routers import DefaultRouter
 from rest_framework.viewsets import GenericViewSet
 
-from coreapp import compilers, platforms
+from coreapp import cancellation, compilers, platforms
 
 from ..asm_diff_wrapper import AsmDifferWrapper
 from ..compiler_wrapper import CompilationResult, CompilerWrapper, DiffResult
@@ -64,14 +64,25 @@ def compile_scratch(scratch: Scratch) -> CompilationResult:
 
 
 def diff_compilation(
-    scratch: Scratch, compilation: CompilationResult, allow_target_only: bool = False
+    scratch: Scratch,
+    compilation: CompilationResult,
+    allow_target_only: bool = False,
+    threeway: Optional[str] = None,
+    editor: Optional[int] = None,
 ) -> DiffResult:
+    incremental_key = scratch.slug or None
+    if incremental_key and threeway:
+        # Each editor of a scratch compares against their own previous compilation
+        incremental_key = f"{incremental_key}/{editor}"
+
     return AsmDifferWrapper.diff(
         scratch.target_assembly,
         platforms.from_id(scratch.platform),
         scratch.diff_label,
         compilation.elf_object,
         allow_target_only=allow_target_only,
+        incremental_key=incremental_key,
+        threeway=threeway,
     )
 
 
@@ -319,11 +330,17 @@ class ScratchViewSet(
 
         return response
 
-    # POST on compile takes a partial and does not update the scratch's compilation status
+    # POST on compile takes a partial and does not update the scratch's compilation status.
+    # ?threeway=prev or ?threeway=base adds a column comparing the diff to the previous
+    # or first one requested with it.
     @action(detail=True, methods=["GET", "POST"])
     def compile(self, request, pk):
         scratch: Scratch = self.get_object()
 
+        threeway = request.query_params.get("threeway")
+        if threeway not in (None, "prev", "base"):
+            raise ValidationError({"threeway": "Expected 'prev' or 'base'"})
+
         # Apply partial
         if request.method == "POST":
             # TODO: use a serializer w/ validation
@@ -336,8 +353,16 @@ class ScratchViewSet(
             if "context" in request.data:
                 scratch.context = request.data["context"]
 
-        compilation = compile_scratch(scratch)
-        diff = diff_compilation(scratch, compilation)
+        # Edits from the same profile supersede its earlier compilations of the scratch
+        editor = None
+        if request.method == "POST" and request.profile.id is not None:
+            editor = (request.profile.id, scratch.slug)
+
+        with cancellation.supersedable(editor):
+            compilation = compile_scratch(scratch)
+            diff = diff_compilation(
+                scratch, compilation, threeway=threeway, editor=request.profile.id
+            )
 
         if request.method == "GET":
             update_scratch_score(scratch, diff)
@@ -349,6 +374,33 @@ class ScratchViewSet(
             }
         )
 
+    @action(detail=True, methods=["GET", "POST"], url_path="object-diff")
+    def object_diff(self, request, pk):
+        """
+        Like compile, but scores every function of the compiled object against the
+        target's function of the same name, for scratches of whole translation units
+        """
+        scratch: Scratch = self.get_object()
+
+        if request.method == "POST":
+            for field in ["compiler", "compiler_flags", "source_code", "context"]:
+                if field in request.data:
+                    setattr(scratch, field, request.data[field])
+
+        compilation = compile_scratch(scratch)
+        diff = AsmDifferWrapper.diff_object(
+            scratch.target_assembly,
+            platforms.from_id(scratch.platform),
+            compilation.elf_object,
+        )
+
+        return Response(
+            {
+                "diff_output": diff,
+                "errors": compilation.errors,
+            }
+        )
+
     @action(detail=True, methods=["POST"])
     def decompile(self, request, pk):
         scratch: Scratch = self.get_object()
@@ -0,0 +1,141 @@
+import atexit
+import logging
+import os
+import subprocess
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# How long to wait for a freshly started wineserver to create its socket
+STARTUP_TIMEOUT_SECONDS = 10
+
+# Don't try to restart a wineserver that failed to start more often than this
+RESTART_BACKOFF_SECONDS = 60
+
+
+class WineServer:
+    """
+    A persistent wineserver for WINEPREFIX, shared by all wine compiles that run
+    outside of the jail, so that they don't pay for booting the prefix and starting a
+    server every time. Wine clients find it through the host's /tmp.
+
+    Jailed compiles don't use it: wine clients and the server signal each other by
+    pid, so sharing it would take them out of the jail's PID namespace. Pooled sandbox
+    workers keep a server of their own instead (see SandboxWorker.ensure_wineserver).
+    """
+
+    def __init__(self) -> None:
+        self.proc: Optional[subprocess.Popen[bytes]] = None
+        self.failed_at: Optional[float] = None
+        self.lock = threading.Lock()
+        self.socket_dir = Path("/tmp") / f".wine-{os.getuid()}"
+
+    def healthy(self) -> bool:
+        if self.proc is None or self.proc.poll() is not None:
+            return False
+        return any(self.socket_dir.glob("server-*/socket"))
+
+    def start(self) -> bool:
+        self.stop()
+
+        # -f: stay in the foreground, so that we can supervise it
+        # -p: don't exit once the last client disconnects
+        command = ["wineserver", "-f", "-p"]
+
+        logger.info("Starting persistent wineserver")
+        try:
+            self.proc = subprocess.Popen(
+                command,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                env={**os.environ, "WINEPREFIX": str(settings.WINEPREFIX)},
+            )
+        except OSError:
+            logger.exception("Failed to start wineserver")
+            self.failed_at = time.monotonic()
+            return False
+
+        deadline = time.monotonic() + STARTUP_TIMEOUT_SECONDS
+        while time.monotonic() < deadline:
+            if self.healthy():
+                self.failed_at = None
+                return True
+            if self.proc.poll() is not None:
+                break
+            time.sleep(0.05)
+
+        logger.error("Wineserver did not come up")
+        self.stop()
+        self.failed_at = time.monotonic()
+        return False
+
+    def stop(self) -> None:
+        if self.proc is None:
+            return
+
+        if self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+                self.proc.wait()
+        self.proc = None
+
+    def ensure_running(self) -> bool:
+        with self.lock:
+            if self.healthy():
+                return True
+
+            if (
+                self.failed_at is not None
+                and time.monotonic() - self.failed_at < RESTART_BACKOFF_SECONDS
+            ):
+                return False
+
+            if self.proc is not None:
+                logger.warning("Wineserver died, restarting it")
+            return self.start()
+
+
+_server: Optional[WineServer] = None
+_server_lock = threading.Lock()
+
+
+def host_server() -> Optional[WineServer]:
+    """
+    Returns the running persistent wineserver for compiles outside of the jail, or None
+    if persistent wineservers are disabled or the server is unavailable (in which case
+    wine starts a short-lived server of its own, as usual).
+    """
+    global _server
+
+    if not settings.PERSISTENT_WINESERVER:
+        return None
+
+    with _server_lock:
+        if _server is None:
+            _server = WineServer()
+        server = _server
+
+    if not server.ensure_running():
+        return None
+    return server
+
+
+@atexit.register
+def shutdown() -> None:
+    global _server
+
+    with _server_lock:
+        server = _server
+        _server = None
+
+    if server is not None:
+        server.stop()
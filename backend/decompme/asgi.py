@@ -13,4 +13,15 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "decompme.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Needs the app registry, which get_asgi_application sets up
+from coreapp.views.jobs import job_websocket  # noqa: E402
+
+
+async def application(scope, receive, send):
+    # Django doesn't handle websockets, so route those to our own handler
+    if scope["type"] == "websocket":
+        await job_websocket(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -30,7 +30,25 @@ env = environ.Env(
     GITHUB_CLIENT_SECRET=(str, ""),
     COMPILER_BASE_PATH=(str, BASE_DIR / "compilers"),
     COMPILATION_CACHE_SIZE=(int, 100),
+    COMPILATION_DB_CACHE_SIZE=(int, 10000),
+    TARGET_DUMP_CACHE_SIZE=(int, 256),
+    PERSIST_TARGET_DUMPS=(bool, True),
+    INCREMENTAL_DIFF_CACHE_SIZE=(int, 256),
+    IN_PROCESS_DISASSEMBLY=(bool, False),
     WINEPREFIX=(str, "/tmp/wine"),
+    PERSISTENT_WINESERVER=(bool, False),
+    SANDBOX_POOL_SIZE=(int, 0),
+    SANDBOX_POOL_MAX_JOBS=(int, 100),
+    BATCH_COMPILE_WORKERS=(int, 4),
+    BATCH_COMPILE_MAX_ITEMS=(int, 1000),
+    JOB_QUEUE_WORKERS=(int, 4),
+    JOB_QUEUE_PROFILE_LIMIT=(int, 2),
+    JOB_QUEUE_RESULT_TTL=(int, 300),
+    JOB_QUEUE_PROFILE_MAX_PENDING=(int, 20),
+    JOB_QUEUE_MAX_PENDING=(int, 1000),
+    PROCESS_POOL_WORKERS=(int, 4),
+    PROCESS_POOL_TIMEOUT=(int, 60),
+    M2C_CONTEXT_CACHE_DIR=(str, ""),
 )
 
 for stem in [".env.local", ".env"]:
@@ -181,10 +199,28 @@ USE_SANDBOX_JAIL = env("USE_SANDBOX_JAIL")
 SANDBOX_NSJAIL_BIN_PATH = Path(env("SANDBOX_NSJAIL_BIN_PATH"))
 SANDBOX_CHROOT_PATH = BASE_DIR.parent / "sandbox" / "root"
 SANDBOX_TMP_PATH = BASE_DIR.parent / "sandbox" / "tmp"
+SANDBOX_POOL_SIZE = env("SANDBOX_POOL_SIZE", int)
+SANDBOX_POOL_MAX_JOBS = env("SANDBOX_POOL_MAX_JOBS", int)
 
 GITHUB_CLIENT_ID = env("GITHUB_CLIENT_ID", str)
 GITHUB_CLIENT_SECRET = env("GITHUB_CLIENT_SECRET", str)
 
 COMPILATION_CACHE_SIZE = env("COMPILATION_CACHE_SIZE", int)
+COMPILATION_DB_CACHE_SIZE = env("COMPILATION_DB_CACHE_SIZE", int)
+TARGET_DUMP_CACHE_SIZE = env("TARGET_DUMP_CACHE_SIZE", int)
+PERSIST_TARGET_DUMPS = env("PERSIST_TARGET_DUMPS", bool)
+INCREMENTAL_DIFF_CACHE_SIZE = env("INCREMENTAL_DIFF_CACHE_SIZE", int)
+IN_PROCESS_DISASSEMBLY = env("IN_PROCESS_DISASSEMBLY", bool)
+BATCH_COMPILE_WORKERS = env("BATCH_COMPILE_WORKERS", int)
+BATCH_COMPILE_MAX_ITEMS = env("BATCH_COMPILE_MAX_ITEMS", int)
+JOB_QUEUE_WORKERS = env("JOB_QUEUE_WORKERS", int)
+JOB_QUEUE_PROFILE_LIMIT = env("JOB_QUEUE_PROFILE_LIMIT", int)
+JOB_QUEUE_RESULT_TTL = env("JOB_QUEUE_RESULT_TTL", int)
+JOB_QUEUE_PROFILE_MAX_PENDING = env("JOB_QUEUE_PROFILE_MAX_PENDING", int)
+JOB_QUEUE_MAX_PENDING = env("JOB_QUEUE_MAX_PENDING", int)
+PROCESS_POOL_WORKERS = env("PROCESS_POOL_WORKERS", int)
+PROCESS_POOL_TIMEOUT = env("PROCESS_POOL_TIMEOUT", int)
+M2C_CONTEXT_CACHE_DIR = env("M2C_CONTEXT_CACHE_DIR", str)
 
 WINEPREFIX = Path(env("WINEPREFIX"))
+PERSISTENT_WINESERVER = env("PERSISTENT_WINESERVER", bool)
@@ -1,12 +1,16 @@
 """This file handles variable types, function signatures and struct layouts
 based on a C AST. Based on the pycparser library."""
 
+import contextlib
 import copy
 import functools
 import hashlib
+import os
 import pickle
 import re
-from collections import defaultdict
+import tempfile
+import threading
+from collections import OrderedDict, defaultdict
 from dataclasses import dataclass, field
 from pathlib import Path
 from typing import (
@@ -17,15 +21,16 @@ from typing import (
     Match,
     Optional,
     Set,
+    TextIO,
     Tuple,
     Union,
-    cast,
 )
 
 from pycparser import c_ast as ca
 from pycparser.c_ast import ArrayDecl, FuncDecl, IdentifierType, PtrDecl, TypeDecl
 from pycparser.c_generator import CGenerator
 from pycparser.c_parser import CParser
+from pycparser.ply.lex import LexToken
 from pycparser.plyparser import ParseError
 
 from .error import DecompFailure
@@ -80,8 +85,9 @@ class Function:
 
 @dataclass(eq=False)
 class TypeMap:
-    # Change VERSION if TypeMap changes to invalidate all preexisting caches
-    VERSION: ClassVar[int] = 3
+    # Change VERSION if TypeMap or typemap_source_hash changes to invalidate all
+    # preexisting caches
+    VERSION: ClassVar[int] = 4
 
     cparser_scope: CParserScope = field(default_factory=dict)
     source_hash: Optional[str] = None
@@ -128,10 +134,16 @@ def type_from_global_decl(decl: ca.Decl) -> CType:
         return tp
 
     def anonymize_param(param: ca.Decl) -> ca.Typename:
-        param = copy.deepcopy(param)
-        param.name = None
-        set_decl_name(param)
-        return ca.Typename(name=None, quals=param.quals, type=param.type, align=[])
+        # Like set_decl_name with a name of None, but only copies the nodes down to
+        # the TypeDecl holding the name. The rest of the AST is never modified, and
+        # deep copies of large contexts' declarations are slow.
+        type = copy.copy(param.type)
+        node = type
+        while not isinstance(node, TypeDecl):
+            node.type = copy.copy(node.type)
+            node = node.type
+        node.declname = None
+        return ca.Typename(name=None, quals=param.quals, type=type, align=[])
 
     new_params: List[Union[ca.Decl, ca.ID, ca.Typename, ca.EllipsisParam]] = [
         anonymize_param(param) if isinstance(param, ca.Decl) else param
@@ -558,20 +570,26 @@ def add_builtin_typedefs(source: str) -> str:
     return line + "\n" + source
 
 
+COMMENT_OR_STRING_RE = re.compile(
+    r'//[^\n]*|/\*.*?\*/|\'(?:\\.|[^\\\'])*\'|"(?:\\.|[^\\"])*"', re.DOTALL
+)
+
+
 def strip_comments(text: str) -> str:
     # https://stackoverflow.com/a/241506
     def replacer(match: Match[str]) -> str:
         s = match.group(0)
-        if s.startswith("/"):
+        if s[0] == "/":
             return " " + "\n" * s.count("\n")
         else:
             return s
 
-    pattern = re.compile(
-        r'//.*?$|/\*.*?\*/|\'(?:\\.|[^\\\'])*\'|"(?:\\.|[^\\"])*"',
-        re.DOTALL | re.MULTILINE,
-    )
-    return re.sub(pattern, replacer, text)
+    if "/" not in text:
+        return text
+    return COMMENT_OR_STRING_RE.sub(replacer, text)
+
+
+MACRO_DEF_RE = re.compile(r"^[ \t]*#[ \t]*define[ \t](?:[^\\\n]|\\\n?)*", re.MULTILINE)
 
 
 def strip_macro_defs(text: str) -> str:
@@ -591,149 +609,445 @@ def strip_macro_defs(text: str) -> str:
 
     Under the optimistic assumption that the macros aren't necessary for parsing the
     context file itself, we strip all macro definitions before parsing."""
-    pattern = re.compile(r"^[ \t]*#[ \t]*define[ \t](\\\n|.)*", flags=re.MULTILINE)
-    return re.sub(pattern, lambda m: m.group(0).count("\n") * "\n", text)
+    if "define" not in text:
+        return text
+    return MACRO_DEF_RE.sub(lambda m: m.group(0).count("\n") * "\n", text)
+
+
+class FastCLexer:
+    """A wrapper around CParser's lexer, which lexes identifiers, newlines and the
+    simplest punctuation itself: most of the characters of a context. PLY instead
+    tries its master regexes one after the other for each token, and only the third
+    one matches identifiers."""
+
+    ID_RE = re.compile(r"[a-zA-Z_$][0-9a-zA-Z_$]*")
+    PUNCTUATION = {
+        ";": "SEMI",
+        ",": "COMMA",
+        "(": "LPAREN",
+        ")": "RPAREN",
+        "[": "LBRACKET",
+        "]": "RBRACKET",
+    }
+    # Prefixes of wide and unicode character and string literals
+    LITERAL_PREFIXES = {"L", "u", "U", "u8"}
+
+    def __init__(self, c_parser: CParser) -> None:
+        self.clex = c_parser.clex
+        self.lexer = c_parser.clex.lexer
+
+    def input(self, text: str) -> None:
+        self.clex.input(text)
+
+    def token(self) -> Optional[LexToken]:
+        lexer = self.lexer
+        data: str = lexer.lexdata
+        pos: int = lexer.lexpos
+        end: int = lexer.lexlen
+
+        while lexer.lexstate == "INITIAL" and pos < end:
+            c = data[pos]
+            if c == " " or c == "\t":
+                pos += 1
+            elif c == "\n":
+                newlines_end = pos + 1
+                while newlines_end < end and data[newlines_end] == "\n":
+                    newlines_end += 1
+                lexer.lineno += newlines_end - pos
+                pos = newlines_end
+            elif c in self.PUNCTUATION:
+                tok = LexToken()
+                tok.type = self.PUNCTUATION[c]
+                tok.value = c
+                tok.lineno = lexer.lineno
+                tok.lexpos = pos
+                lexer.lexpos = pos + 1
+                self.clex.last_token = tok
+                return tok
+            else:
+                m = self.ID_RE.match(data, pos)
+                if m is None:
+                    break
+                value = m.group()
+                if value in self.LITERAL_PREFIXES and data[m.end() : m.end() + 1] in (
+                    "'",
+                    '"',
+                ):
+                    break
+                tok = LexToken()
+                tok.value = value
+                tok.lineno = lexer.lineno
+                tok.lexpos = pos
+                tok.lexer = lexer
+                lexer.lexpos = m.end()
+                # Sets the type to a keyword, ID or TYPEID
+                self.clex.last_token = self.clex.t_ID(tok)
+                return tok
 
+        lexer.lexpos = pos
+        token: Optional[LexToken] = self.clex.token()
+        return token
 
-def parse_c(
-    source: str, initial_scope: CParserScope
-) -> Tuple[ca.FileAST, CParserScope]:
+
+_c_parsers = threading.local()
+
+
+def get_c_parser() -> Tuple[CParser, FastCLexer]:
+    """This thread's CParser, which is reused as building one takes a while"""
+    parser: Optional[Tuple[CParser, FastCLexer]] = getattr(_c_parsers, "parser", None)
+    if parser is None:
+        c_parser = CParser()
+        parser = (c_parser, FastCLexer(c_parser))
+        _c_parsers.parser = parser
+    return parser
+
+
+# Load the parser tables on import, rather than during the first decompilation
+get_c_parser()
+
+
+def _parse_c_with_parser(
+    source: str, scope: CParserScope, lineno: int = 1
+) -> ca.FileAST:
     # This is a modified version of `CParser.parse()` which initializes `_scope_stack`,
     # which contains the only stateful part of the parser that needs to be preserved
-    # when parsing multiple files.
-    c_parser = CParser()
+    # when parsing multiple files. `scope` is updated in place, and `lineno` is the
+    # line number of the start of `source`.
+    c_parser, lexer = get_c_parser()
     c_parser.clex.filename = "<source>"
-    c_parser.clex.reset_lineno()
-    c_parser._scope_stack = [initial_scope.copy()]
+    c_parser.clex.lexer.begin("INITIAL")
+    c_parser.clex.lexer.lineno = lineno
+    c_parser._scope_stack = [scope]
     c_parser._last_yielded_token = None
     try:
-        ast = c_parser.cparser.parse(input=source, lexer=c_parser.clex)
+        ast: ca.FileAST = c_parser.cparser.parse(input=source, lexer=lexer)
     except ParseError as e:
         msg = str(e)
         position, msg = msg.split(": ", 1)
         parts = position.split(":")
         if len(parts) >= 2:
             # Adjust the line number by 1 to correct for the added typedefs
-            lineno = int(parts[1]) - 1
-            posstr = f" at line {lineno}"
+            error_lineno = int(parts[1]) - 1
+            posstr = f" at line {error_lineno}"
             if len(parts) >= 3:
                 posstr += f", column {parts[2]}"
             try:
-                line = source.split("\n")[lineno].rstrip()
+                line = source.split("\n")[error_lineno + 1 - lineno].rstrip()
                 posstr += "\n\n" + line
             except IndexError:
                 posstr += "(out of bounds?)"
         else:
             posstr = ""
         raise DecompFailure(f"Syntax error when parsing C context.\n{msg}{posstr}")
-    return ast, c_parser._scope_stack[0].copy()
+    return ast
+
+
+def parse_c(
+    source: str, initial_scope: CParserScope
+) -> Tuple[ca.FileAST, CParserScope]:
+    scope = initial_scope.copy()
+    ast = _parse_c_with_parser(source, scope)
+    return ast, scope
+
+
+# Contexts are parsed in chunks of about this many characters, so that when a context
+# is edited, only the chunks from the first changed one onward need to be parsed again
+CONTEXT_CHUNK_SIZE = 4096
+CONTEXT_CHUNK_CACHE_SIZE = 1024
+
+_CHUNK_TOKEN_RE = re.compile(r"""[{};]|"(?:\\.|[^\\"\n])*"|'(?:\\.|[^\\'\n])*'""")
+
+
+def split_c_chunks(source: str, chunk_size: int) -> List[str]:
+    """Split comment-free C source into chunks of whole lines and whole top-level
+    declarations, each at least `chunk_size` characters long except for the last."""
+    chunks: List[str] = []
+    start = 0
+    depth = 0
+    for match in _CHUNK_TOKEN_RE.finditer(source):
+        token = match.group()
+        if token == "{":
+            depth += 1
+        elif token == "}":
+            depth = max(depth - 1, 0)
+        elif token == ";" and depth == 0 and match.end() - start >= chunk_size:
+            end = source.find("\n", match.end())
+            if end == -1:
+                break
+            rest_of_line = source[match.end() : end]
+            if rest_of_line and not rest_of_line.isspace():
+                continue
+            chunks.append(source[start : end + 1])
+            start = end + 1
+    if start < len(source) or not chunks:
+        chunks.append(source[start:])
+    return chunks
+
+
+@dataclass
+class ParsedChunk:
+    items: "List[ca.ExternalDeclaration]"
+    # Changes made to the parser's file scope while parsing the chunk, in order
+    scope_changes: List[Tuple[str, bool]]
+
+
+class _RecordingScope(Dict[str, bool]):
+    def __init__(self, scope: CParserScope) -> None:
+        super().__init__(scope)
+        self.changes: List[Tuple[str, bool]] = []
+
+    def __setitem__(self, name: str, is_typedef: bool) -> None:
+        self.changes.append((name, is_typedef))
+        super().__setitem__(name, is_typedef)
+
+
+_parsed_chunks: "OrderedDict[str, ParsedChunk]" = OrderedDict()
+_parsed_chunks_lock = threading.Lock()
 
 
-def build_typemap(source_paths: List[Path], use_cache: bool) -> TypeMap:
+def parse_c_incremental(
+    source: str, initial_scope: CParserScope, base_hash: str
+) -> Tuple[ca.FileAST, CParserScope]:
+    """Parse C source like parse_c, reusing the parsed chunks it has in common
+    with the start of previously parsed sources.
+
+    Chunks are identified by a hash of their contents, of the chunks before them
+    and of `base_hash`, which must identify `initial_scope`."""
+    chunks = split_c_chunks(source, CONTEXT_CHUNK_SIZE)
+    hashes: List[str] = []
+    chunk_hash = base_hash
+    for chunk in chunks:
+        chunk_hash = hashlib.sha256((chunk_hash + chunk).encode("utf-8")).hexdigest()
+        hashes.append(chunk_hash)
+
+    items: List[ca.ExternalDeclaration] = []
+    scope = initial_scope.copy()
+    lineno = 1
+    index = 0
+    with _parsed_chunks_lock:
+        while index < len(chunks) and hashes[index] in _parsed_chunks:
+            parsed = _parsed_chunks[hashes[index]]
+            _parsed_chunks.move_to_end(hashes[index])
+            items.extend(parsed.items)
+            scope.update(parsed.scope_changes)
+            lineno += chunks[index].count("\n")
+            index += 1
+
+    recording_scope = _RecordingScope(scope)
+    new_chunks: List[Tuple[str, ParsedChunk]] = []
+    try:
+        for i in range(index, len(chunks)):
+            changes_start = len(recording_scope.changes)
+            try:
+                ast = _parse_c_with_parser(chunks[i], recording_scope, lineno)
+            except DecompFailure:
+                # The source may have been split in the middle of a declaration,
+                # e.g. a K&R style function definition, so parse the rest in one go
+                # to either succeed or report the right error
+                scope.update(recording_scope.changes[:changes_start])
+                rest = "".join(chunks[i:])
+                items.extend(_parse_c_with_parser(rest, scope, lineno).ext)
+                return ca.FileAST(items), scope
+
+            changes = recording_scope.changes[changes_start:]
+            new_chunks.append((hashes[i], ParsedChunk(ast.ext, changes)))
+            items.extend(ast.ext)
+            lineno += chunks[i].count("\n")
+    finally:
+        with _parsed_chunks_lock:
+            for chunk_hash, parsed in new_chunks:
+                _parsed_chunks[chunk_hash] = parsed
+            while len(_parsed_chunks) > CONTEXT_CHUNK_CACHE_SIZE:
+                _parsed_chunks.popitem(last=False)
+
+    return ca.FileAST(items), dict(recording_scope)
+
+
+def build_typemap(
+    source_paths: List[Path], use_cache: bool, cache_dir: Optional[Path] = None
+) -> TypeMap:
     # Wrapper to convert `source_paths` into a hashable type
-    return _build_typemap(tuple(source_paths), True)
+    return _build_typemap(tuple(source_paths), use_cache, cache_dir)
 
 
 @functools.lru_cache(maxsize=16)
-def _build_typemap(source_paths: Tuple[Path, ...], use_cache: bool) -> TypeMap:
-    typemap = TypeMap()
+def _build_typemap(
+    source_paths: Tuple[Path, ...], use_cache: bool, cache_dir: Optional[Path]
+) -> TypeMap:
+    typemap: Optional[TypeMap] = None
 
     for source_path in source_paths:
         source = source_path.read_text(encoding="utf-8-sig")
+        source_hash = typemap_source_hash(source, typemap)
 
-        # Compute a hash of the inputs to the TypeMap, which is used to check if the cached
-        # version is still valid. The hashing process does not need to be cryptographically
-        # secure, caching should only be enabled in trusted environments. (Unpickling files
-        # can lead to arbitrary code execution.)
-        hasher = hashlib.sha256()
-        hasher.update(f"version={TypeMap.VERSION}\n".encode("utf-8"))
-        hasher.update(f"parent={typemap.source_hash}\n".encode("utf-8"))
-        hasher.update(source.encode("utf-8"))
-        source_hash = hasher.hexdigest()
-
-        cache_path = source_path.with_name(f"{source_path.name}.m2c")
-        if use_cache and cache_path.exists():
-            try:
-                with cache_path.open("rb") as f:
-                    cache = cast(TypeMap, pickle.load(f))
-            except Exception as e:
-                print(
-                    f"Warning: Unable to read cache file {cache_path}, skipping ({e})"
-                )
-            else:
-                if cache.source_hash == source_hash:
-                    typemap = cache
-                    continue
+        cache_path: Optional[Path] = None
+        if use_cache and cache_dir is not None:
+            cache_path = cache_dir / f"{source_hash}.m2c"
+        elif use_cache:
+            cache_path = source_path.with_name(f"{source_path.name}.m2c")
+
+        typemap = _build_typemap_from_source(source, source_hash, typemap, cache_path)
+
+    return typemap or TypeMap()
+
+
+TYPEMAP_CACHE_SIZE = 16
+
+_typemap_cache: "OrderedDict[str, TypeMap]" = OrderedDict()
+_typemap_cache_lock = threading.Lock()
+
+
+def build_typemap_from_source(
+    source: str, parent: Optional[TypeMap] = None, cache_dir: Optional[Path] = None
+) -> TypeMap:
+    """Build the TypeMap of a C context, extending `parent` if given.
+
+    TypeMaps are cached in memory by a hash of their sources, and stored in
+    `cache_dir` if given, so the same context is only parsed once. The returned
+    TypeMap is shared between callers and must not be modified.
+
+    Only pass a `cache_dir` that untrusted users cannot write to: cache files are
+    pickles, and unpickling them can run arbitrary code."""
+    source_hash = typemap_source_hash(source, parent)
+    cache_path = cache_dir / f"{source_hash}.m2c" if cache_dir is not None else None
+    return _build_typemap_from_source(source, source_hash, parent, cache_path)
+
+
+def typemap_source_hash(source: str, parent: Optional[TypeMap]) -> str:
+    # The hashing process does not need to be cryptographically secure, caching
+    # should only be enabled in trusted environments.
+    hasher = hashlib.sha256()
+    hasher.update(f"version={TypeMap.VERSION}\n".encode("utf-8"))
+    hasher.update(f"parent={parent and parent.source_hash}\n".encode("utf-8"))
+    hasher.update(source.encode("utf-8"))
+    return hasher.hexdigest()
 
-        source = add_builtin_typedefs(source)
-        source = strip_comments(source)
-        source = strip_macro_defs(source)
 
-        ast, result_scope = parse_c(source, typemap.cparser_scope)
-        typemap.cparser_scope = result_scope
+def _build_typemap_from_source(
+    source: str,
+    source_hash: str,
+    parent: Optional[TypeMap],
+    cache_path: Optional[Path],
+) -> TypeMap:
+    with _typemap_cache_lock:
+        typemap = _typemap_cache.get(source_hash)
+        if typemap is not None:
+            _typemap_cache.move_to_end(source_hash)
+            return typemap
+
+    if cache_path is not None:
+        typemap = _load_typemap(cache_path, source_hash)
+
+    if typemap is None:
+        # Cached TypeMaps are shared, so extend a copy of the parent
+        typemap = copy.deepcopy(parent) if parent is not None else TypeMap()
+        _parse_into_typemap(source, typemap)
         typemap.source_hash = source_hash
+        if cache_path is not None:
+            _store_typemap(cache_path, typemap)
 
-        for item in ast.ext:
-            if isinstance(item, ca.Typedef):
-                typemap.typedefs[item.name] = item.type
-                if isinstance(item.type, TypeDecl) and isinstance(
-                    item.type.type, (ca.Struct, ca.Union)
-                ):
-                    typedef = basic_type([item.name])
-                    if item.type.type.name:
-                        typemap.struct_typedefs[item.type.type.name] = typedef
-                    typemap.struct_typedefs[item.type.type] = typedef
-            if isinstance(item, ca.FuncDef):
-                assert item.decl.name is not None, "cannot define anonymous function"
-                fn = parse_function(item.decl.type)
-                assert fn is not None
-                typemap.functions[item.decl.name] = fn
-            if isinstance(item, ca.Decl) and isinstance(item.type, FuncDecl):
-                assert item.name is not None, "cannot define anonymous function"
-                fn = parse_function(item.type)
-                assert fn is not None
-                typemap.functions[item.name] = fn
-
-        defined_function_decls: Set[ca.Decl] = set()
-
-        class Visitor(ca.NodeVisitor):
-            def visit_Struct(self, struct: ca.Struct) -> None:
-                if struct.decls is not None:
-                    parse_struct(struct, typemap)
-
-            def visit_Union(self, union: ca.Union) -> None:
-                if union.decls is not None:
-                    parse_struct(union, typemap)
-
-            def visit_Decl(self, decl: ca.Decl) -> None:
-                if decl.name is not None:
-                    typemap.var_types[decl.name] = type_from_global_decl(decl)
-                    if decl.init is not None:
-                        typemap.vars_with_initializers.add(decl.name)
-                if not isinstance(decl.type, FuncDecl):
-                    self.visit(decl.type)
-
-            def visit_Enum(self, enum: ca.Enum) -> None:
-                parse_enum(enum, typemap)
-
-            def visit_FuncDef(self, fn: ca.FuncDef) -> None:
-                if fn.decl.name is not None:
-                    typemap.var_types[fn.decl.name] = type_from_global_decl(fn.decl)
-
-        Visitor().visit(ast)
-
-        if use_cache:
-            try:
-                with cache_path.open("wb") as f:
-                    pickle.dump(typemap, f)
-            except Exception as e:
-                print(
-                    f"Warning: Unable to write cache file {cache_path}, skipping ({e})"
-                )
+    with _typemap_cache_lock:
+        _typemap_cache[source_hash] = typemap
+        while len(_typemap_cache) > TYPEMAP_CACHE_SIZE:
+            _typemap_cache.popitem(last=False)
 
     return typemap
 
 
+def _load_typemap(cache_path: Path, source_hash: str) -> Optional[TypeMap]:
+    if not cache_path.exists():
+        return None
+    try:
+        with cache_path.open("rb") as f:
+            cache = pickle.load(f)
+    except Exception as e:
+        print(f"Warning: Unable to read cache file {cache_path}, skipping ({e})")
+        return None
+    if not isinstance(cache, TypeMap) or cache.source_hash != source_hash:
+        return None
+    return cache
+
+
+def _store_typemap(cache_path: Path, typemap: TypeMap) -> None:
+    # Write to a temporary file and rename it into place, so that concurrent
+    # readers never see a partially written cache file. The temporary file's name is
+    # unique, since threads of the same process may store the same cache file.
+    temp_path: Optional[str] = None
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(
+            prefix=f".{cache_path.name}.", dir=cache_path.parent
+        )
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(typemap, f)
+        os.replace(temp_path, cache_path)
+    except Exception as e:
+        print(f"Warning: Unable to write cache file {cache_path}, skipping ({e})")
+        if temp_path is not None:
+            with contextlib.suppress(OSError):
+                os.unlink(temp_path)
+
+
+def _parse_into_typemap(source: str, typemap: TypeMap) -> None:
+    source = add_builtin_typedefs(source)
+    source = strip_comments(source)
+    source = strip_macro_defs(source)
+
+    ast, result_scope = parse_c_incremental(
+        source, typemap.cparser_scope, typemap_source_hash("", typemap)
+    )
+    typemap.cparser_scope = result_scope
+
+    for item in ast.ext:
+        if isinstance(item, ca.Typedef):
+            typemap.typedefs[item.name] = item.type
+            if isinstance(item.type, TypeDecl) and isinstance(
+                item.type.type, (ca.Struct, ca.Union)
+            ):
+                typedef = basic_type([item.name])
+                if item.type.type.name:
+                    typemap.struct_typedefs[item.type.type.name] = typedef
+                typemap.struct_typedefs[item.type.type] = typedef
+        if isinstance(item, ca.FuncDef):
+            assert item.decl.name is not None, "cannot define anonymous function"
+            fn = parse_function(item.decl.type)
+            assert fn is not None
+            typemap.functions[item.decl.name] = fn
+        if isinstance(item, ca.Decl) and isinstance(item.type, FuncDecl):
+            assert item.name is not None, "cannot define anonymous function"
+            fn = parse_function(item.type)
+            assert fn is not None
+            typemap.functions[item.name] = fn
+
+    defined_function_decls: Set[ca.Decl] = set()
+
+    class Visitor(ca.NodeVisitor):
+        def visit_Struct(self, struct: ca.Struct) -> None:
+            if struct.decls is not None:
+                parse_struct(struct, typemap)
+
+        def visit_Union(self, union: ca.Union) -> None:
+            if union.decls is not None:
+                parse_struct(union, typemap)
+
+        def visit_Decl(self, decl: ca.Decl) -> None:
+            if decl.name is not None:
+                typemap.var_types[decl.name] = type_from_global_decl(decl)
+                if decl.init is not None:
+                    typemap.vars_with_initializers.add(decl.name)
+            if not isinstance(decl.type, FuncDecl):
+                self.visit(decl.type)
+
+        def visit_Enum(self, enum: ca.Enum) -> None:
+            parse_enum(enum, typemap)
+
+        def visit_FuncDef(self, fn: ca.FuncDef) -> None:
+            if fn.decl.name is not None:
+                typemap.var_types[fn.decl.name] = type_from_global_decl(fn.decl)
+
+    Visitor().visit(ast)
+
+
 def set_decl_name(decl: ca.Decl) -> None:
     name = decl.name
     type = decl.type
@@ -760,27 +1074,27 @@ def type_to_string(type: CType, name: str = "") -> str:
     return to_c(decl)
 
 
-def dump_typemap(typemap: TypeMap) -> None:
-    print("Variables:")
+def dump_typemap(typemap: TypeMap, out: TextIO) -> None:
+    print("Variables:", file=out)
     for var, type in typemap.var_types.items():
-        print(f"{type_to_string(type, var)};")
-    print()
-    print("Functions:")
+        print(f"{type_to_string(type, var)};", file=out)
+    print(file=out)
+    print("Functions:", file=out)
     for name, fn in typemap.functions.items():
-        print(f"{type_to_string(fn.type, name)};")
-    print()
-    print("Structs:")
+        print(f"{type_to_string(fn.type, name)};", file=out)
+    print(file=out)
+    print("Structs:", file=out)
     for name_or_id, struct in typemap.structs.items():
         if not isinstance(name_or_id, str):
             continue
-        print(f"{name_or_id}: size {hex(struct.size)}, align {struct.align}")
+        print(f"{name_or_id}: size {hex(struct.size)}, align {struct.align}", file=out)
         for offset, fields in struct.fields.items():
-            print(f"  {hex(offset)}:", end="")
+            print(f"  {hex(offset)}:", end="", file=out)
             for field in fields:
-                print(f" {field.name} ({type_to_string(field.type)})", end="")
-            print()
-    print()
-    print("Enums:")
+                print(f" {field.name} ({type_to_string(field.type)})", end="", file=out)
+            print(file=out)
+    print(file=out)
+    print("Enums:", file=out)
     for name, value in typemap.enum_values.items():
-        print(f"{name}: {value}")
-    print()
+        print(f"{name}: {value}", file=out)
+    print(file=out)
@@ -288,7 +288,7 @@ def simplify_standard_patterns(function: Function, arch: ArchFlowGraph) -> Funct
 
 
 def build_blocks(
-    function: Function, asm_data: AsmData, arch: ArchFlowGraph
+    function: Function, asm_data: AsmData, arch: ArchFlowGraph, warnings: List[str]
 ) -> List[Block]:
     if arch.arch == Target.ArchEnum.MIPS:
         verify_no_trailing_delay_slot(function)
@@ -440,7 +440,9 @@ def build_blocks(
         # not we must be missing a return instruction).
         label = block_builder.curr_label.name
         return_instrs = arch.missing_return()
-        print(f'Warning: missing "{return_instrs[0]}" in last block (.{label}).\n')
+        warnings.append(
+            f'Warning: missing "{return_instrs[0]}" in last block (.{label}).\n'
+        )
         for instr in return_instrs:
             block_builder.add_instruction(instr)
         block_builder.new_block()
@@ -1097,9 +1099,11 @@ class FlowGraph:
 
 
 def build_flowgraph(
-    function: Function, asm_data: AsmData, arch: ArchFlowGraph
+    function: Function, asm_data: AsmData, arch: ArchFlowGraph, warnings: List[str]
 ) -> FlowGraph:
-    blocks = build_blocks(function, asm_data, arch)
+    """Build the flow graph of a function, adding any warnings about its assembly
+    to `warnings`"""
+    blocks = build_blocks(function, asm_data, arch, warnings)
     nodes = build_nodes(function, blocks, asm_data, arch)
     nodes = duplicate_premature_returns(nodes)
     compute_relations(nodes)
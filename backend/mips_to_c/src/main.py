@@ -1,16 +1,19 @@
 import argparse
+import io
 import re
 import sys
 import traceback
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, List, Optional, Union
+from typing import Dict, List, Optional, Set, TextIO, Tuple, Union
 
-from .c_types import TypeMap, build_typemap, dump_typemap
+from .c_types import TypeMap, build_typemap, build_typemap_from_source, dump_typemap
 from .error import DecompFailure
 from .flow_graph import FlowGraph, build_flowgraph, visualize_flowgraph
 from .if_statements import get_function_text
 from .options import CodingStyle, Options, Target
-from .parse_file import AsmData, Function, parse_file
+from .parse_file import AsmData, Function, MIPSFile, parse_file
 from .translate import (
     Arch,
     FunctionInfo,
@@ -24,8 +27,8 @@ from .arch_mips import MipsArch
 from .arch_ppc import PpcArch
 
 
-def print_current_exception(sanitize: bool) -> None:
-    """Print a traceback for the current exception to stdout.
+def print_current_exception(sanitize: bool, out: TextIO) -> None:
+    """Print a traceback for the current exception to `out`.
 
     If `sanitize` is true, the filename's full path is stripped,
     and the line is set to 0. These changes make the test output
@@ -38,41 +41,91 @@ def print_current_exception(sanitize: bool) -> None:
             frame.lineno = 0
             frame.filename = Path(frame.filename).name
         for line in tb.format(chain=False):
-            print(line, end="")
+            print(line, end="", file=out)
     else:
-        traceback.print_exc(file=sys.stdout)
+        traceback.print_exc(file=out)
 
 
 def print_exception_as_comment(
-    exc: Exception, context: Optional[str], sanitize: bool
+    exc: Exception, context: Optional[str], sanitize: bool, out: TextIO
 ) -> None:
     context_phrase = f" in {context}" if context is not None else ""
     if isinstance(exc, OSError):
-        print(f"/* OSError{context_phrase}: {exc} */")
+        print(f"/* OSError{context_phrase}: {exc} */", file=out)
         return
     elif isinstance(exc, DecompFailure):
-        print("/*")
-        print(f"Decompilation failure{context_phrase}:\n")
-        print(exc)
-        print("*/")
+        print("/*", file=out)
+        print(f"Decompilation failure{context_phrase}:\n", file=out)
+        print(exc, file=out)
+        print("*/", file=out)
     else:
-        print("/*")
-        print(f"Internal error{context_phrase}:\n")
-        print_current_exception(sanitize=sanitize)
-        print("*/")
+        print("/*", file=out)
+        print(f"Internal error{context_phrase}:\n", file=out)
+        print_current_exception(sanitize=sanitize, out=out)
+        print("*/", file=out)
 
 
-def run(options: Options) -> int:
-    arch: Arch
-    if options.target.arch == Target.ArchEnum.MIPS:
-        arch = MipsArch()
-    elif options.target.arch == Target.ArchEnum.PPC:
-        arch = PpcArch()
+def print_warnings(warnings: List[str], out: TextIO) -> None:
+    if warnings:
+        print("/*", file=out)
+        print("\n".join(warnings), file=out)
+        print("*/", file=out)
+
+
+def make_arch(target: Target) -> Arch:
+    if target.arch == Target.ArchEnum.MIPS:
+        return MipsArch()
+    elif target.arch == Target.ArchEnum.PPC:
+        return PpcArch()
     else:
-        raise ValueError(f"Invalid target arch: {options.target.arch}")
+        raise ValueError(f"Invalid target arch: {target.arch}")
 
-    all_functions: Dict[str, Function] = {}
-    asm_data = AsmData()
+
+@dataclass
+class DecompilationResult:
+    # The C code, with any warnings and failures as comments
+    output: str
+    # Nonzero if any part of the decompilation failed, as returned by `run`
+    returncode: int
+
+
+def decompile(
+    asm: str, options: Options, context: Union[str, TypeMap, None] = None
+) -> DecompilationResult:
+    """Decompile `asm`, using the types of `context`, which is either C source or an
+    already built TypeMap.
+
+    Unlike `run`, this reads no files and returns the output rather than printing it,
+    so it may run in several threads at once. `options.filenames` and
+    `options.c_contexts` are ignored. Output of the `debug` option is still printed."""
+    out = io.StringIO()
+    arch = make_arch(options.target)
+    try:
+        mips_file = parse_file(io.StringIO(asm), arch, options, filename="<asm>")
+        print_warnings(mips_file.warnings, out)
+
+        if isinstance(context, TypeMap):
+            typemap = context
+        elif context:
+            typemap = build_typemap_from_source(
+                context,
+                cache_dir=options.context_cache_dir if options.use_cache else None,
+            )
+        else:
+            typemap = TypeMap()
+    except Exception as e:
+        print_exception_as_comment(
+            e, context=None, sanitize=options.sanitize_tracebacks, out=out
+        )
+        return DecompilationResult(out.getvalue(), 1)
+
+    returncode = decompile_files([mips_file], typemap, arch, options, out)
+    return DecompilationResult(out.getvalue(), returncode)
+
+
+def run(options: Options) -> int:
+    arch = make_arch(options.target)
+    mips_files: List[MIPSFile] = []
     try:
         for filename in options.filenames:
             if filename == "-":
@@ -80,18 +133,38 @@ def run(options: Options) -> int:
             else:
                 with open(filename, "r", encoding="utf-8-sig") as f:
                     mips_file = parse_file(f, arch, options)
-            all_functions.update((fn.name, fn) for fn in mips_file.functions)
-            mips_file.asm_data.merge_into(asm_data)
+            print_warnings(mips_file.warnings, sys.stdout)
+            mips_files.append(mips_file)
 
-        typemap = build_typemap(options.c_contexts, use_cache=options.use_cache)
+        typemap = build_typemap(
+            options.c_contexts,
+            use_cache=options.use_cache,
+            cache_dir=options.context_cache_dir,
+        )
     except Exception as e:
         print_exception_as_comment(
-            e, context=None, sanitize=options.sanitize_tracebacks
+            e, context=None, sanitize=options.sanitize_tracebacks, out=sys.stdout
         )
         return 1
 
+    return decompile_files(mips_files, typemap, arch, options, sys.stdout)
+
+
+def decompile_files(
+    mips_files: List[MIPSFile],
+    typemap: TypeMap,
+    arch: Arch,
+    options: Options,
+    out: TextIO,
+) -> int:
+    all_functions: Dict[str, Function] = {}
+    asm_data = AsmData()
+    for mips_file in mips_files:
+        all_functions.update((fn.name, fn) for fn in mips_file.functions)
+        mips_file.asm_data.merge_into(asm_data)
+
     if options.dump_typemap:
-        dump_typemap(typemap)
+        dump_typemap(typemap, out)
         return 0
 
     if not options.function_indexes_or_names:
@@ -116,24 +189,117 @@ def run(options: Options) -> int:
 
     fmt = options.formatter()
     function_names = set(all_functions.keys())
+    # Debug output would be interleaved, and only one function is visualized
+    if (
+        options.jobs > 1
+        and len(functions) > 1
+        and not options.debug
+        and not options.visualize_flowgraph
+    ):
+        return decompile_functions_in_parallel(
+            functions,
+            make_global_info(asm_data, arch, function_names, typemap, options),
+            options,
+            out,
+        )
+
+    global_info = make_global_info(asm_data, arch, function_names, typemap, options)
+    typepool = global_info.typepool
+    flow_graphs = build_flow_graphs(functions, global_info, out)
+    run_preliminary_passes(functions, flow_graphs, global_info, options)
+    function_infos = [
+        translate_function(function, flow_graph, global_info, options)
+        for function, flow_graph in zip(functions, flow_graphs)
+    ]
+
+    return_code = 0
+    try:
+        if options.visualize_flowgraph:
+            fn_info = function_infos[0]
+            if isinstance(fn_info, Exception):
+                raise fn_info
+            print(visualize_flowgraph(fn_info.flow_graph), file=out)
+            return 0
+
+        type_decls = typepool.format_type_declarations(
+            fmt, stack_structs=options.print_stack_structs
+        )
+        if type_decls:
+            print(type_decls, file=out)
+
+        global_decls = global_info.global_decls(
+            fmt,
+            options.global_decls,
+            [fn for fn in function_infos if isinstance(fn, FunctionInfo)],
+        )
+        if global_decls:
+            print(global_decls, file=out)
+    except Exception as e:
+        print_exception_as_comment(
+            e, context=None, sanitize=options.sanitize_tracebacks, out=out
+        )
+        return_code = 1
+
+    for index, (function, function_info) in enumerate(zip(functions, function_infos)):
+        if index != 0:
+            print(file=out)
+        if print_function(function, function_info, options, out):
+            return_code = 1
+
+    for warning in typepool.warnings:
+        print(fmt.with_comments("", comments=[warning]), file=out)
+
+    return return_code
+
+
+def make_global_info(
+    asm_data: AsmData,
+    arch: Arch,
+    function_names: Set[str],
+    typemap: TypeMap,
+    options: Options,
+) -> GlobalInfo:
     typepool = TypePool(
-        unknown_field_prefix="unk_" if fmt.coding_style.unknown_underscore else "unk",
+        unknown_field_prefix="unk_"
+        if options.coding_style.unknown_underscore
+        else "unk",
         unk_inference=options.unk_inference,
     )
-    global_info = GlobalInfo(
-        asm_data, arch, options.target, function_names, typemap, typepool
-    )
+    return GlobalInfo(asm_data, arch, options.target, function_names, typemap, typepool)
+
 
+def build_flow_graphs(
+    functions: List[Function], global_info: GlobalInfo, out: TextIO
+) -> List[Union[FlowGraph, Exception]]:
+    """Build the flow graph of each function, printing warnings about them to `out`.
+    Failures are returned rather than raised, in place of the FlowGraph."""
     flow_graphs: List[Union[FlowGraph, Exception]] = []
     for function in functions:
+        warnings: List[str] = []
         try:
             narrow_func_call_outputs(function, global_info)
-            flow_graphs.append(build_flowgraph(function, global_info.asm_data, arch))
+            flow_graphs.append(
+                build_flowgraph(
+                    function, global_info.asm_data, global_info.arch, warnings
+                )
+            )
         except Exception as e:
             # Store the exception for later, to preserve the order in the output
             flow_graphs.append(e)
+        for warning in warnings:
+            print(warning, file=out)
+    return flow_graphs
+
 
-    # Perform the preliminary passes to improve type resolution, but discard the results/exceptions
+def run_preliminary_passes(
+    functions: List[Function],
+    flow_graphs: List[Union[FlowGraph, Exception]],
+    global_info: GlobalInfo,
+    options: Options,
+) -> None:
+    """Perform the preliminary passes to improve type resolution, but discard the
+    results/exceptions. The types they infer are kept in `global_info`."""
+    fmt = options.formatter()
     for i in range(options.passes - 1):
         preliminary_infos = []
         for function, flow_graph in zip(functions, flow_graphs):
@@ -157,71 +323,246 @@ def run(options: Options) -> int:
 
         # This operation can change struct field paths, so it is only performed
         # after discarding all of the translated Expressions.
-        typepool.prune_structs()
+        global_info.typepool.prune_structs()
 
-    function_infos: List[Union[FunctionInfo, Exception]] = []
-    for function, flow_graph in zip(functions, flow_graphs):
-        try:
-            if isinstance(flow_graph, Exception):
-                raise flow_graph
-            flow_graph.reset_block_info()
-            info = translate_to_ast(function, flow_graph, options, global_info)
-            function_infos.append(info)
-        except Exception as e:
-            # Store the exception for later, to preserve the order in the output
-            function_infos.append(e)
 
-    return_code = 0
+def translate_function(
+    function: Function,
+    flow_graph: Union[FlowGraph, Exception],
+    global_info: GlobalInfo,
+    options: Options,
+) -> Union[FunctionInfo, Exception]:
     try:
-        if options.visualize_flowgraph:
-            fn_info = function_infos[0]
-            if isinstance(fn_info, Exception):
-                raise fn_info
-            print(visualize_flowgraph(fn_info.flow_graph))
-            return 0
+        if isinstance(flow_graph, Exception):
+            raise flow_graph
+        flow_graph.reset_block_info()
+        return translate_to_ast(function, flow_graph, options, global_info)
+    except Exception as e:
+        # Return the exception, to print it in order with the output
+        return e
+
+
+def print_function(
+    function: Function,
+    function_info: Union[FunctionInfo, Exception],
+    options: Options,
+    out: TextIO,
+) -> int:
+    """Print the C code of a translated function, or why it failed. Returns 1 if it
+    failed, and 0 otherwise."""
+    try:
+        if options.print_assembly:
+            print(function, file=out)
+            print(file=out)
 
-        type_decls = typepool.format_type_declarations(
-            fmt, stack_structs=options.print_stack_structs
+        if isinstance(function_info, Exception):
+            raise function_info
+
+        function_text = get_function_text(function_info, options)
+        print(function_text, file=out)
+    except Exception as e:
+        print_exception_as_comment(
+            e,
+            context=f"function {function.name}",
+            sanitize=options.sanitize_tracebacks,
+            out=out,
         )
-        if type_decls:
-            print(type_decls)
+        return 1
+    return 0
+
+
+# (sort order, declaration) as returned by GlobalInfo.global_decl_lines
+GlobalDeclLine = Tuple[Tuple[bool, bool, bool, bool, str], str]
+
+
+@dataclass
+class SharedInputs:
+    """The inputs of `decompile_functions_in_parallel`, which are sent to each worker
+    process once and only read there"""
+
+    functions: List[Function]
+    # None for functions whose flow graph couldn't be built
+    flow_graphs: List[Optional[FlowGraph]]
+    # With the types inferred by the preliminary passes over all functions
+    global_info: GlobalInfo
+    options: Options
+    recursion_limit: int
+
+
+@dataclass
+class FunctionOutput:
+    """What a worker process outputs for one function"""
+
+    # (name, declaration) of the structs to declare
+    type_decls: List[Tuple[str, str]]
+    global_decls: List[GlobalDeclLine]
+    # Declarations of local functions, which are only needed if they're used before
+    # their definition. That depends on which functions translate, so the caller
+    # picks them once all functions have been translated.
+    forward_decls: List[GlobalDeclLine]
+    # Whether the function translated, rather than failing with an exception
+    translated: bool
+    # A comment explaining why the declarations couldn't be formatted, if they couldn't
+    decls_failure: str
+    # The C code of the function, or a comment explaining why it failed
+    text: str
+    typepool_warnings: List[str]
+    returncode: int
+
+
+_shared_inputs: Optional[SharedInputs] = None
+
+
+def init_worker(inputs: SharedInputs) -> None:
+    global _shared_inputs
+    _shared_inputs = inputs
+    # Match the limit raised by main(), which workers that aren't forked don't inherit
+    sys.setrecursionlimit(inputs.recursion_limit)
+
+
+def decompile_function(index: int) -> FunctionOutput:
+    """Translate and format the function at `index` of the shared inputs, in a worker
+    process"""
+    inputs = _shared_inputs
+    assert inputs is not None, "set by init_worker"
+    options = inputs.options
+    global_info = inputs.global_info
+    function = inputs.functions[index]
+    flow_graph = inputs.flow_graphs[index]
+    assert flow_graph is not None, "failed flow graphs are printed by the caller"
+    function_info = translate_function(function, flow_graph, global_info, options)
 
-        global_decls = global_info.global_decls(
-            fmt,
-            options.global_decls,
-            [fn for fn in function_infos if isinstance(fn, FunctionInfo)],
+    fmt = options.formatter()
+    returncode = 0
+    type_decls: List[Tuple[str, str]] = []
+    global_decls: List[GlobalDeclLine] = []
+    forward_decls: List[GlobalDeclLine] = []
+    decls_failure = io.StringIO()
+    try:
+        type_decls = global_info.typepool.type_declarations(
+            fmt, stack_structs=options.print_stack_structs
         )
-        if global_decls:
-            print(global_decls)
+        global_decls = global_info.global_decl_lines(fmt, options.global_decls, set())
+        declared = {sort_order[-1] for sort_order, _ in global_decls}
+        forward_decls = [
+            (sort_order, line)
+            for sort_order, line in global_info.global_decl_lines(
+                fmt, options.global_decls, global_info.local_functions
+            )
+            if sort_order[-1] not in declared
+        ]
     except Exception as e:
         print_exception_as_comment(
-            e, context=None, sanitize=options.sanitize_tracebacks
+            e, context=None, sanitize=options.sanitize_tracebacks, out=decls_failure
+        )
+        returncode = 1
+
+    text = io.StringIO()
+    returncode = max(returncode, print_function(function, function_info, options, text))
+
+    return FunctionOutput(
+        type_decls=type_decls,
+        global_decls=global_decls,
+        forward_decls=forward_decls,
+        translated=isinstance(function_info, FunctionInfo),
+        decls_failure=decls_failure.getvalue(),
+        text=text.getvalue(),
+        typepool_warnings=global_info.typepool.warnings,
+        returncode=returncode,
+    )
+
+
+def decompile_functions_in_parallel(
+    functions: List[Function],
+    global_info: GlobalInfo,
+    options: Options,
+    out: TextIO,
+) -> int:
+    """Decompile functions in `options.jobs` worker processes.
+
+    The preliminary passes run here, over all functions, so that types are inferred
+    across functions that call each other as usual. Each worker then gets a copy of
+    the resulting types, and translates and formats its functions with them. Only
+    what the final pass over one function would teach the others is lost.
+
+    The output is the same whatever the number of jobs or the order the workers
+    finish in: declarations of a struct or symbol are taken from the first function
+    that has one, or from the declared function itself."""
+    flow_graphs = build_flow_graphs(functions, global_info, out)
+    run_preliminary_passes(functions, flow_graphs, global_info, options)
+
+    inputs = SharedInputs(
+        functions=functions,
+        flow_graphs=[
+            None if isinstance(flow_graph, Exception) else flow_graph
+            for flow_graph in flow_graphs
+        ],
+        global_info=global_info,
+        options=options,
+        recursion_limit=sys.getrecursionlimit(),
+    )
+    translated = [
+        index
+        for index, flow_graph in enumerate(inputs.flow_graphs)
+        if flow_graph is not None
+    ]
+    with ProcessPoolExecutor(
+        max_workers=options.jobs, initializer=init_worker, initargs=(inputs,)
+    ) as pool:
+        outputs: Dict[int, FunctionOutput] = dict(
+            zip(translated, pool.map(decompile_function, translated))
         )
-        return_code = 1
 
-    for index, (function, function_info) in enumerate(zip(functions, function_infos)):
-        if index != 0:
-            print()
-        try:
-            if options.print_assembly:
-                print(function)
-                print()
+    # As in the serial path, only the functions that translated count
+    forward_declares_needed = global_info.find_forward_declares_needed(
+        [functions[index] for index, output in outputs.items() if output.translated]
+    )
+
+    return_code = 0
+    type_decls: Dict[str, str] = {}
+    global_decls: Dict[str, GlobalDeclLine] = {}
+    for index, function in enumerate(functions):
+        output = outputs.get(index)
+        if output is None:
+            continue
+        for name, decl in output.type_decls:
+            type_decls.setdefault(name or decl, decl)
+        for sort_order, line in output.global_decls + [
+            decl
+            for decl in output.forward_decls
+            if decl[0][-1] in forward_declares_needed
+        ]:
+            name = sort_order[-1]
+            # A function's own translation knows its signature best
+            if name == function.name:
+                global_decls[name] = (sort_order, line)
+            else:
+                global_decls.setdefault(name, (sort_order, line))
+        return_code = max(return_code, output.returncode)
 
-            if isinstance(function_info, Exception):
-                raise function_info
+    if type_decls:
+        print("\n".join(decl for _, decl in sorted(type_decls.items())), file=out)
+    if global_decls:
+        print("".join(line for _, line in sorted(global_decls.values())), file=out)
+    for output in outputs.values():
+        print(output.decls_failure, end="", file=out)
 
-            function_text = get_function_text(function_info, options)
-            print(function_text)
-        except Exception as e:
-            print_exception_as_comment(
-                e,
-                context=f"function {function.name}",
-                sanitize=options.sanitize_tracebacks,
-            )
+    for index, (function, flow_graph) in enumerate(zip(functions, flow_graphs)):
+        if index != 0:
+            print(file=out)
+        if isinstance(flow_graph, Exception):
+            # Printed here, where its traceback is still available
+            print_function(function, flow_graph, options, out)
             return_code = 1
+        else:
+            print(outputs[index].text, end="", file=out)
 
-    for warning in typepool.warnings:
-        print(fmt.with_comments("", comments=[warning]))
+    fmt = options.formatter()
+    typepool_warnings = dict.fromkeys(
+        warning for output in outputs.values() for warning in output.typepool_warnings
+    )
+    for warning in typepool_warnings:
+        print(fmt.with_comments("", comments=[warning]), file=out)
 
     return return_code
 
@@ -264,6 +605,15 @@ def parse_flags(flags: List[str]) -> Options:
         'The cache for "foo/ctx_bar.c" is stored in "foo/ctx_bar.c.m2c". '
         "The *.m2c files automatically regenerate when the source file change, and can be ignored.",
     )
+    group.add_argument(
+        "--context-cache-dir",
+        metavar="DIR",
+        dest="context_cache_dir",
+        type=Path,
+        help="Store the caches of parsed C contexts in DIR, named by a hash of their contents, "
+        "instead of next to the context files. Contexts with the same contents then share "
+        "a cache, whatever their path. DIR must not be writable by untrusted users.",
+    )
     group.add_argument(
         "-D",
         dest="defined",
@@ -446,6 +796,16 @@ def parse_flags(flags: List[str]) -> Options:
         help="Number of translation passes to perform. Each pass may improve type resolution and produce better "
         "output, particularly when decompiling multiple functions. Default: 2",
     )
+    group.add_argument(
+        "--jobs",
+        "-j",
+        dest="jobs",
+        metavar="N",
+        type=int,
+        default=1,
+        help="Run the final translation pass over functions in N processes at once. The earlier passes "
+        "still infer types across all functions. Default: 1",
+    )
     group.add_argument(
         "--stop-on-error",
         dest="stop_on_error",
@@ -592,6 +952,7 @@ def parse_flags(flags: List[str]) -> Options:
         visualize_flowgraph=args.visualize,
         c_contexts=args.c_contexts,
         use_cache=args.use_cache,
+        context_cache_dir=args.context_cache_dir,
         dump_typemap=args.dump_typemap,
         pdb_translate=args.pdb_translate,
         preproc_defines=preproc_defines,
@@ -603,6 +964,7 @@ def parse_flags(flags: List[str]) -> Options:
         print_stack_structs=args.print_stack_structs,
         unk_inference=args.unk_inference,
         passes=args.passes,
+        jobs=args.jobs,
         incbin_dirs=args.incbin_dirs,
     )
 
@@ -105,6 +105,7 @@ class Options:
     visualize_flowgraph: bool
     c_contexts: List[Path]
     use_cache: bool
+    context_cache_dir: Optional[Path]
     dump_typemap: bool
     pdb_translate: bool
     preproc_defines: Dict[str, int]
@@ -116,6 +117,7 @@ class Options:
     print_stack_structs: bool
     unk_inference: bool
     passes: int
+    jobs: int
     incbin_dirs: List[Path]
 
     def formatter(self) -> "Formatter":
@@ -101,6 +101,7 @@ class MIPSFile:
     asm_data: AsmData = field(default_factory=AsmData)
     current_function: Optional[Function] = field(default=None, repr=False)
     current_data: AsmDataEntry = field(default_factory=AsmDataEntry)
+    warnings: List[str] = field(default_factory=list)
 
     def new_function(self, name: str) -> None:
         self.current_function = Function(name=name)
@@ -259,8 +260,14 @@ def parse_incbin(
     return None
 
 
-def parse_file(f: typing.TextIO, arch: ArchAsm, options: Options) -> MIPSFile:
-    filename = Path(f.name).name
+def parse_file(
+    f: typing.TextIO,
+    arch: ArchAsm,
+    options: Options,
+    filename: Optional[str] = None,
+) -> MIPSFile:
+    if filename is None:
+        filename = Path(f.name).name
     mips_file: MIPSFile = MIPSFile(filename)
     defines: Dict[str, int] = options.preproc_defines
     ifdef_level: int = 0
@@ -461,9 +468,5 @@ def parse_file(f: typing.TextIO, arch: ArchAsm, options: Options) -> MIPSFile:
                 instr: Instruction = parse_instruction(line, meta, arch)
                 mips_file.new_instruction(instr)
 
-    if warnings:
-        print("/*")
-        print("\n".join(warnings))
-        print("*/")
-
+    mips_file.warnings = warnings
     return mips_file
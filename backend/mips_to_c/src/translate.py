@@ -4630,14 +4630,14 @@ class GlobalInfo:
 
         return for_type(sym.type)
 
-    def find_forward_declares_needed(self, functions: List[FunctionInfo]) -> Set[str]:
+    def find_forward_declares_needed(self, functions: List[Function]) -> Set[str]:
         funcs_seen = set()
         forward_declares_needed = self.asm_data.mentioned_labels
 
         for func in functions:
-            funcs_seen.add(func.stack_info.function.name)
+            funcs_seen.add(func.name)
 
-            for instr in func.stack_info.function.body:
+            for instr in func.body:
                 if not isinstance(instr, Instruction):
                     continue
 
@@ -4663,11 +4663,24 @@ class GlobalInfo:
         decls: Options.GlobalDeclsEnum,
         functions: List[FunctionInfo],
     ) -> str:
+        forward_declares_needed = self.find_forward_declares_needed(
+            [fn.stack_info.function for fn in functions]
+        )
+        lines = self.global_decl_lines(fmt, decls, forward_declares_needed)
+        lines.sort()
+        return "".join(line for _, line in lines)
+
+    def global_decl_lines(
+        self,
+        fmt: Formatter,
+        decls: Options.GlobalDeclsEnum,
+        forward_declares_needed: Set[str],
+    ) -> List[Tuple[Tuple[bool, bool, bool, bool, str], str]]:
+        """The global declarations, unsorted, each with a key to sort them by.
+        The last element of the key is the symbol's name."""
         # Format labels from symbol_type_map into global declarations.
         # As the initializers are formatted, this may cause more symbols
         # to be added to the global_symbol_map.
-        forward_declares_needed = self.find_forward_declares_needed(functions)
-
         lines = []
         processed_names: Set[str] = set()
         while True:
@@ -4808,8 +4821,7 @@ class GlobalInfo:
                         + "\n",
                     )
                 )
-        lines.sort()
-        return "".join(line for _, line in lines)
+        return lines
 
 
 def narrow_func_call_outputs(
@@ -98,6 +98,12 @@ class TypePool:
             self.structs_by_tag_name[tag_name] = struct
 
     def format_type_declarations(self, fmt: Formatter, stack_structs: bool) -> str:
+        return "\n".join(decl for _, decl in self.type_declarations(fmt, stack_structs))
+
+    def type_declarations(
+        self, fmt: Formatter, stack_structs: bool
+    ) -> List[Tuple[str, str]]:
+        """The struct declarations to output, as (name, declaration) sorted by name"""
         decls = []
         for struct in sorted(
             self.structs, key=lambda s: s.tag_name or s.typedef_name or ""
@@ -107,8 +113,9 @@ class TypePool:
                 continue
             # Include any struct with added fields, plus any stack structs
             if any(not f.known for f in struct.fields) or struct.is_stack:
-                decls.append(struct.format(fmt) + "\n")
-        return "\n".join(decls)
+                name = struct.tag_name or struct.typedef_name or ""
+                decls.append((name, struct.format(fmt) + "\n"))
+        return decls
 
     def prune_structs(self) -> None:
         """Remove overlapping fields from all known structs"""
@@ -0,0 +1,9 @@
+from typing import Any
+
+
+class LexToken:
+    type: str
+    value: str
+    lineno: int
+    lexpos: int
+    lexer: Any
@@ -0,0 +1,31 @@
+s32 func_00400090(s8 *arg0, ? arg1, s32 arg2);      /* static */
+s32 func_004000A0(s32 arg0, s8 *arg1, s32 arg2);    /* static */
+
+void test(s32 arg1) {
+    ? sp120000;
+    s8 sp20;
+    s32 temp_a2;
+    s32 temp_v0;
+    s8 *temp_a1;
+    s8 *temp_v0_2;
+
+    sp120000.unk347C = arg1;
+    temp_v0 = func_00400090(&sp20, 0x123456);
+    temp_a1 = &sp20;
+    temp_a2 = temp_v0;
+    if (temp_v0 < 0) {
+        return;
+    }
+    temp_v0_2 = &temp_a1[temp_a2];
+    sp20 ^= 0x55;
+    temp_v0_2->unk-1 = (s8) (temp_v0_2->unk-1 ^ 0x55);
+    func_004000A0(sp120000.unk347C, temp_a1, temp_a2);
+}
+
+s32 func_00400090(s8 *arg0, ? arg1, s32 arg2) {
+    return arg2;
+}
+
+s32 func_004000A0(s32 arg0, s8 *arg1, s32 arg2) {
+    return arg2;
+}
@@ -0,0 +1,51 @@
+.set noat      # allow manual use of $at
+.set noreorder # don't insert nops after branches
+
+
+glabel func_00400090
+/* 000090 00400090 AFA40000 */  sw    $a0, ($sp)
+/* 000094 00400094 AFA50004 */  sw    $a1, 4($sp)
+/* 000098 00400098 03E00008 */  jr    $ra
+/* 00009C 0040009C 00C01025 */   move  $v0, $a2
+
+glabel func_004000A0
+/* 0000A0 004000A0 AFA40000 */  sw    $a0, ($sp)
+/* 0000A4 004000A4 AFA50004 */  sw    $a1, 4($sp)
+/* 0000A8 004000A8 03E00008 */  jr    $ra
+/* 0000AC 004000AC 00C01025 */   move  $v0, $a2
+
+glabel test
+/* 0000B0 004000B0 3C010012 */  lui   $at, 0x12
+/* 0000B4 004000B4 34213478 */  ori   $at, $at, 0x3478
+/* 0000B8 004000B8 03A1E823 */  subu  $sp, $sp, $at
+/* 0000BC 004000BC 3C010012 */  lui   $at, 0x12
+/* 0000C0 004000C0 003D0821 */  addu  $at, $at, $sp
+/* 0000C4 004000C4 AFBF0014 */  sw    $ra, 0x14($sp)
+/* 0000C8 004000C8 AC25347C */  sw    $a1, 0x347C($at)
+/* 0000CC 004000CC 3C060012 */  lui   $a2, 0x12
+/* 0000D0 004000D0 34C63456 */  ori   $a2, $a2, 0x3456
+/* 0000D4 004000D4 0C100024 */  jal   func_00400090
+/* 0000D8 004000D8 27A50020 */   addiu $a1, $sp, 0x20
+/* 0000DC 004000DC 27A50020 */  addiu $a1, $sp, 0x20
+/* 0000E0 004000E0 04410003 */  bgez  $v0, .L004000F0
+/* 0000E4 004000E4 00403025 */   move  $a2, $v0
+/* 0000E8 004000E8 1000000D */  b     .L00400120
+/* 0000EC 004000EC 8FBF0014 */   lw    $ra, 0x14($sp)
+.L004000F0:
+/* 0000F0 004000F0 83AE0020 */  lb    $t6, 0x20($sp)
+/* 0000F4 004000F4 00A61021 */  addu  $v0, $a1, $a2
+/* 0000F8 004000F8 3C040012 */  lui   $a0, 0x12
+/* 0000FC 004000FC 39CF0055 */  xori  $t7, $t6, 0x55
+/* 000100 00400100 A3AF0020 */  sb    $t7, 0x20($sp)
+/* 000104 00400104 8058FFFF */  lb    $t8, -1($v0)
+/* 000108 00400108 009D2021 */  addu  $a0, $a0, $sp
+/* 00010C 0040010C 3B190055 */  xori  $t9, $t8, 0x55
+/* 000110 00400110 A059FFFF */  sb    $t9, -1($v0)
+/* 000114 00400114 0C100028 */  jal   func_004000A0
+/* 000118 00400118 8C84347C */   lw    $a0, 0x347C($a0)
+/* 00011C 0040011C 8FBF0014 */  lw    $ra, 0x14($sp)
+.L00400120:
+/* 000120 00400120 3C010012 */  lui   $at, 0x12
+/* 000124 00400124 34213478 */  ori   $at, $at, 0x3478
+/* 000128 00400128 03E00008 */  jr    $ra
+/* 00012C 0040012C 03A1E821 */   addu  $sp, $sp, $at
@@ -0,0 +1,14 @@
+f32 func_004000BC(f32 arg0);                        /* static */
+f64 func_004000C4(f64 arg0);                        /* static */
+
+f32 test(void) {
+    return (f32) func_004000C4((f64) func_004000BC());
+}
+
+f32 func_004000BC(f32 arg0) {
+    return arg0;
+}
+
+f64 func_004000C4(f64 arg0) {
+    return arg0;
+}
@@ -0,0 +1,33 @@
+.include "macros.inc"
+
+.section .text  # 0x0 - 0x5c
+
+.global foo
+foo:
+/* 00000000 00000000  80 04 00 00 */	lwz r0, 0(r4)
+/* 00000004 00000004  90 03 00 00 */	stw r0, 0(r3)
+/* 00000008 00000008  4E 80 00 20 */	blr 
+
+.global test
+test:
+/* 0000000C 0000000C  7C 08 02 A6 */	mflr r0
+/* 00000010 00000010  90 01 00 04 */	stw r0, 4(r1)
+/* 00000014 00000014  94 21 FF F0 */	stwu r1, -0x10(r1)
+/* 00000018 00000018  90 61 00 08 */	stw r3, 8(r1)
+/* 0000001C 0000001C  38 61 00 08 */	addi r3, r1, 8
+/* 00000020 00000020  38 01 00 0C */	addi r0, r1, 0xc
+/* 00000024 00000024  90 81 00 0C */	stw r4, 0xc(r1)
+/* 00000028 00000028  90 61 00 08 */	stw r3, 8(r1)
+/* 0000002C 0000002C  90 01 00 0C */	stw r0, 0xc(r1)
+/* 00000030 00000030  80 61 00 08 */	lwz r3, 8(r1)
+/* 00000034 00000034  80 81 00 0C */	lwz r4, 0xc(r1)
+/* 00000038 00000038  48 00 00 01 */	bl foo
+/* 0000003C 0000003C  80 81 00 0C */	lwz r4, 0xc(r1)
+/* 00000040 00000040  90 81 00 08 */	stw r4, 8(r1)
+/* 00000044 00000044  80 61 00 08 */	lwz r3, 8(r1)
+/* 00000048 00000048  48 00 00 01 */	bl foo
+/* 0000004C 0000004C  80 01 00 14 */	lwz r0, 0x14(r1)
+/* 00000050 00000050  38 21 00 10 */	addi r1, r1, 0x10
+/* 00000054 00000054  7C 08 03 A6 */	mtlr r0
+/* 00000058 00000058  4E 80 00 20 */	blr 
+